@@ -1,5 +1,4 @@
-from .dijkstra import dijkstra
+from .dijkstra import dijkstra, dijkstra_bidireccional, dijkstra_multi, apsp_bounded
 from .tsp import solve_tsp
 
-__all__ = ["dijkstra", "solve_tsp"]
-
+__all__ = ["dijkstra", "dijkstra_bidireccional", "dijkstra_multi", "apsp_bounded", "solve_tsp"]
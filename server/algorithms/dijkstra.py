@@ -1,34 +1,87 @@
-import heapq
-from typing import List, Tuple, Dict
+from typing import List, Tuple
+import numpy as np
+from .numba_kernels import NUMBA_DISPONIBLE, _dijkstra_numba, _dijkstra_multi_numba, _dijkstra_bidireccional_numba
+from .indexed_heap import IndexedHeap
 
-def dijkstra(matriz_adyacencia: List[List[float]], inicio_idx: int, fin_idx: int) -> Tuple[float, List[int]]:
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as _dijkstra_scipy
+    SCIPY_DISPONIBLE = True
+except ImportError:
+    SCIPY_DISPONIBLE = False
+
+def construir_csr(matriz_adyacencia: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convierte una matriz de adyacencia densa a formato CSR (Compressed Sparse Row).
+    Solo se guardan las aristas reales (pesos finitos fuera de la diagonal).
+    
+    Args:
+        matriz_adyacencia: Matriz de adyacencia densa (n, n) con pesos (inf = sin conexión)
+    
+    Returns:
+        Tupla (indptr, indices, pesos) donde los vecinos del nodo u son
+        indices[indptr[u]:indptr[u + 1]] con pesos pesos[indptr[u]:indptr[u + 1]]
+    """
+    matriz = np.asarray(matriz_adyacencia, dtype=np.float64)
+    n = matriz.shape[0]
+    
+    mascara = np.isfinite(matriz)
+    np.fill_diagonal(mascara, False)
+    
+    # np.nonzero recorre por filas, así que las aristas ya quedan agrupadas por origen
+    filas, columnas = np.nonzero(mascara)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(filas, minlength=n), out=indptr[1:])
+    
+    return indptr, columnas.astype(np.int32), matriz[filas, columnas]
+
+def dijkstra(grafo_csr: Tuple[np.ndarray, np.ndarray, np.ndarray], inicio_idx: int, fin_idx: int) -> Tuple[float, List[int]]:
     """
     Algoritmo de Dijkstra para encontrar el camino más corto entre dos nodos.
     
     Args:
-        matriz_adyacencia: Matriz de adyacencia con pesos
+        grafo_csr: Tupla (indptr, indices, pesos) generada por construir_csr
         inicio_idx: Índice del nodo inicial
         fin_idx: Índice del nodo destino
     
     Returns:
         Tupla (distancia_total, camino) donde camino es lista de índices
     """
-    n = len(matriz_adyacencia)
-    distancias = [float('inf')] * n
+    indptr, indices, pesos = grafo_csr
+    
+    if SCIPY_DISPONIBLE:
+        # Implementación en C de SciPy; los pesos son 1/peso > 0, no hay aristas de peso 0
+        n = len(indptr) - 1
+        grafo = csr_matrix((pesos, indices, indptr), shape=(n, n))
+        distancias, previos = _dijkstra_scipy(grafo, directed=True, indices=inicio_idx,
+                                              return_predecessors=True)
+        if distancias[fin_idx] == np.inf:
+            return float('inf'), []
+        # SciPy marca "sin predecesor" con un valor negativo (-9999)
+        camino = []
+        nodo = fin_idx
+        while nodo >= 0:
+            camino.append(nodo)
+            nodo = int(previos[nodo])
+        camino.reverse()
+        return float(distancias[fin_idx]), camino
+    
+    if NUMBA_DISPONIBLE:
+        # Versión compilada: heap sobre arreglos tipados, sin tuplas en la cola
+        distancia, camino = _dijkstra_numba(indptr, indices, pesos, inicio_idx, fin_idx)
+        return float(distancia), camino.tolist()
+    
+    n = len(indptr) - 1
+    distancias = np.full(n, np.inf, dtype=np.float64)
     distancias[inicio_idx] = 0.0
-    previos = [-1] * n
-    visitados = [False] * n
+    previos = np.full(n, -1, dtype=np.int32)
     
-    # Cola de prioridad: (distancia, nodo)
-    cola = [(0.0, inicio_idx)]
+    # Cola de prioridad indexada: cada nodo aparece una sola vez (decrease-key)
+    cola = IndexedHeap(n)
+    cola.insert(inicio_idx, 0.0)
     
     while cola:
-        dist_actual, nodo_actual = heapq.heappop(cola)
-        
-        if visitados[nodo_actual]:
-            continue
-        
-        visitados[nodo_actual] = True
+        dist_actual, nodo_actual = cola.pop_min()
         
         # Si llegamos al destino, reconstruir el camino
         if nodo_actual == fin_idx:
@@ -36,20 +89,227 @@ def dijkstra(matriz_adyacencia: List[List[float]], inicio_idx: int, fin_idx: int
             nodo = fin_idx
             while nodo != -1:
                 camino.append(nodo)
-                nodo = previos[nodo]
+                nodo = int(previos[nodo])
             camino.reverse()
-            return distancias[fin_idx], camino
+            return float(distancias[fin_idx]), camino
         
-        # Explorar vecinos
-        for vecino in range(n):
-            if not visitados[vecino] and matriz_adyacencia[nodo_actual][vecino] != float('inf'):
-                nueva_dist = dist_actual + matriz_adyacencia[nodo_actual][vecino]
-                
-                if nueva_dist < distancias[vecino]:
-                    distancias[vecino] = nueva_dist
-                    previos[vecino] = nodo_actual
-                    heapq.heappush(cola, (nueva_dist, vecino))
+        # Explorar solo los vecinos reales (fila CSR del nodo actual)
+        inicio, fin = indptr[nodo_actual], indptr[nodo_actual + 1]
+        for vecino, peso in zip(indices[inicio:fin].tolist(), pesos[inicio:fin].tolist()):
+            nueva_dist = dist_actual + peso
+            
+            # No encolar caminos que ya no pueden mejorar la distancia al destino
+            if nueva_dist < distancias[vecino] and nueva_dist < distancias[fin_idx]:
+                distancias[vecino] = nueva_dist
+                previos[vecino] = nodo_actual
+                if vecino in cola:
+                    cola.decrease_key(vecino, nueva_dist)
+                else:
+                    cola.insert(vecino, nueva_dist)
     
     # No se encontró camino
     return float('inf'), []
 
+def dijkstra_bidireccional(grafo_csr: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                           grafo_csr_inverso: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                           inicio_idx: int, fin_idx: int) -> Tuple[float, List[int]]:
+    """
+    Camino más corto entre dos nodos con Dijkstra bidireccional: busca a la vez desde el
+    origen y (sobre el grafo inverso) desde el destino, y se detiene cuando los dos frentes
+    se encuentran. Explora muchos menos nodos que un Dijkstra desde un solo extremo.
+    
+    Args:
+        grafo_csr: Tupla (indptr, indices, pesos) generada por construir_csr
+        grafo_csr_inverso: Lo mismo para la matriz transpuesta (aristas entrantes)
+        inicio_idx: Índice del nodo inicial
+        fin_idx: Índice del nodo destino
+    
+    Returns:
+        Tupla (distancia_total, camino) donde camino es lista de índices
+    """
+    if NUMBA_DISPONIBLE:
+        distancia, camino = _dijkstra_bidireccional_numba(*grafo_csr, *grafo_csr_inverso, inicio_idx, fin_idx)
+        return float(distancia), camino.tolist()
+    
+    if SCIPY_DISPONIBLE:
+        # Sin Numba, el Dijkstra de SciPy en C desde un solo extremo es más rápido que
+        # la versión bidireccional en Python
+        return dijkstra(grafo_csr, inicio_idx, fin_idx)
+    
+    return _dijkstra_bidireccional_python(grafo_csr, grafo_csr_inverso, inicio_idx, fin_idx)
+
+def _dijkstra_bidireccional_python(grafo_csr, grafo_csr_inverso, inicio_idx, fin_idx):
+    """Versión en Python puro de _dijkstra_bidireccional_numba"""
+    if inicio_idx == fin_idx:
+        return 0.0, [inicio_idx]
+    
+    n = len(grafo_csr[0]) - 1
+    # Por sentido: grafo, distancias, árbol (previo o siguiente) y cola
+    sentidos = []
+    for grafo, origen in ((grafo_csr, inicio_idx), (grafo_csr_inverso, fin_idx)):
+        distancias = [float('inf')] * n
+        distancias[origen] = 0.0
+        cola = IndexedHeap(n)
+        cola.insert(origen, 0.0)
+        sentidos.append((grafo, distancias, [-1] * n, [0.0] * n, cola))
+    dist_ida, dist_vuelta = sentidos[0][1], sentidos[1][1]
+    
+    # Mejor camino conocido: arista (desde, hasta) que une ambos árboles
+    mejor, desde, hasta, peso_union = float('inf'), -1, -1, 0.0
+    
+    while sentidos[0][4] and sentidos[1][4]:
+        tope_ida, tope_vuelta = sentidos[0][4].peek_min()[0], sentidos[1][4].peek_min()[0]
+        if tope_ida + tope_vuelta >= mejor:
+            break
+        ida = tope_ida <= tope_vuelta
+        (indptr, indices, pesos), distancias, arbol, pesos_arbol, cola = sentidos[0 if ida else 1]
+        otras = dist_vuelta if ida else dist_ida
+        
+        dist_actual, nodo_actual = cola.pop_min()
+        inicio, fin = indptr[nodo_actual], indptr[nodo_actual + 1]
+        for vecino, peso in zip(indices[inicio:fin].tolist(), pesos[inicio:fin].tolist()):
+            nueva_dist = dist_actual + peso
+            if nueva_dist < distancias[vecino]:
+                distancias[vecino] = nueva_dist
+                arbol[vecino] = nodo_actual
+                pesos_arbol[vecino] = peso
+                if vecino in cola:
+                    cola.decrease_key(vecino, nueva_dist)
+                else:
+                    cola.insert(vecino, nueva_dist)
+            if nueva_dist + otras[vecino] < mejor:
+                mejor = nueva_dist + otras[vecino]
+                desde, hasta = (nodo_actual, vecino) if ida else (vecino, nodo_actual)
+                peso_union = peso
+    
+    if mejor == float('inf'):
+        return float('inf'), []
+    
+    # Camino inicio -> desde y hasta -> fin; la distancia se suma desde inicio, en orden
+    previos, siguientes, peso_siguiente = sentidos[0][2], sentidos[1][2], sentidos[1][3]
+    camino = []
+    nodo = desde
+    while nodo != -1:
+        camino.append(nodo)
+        nodo = previos[nodo]
+    camino.reverse()
+    distancia = dist_ida[desde] + peso_union
+    nodo = hasta
+    while nodo != -1:
+        camino.append(nodo)
+        if nodo != fin_idx:
+            distancia += peso_siguiente[nodo]
+        nodo = siguientes[nodo]
+    return distancia, camino
+
+def _dijkstra_acotado_python(indptr, indices, pesos, inicio, limite, distancias, previos):
+    """
+    Versión en Python puro de _dijkstra_acotado_numba: Dijkstra desde un origen
+    hacia todos los nodos, sin pasar de limite, escribiendo en distancias y previos.
+    """
+    n = len(indptr) - 1
+    distancias[inicio] = 0.0
+    previos[inicio] = inicio
+    
+    cola = IndexedHeap(n)
+    cola.insert(inicio, 0.0)
+    
+    while cola:
+        dist_actual, nodo_actual = cola.pop_min()
+        inicio_fila, fin_fila = indptr[nodo_actual], indptr[nodo_actual + 1]
+        for vecino, peso in zip(indices[inicio_fila:fin_fila].tolist(), pesos[inicio_fila:fin_fila].tolist()):
+            nueva_dist = dist_actual + peso
+            if nueva_dist < distancias[vecino] and nueva_dist <= limite:
+                distancias[vecino] = nueva_dist
+                previos[vecino] = nodo_actual
+                if vecino in cola:
+                    cola.decrease_key(vecino, nueva_dist)
+                else:
+                    cola.insert(vecino, nueva_dist)
+
+def dijkstra_multi(origenes: List[int], grafo_csr: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                   threshold: float = float('inf')) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dijkstra desde varios orígenes independientes en una sola llamada, sin bucle en Python:
+    SciPy los recorre en C y Numba reparte los orígenes entre núcleos con prange.
+    
+    Args:
+        origenes: Índices de los nodos de origen
+        grafo_csr: Tupla (indptr, indices, pesos) generada por construir_csr
+        threshold: Distancia máxima a explorar desde cada origen
+    
+    Returns:
+        Tupla (distancias, previos) de forma (len(origenes), n); la fila k corresponde
+        a origenes[k]. previos usa -1 como "sin camino" y previos[k][origenes[k]] = origenes[k]
+    """
+    indptr, indices, pesos = grafo_csr
+    n = len(indptr) - 1
+    origenes = np.asarray(origenes, dtype=np.int32)
+    filas = np.arange(len(origenes))
+    
+    if SCIPY_DISPONIBLE:
+        grafo = csr_matrix((pesos, indices, indptr), shape=(n, n))
+        distancias, previos = _dijkstra_scipy(grafo, directed=True, indices=origenes,
+                                              limit=threshold, return_predecessors=True)
+        distancias = distancias.reshape(len(origenes), n)
+        previos = previos.reshape(len(origenes), n).astype(np.int32)
+        previos[previos < 0] = -1
+        previos[filas, origenes] = origenes
+        return distancias, previos
+    
+    # Matriz de resultados preasignada: cada origen escribe solo en su fila
+    distancias = np.full((len(origenes), n), np.inf, dtype=np.float64)
+    previos = np.full((len(origenes), n), -1, dtype=np.int32)
+    
+    if NUMBA_DISPONIBLE:
+        _dijkstra_multi_numba(indptr, indices, pesos, origenes, threshold, distancias, previos)
+    else:
+        for k in filas:
+            _dijkstra_acotado_python(indptr, indices, pesos, int(origenes[k]), threshold,
+                                     distancias[k], previos[k])
+    
+    return distancias, previos
+
+def reconstruir_camino(previos: np.ndarray, inicio_idx: int, fin_idx: int) -> List[int]:
+    """
+    Reconstruye el camino inicio -> fin a partir de una fila de previos de dijkstra_multi.
+    
+    Args:
+        previos: Fila de predecesores del origen inicio_idx
+        inicio_idx: Índice del nodo inicial
+        fin_idx: Índice del nodo destino
+    
+    Returns:
+        Lista de índices del camino (vacía si no hay camino)
+    """
+    if previos[fin_idx] == -1:
+        return []
+    
+    camino = [fin_idx]
+    nodo = fin_idx
+    while nodo != inicio_idx:
+        nodo = int(previos[nodo])
+        camino.append(nodo)
+    camino.reverse()
+    return camino
+
+def apsp_bounded(matriz_adyacencia: np.ndarray, threshold: float = float('inf')) -> Tuple[List[List[float]], List[List[int]]]:
+    """
+    Caminos mínimos entre todos los pares con N ejecuciones de Dijkstra acotadas por distancia.
+    En grafos dispersos es O(N² + N·K log K), con K los nodos a menos de threshold,
+    frente a O(N³) de Floyd-Warshall.
+    
+    Args:
+        matriz_adyacencia: Matriz de adyacencia densa (n, n) con pesos (inf = sin conexión)
+        threshold: Distancia máxima de interés; los pares más lejanos quedan como sin camino
+    
+    Returns:
+        Tupla (matriz_distancias, matriz_predecesores) con el mismo formato que
+        floyd_warshall, para poder usarla en su lugar (p. ej. en encontrar_camino_floyd_warshall)
+    """
+    grafo_csr = construir_csr(matriz_adyacencia)
+    n = len(grafo_csr[0]) - 1
+    
+    # Todos los nodos como origen: la fila i queda en el formato de floyd_warshall
+    distancias, predecesores = dijkstra_multi(range(n), grafo_csr, threshold)
+    return distancias.tolist(), predecesores.tolist()
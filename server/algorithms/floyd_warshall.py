@@ -1,6 +1,14 @@
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Optional
+import numpy as np
+from .numba_kernels import NUMBA_DISPONIBLE, _floyd_warshall_numba
 
-def floyd_warshall(matriz_adyacencia: List[List[float]]) -> Tuple[List[List[float]], List[List[int]]]:
+try:
+    from scipy.sparse.csgraph import floyd_warshall as _floyd_warshall_scipy
+    SCIPY_DISPONIBLE = True
+except ImportError:
+    SCIPY_DISPONIBLE = False
+
+def floyd_warshall(matriz_adyacencia: np.ndarray) -> Tuple[List[List[float]], List[List[int]]]:
     """
     Algoritmo de Floyd-Warshall para encontrar los caminos más cortos entre todos los pares de nodos.
     
@@ -12,34 +20,44 @@ def floyd_warshall(matriz_adyacencia: List[List[float]]) -> Tuple[List[List[floa
         - matriz_distancias: Matriz con las distancias mínimas entre todos los pares
         - matriz_predecesores: Matriz para reconstruir los caminos
     """
-    n = len(matriz_adyacencia)
-    
-    # Inicializar matrices de distancias y predecesores
-    distancias = [[float('inf')] * n for _ in range(n)]
-    predecesores = [[-1] * n for _ in range(n)]
-    
-    # Copiar la matriz de adyacencia inicial
-    for i in range(n):
-        for j in range(n):
-            distancias[i][j] = matriz_adyacencia[i][j]
-            if i != j and matriz_adyacencia[i][j] != float('inf'):
-                predecesores[i][j] = i
+    # Copiar la matriz de adyacencia inicial como arreglo contiguo float64
+    distancias = np.array(matriz_adyacencia, dtype=np.float64)
+    n = distancias.shape[0]
+    
+    if SCIPY_DISPONIBLE:
+        # Implementación en C de SciPy (inf = sin conexión)
+        distancias, predecesores = _floyd_warshall_scipy(distancias, directed=True,
+                                                         return_predecessors=True)
+        # Adaptar al formato propio: -1 sin camino y predecesores[i][i] = i
+        predecesores[predecesores < 0] = -1
+        np.fill_diagonal(predecesores, np.arange(n))
+        return distancias.tolist(), predecesores.tolist()
+    
+    # Predecesor inicial: i si existe arista directa i -> j, -1 en caso contrario
+    predecesores = np.where(np.isfinite(distancias), np.arange(n)[:, None], -1).astype(np.int32)
     
     # Diagonal en 0 (distancia de un nodo a sí mismo)
-    for i in range(n):
-        distancias[i][i] = 0.0
-        predecesores[i][i] = i
+    np.fill_diagonal(distancias, 0.0)
+    np.fill_diagonal(predecesores, np.arange(n))
     
-    # Floyd-Warshall: probar todos los nodos como intermediarios
+    if NUMBA_DISPONIBLE:
+        # Kernel compilado: bucle k secuencial, filas i en paralelo
+        _floyd_warshall_numba(distancias, predecesores)
+        return distancias.tolist(), predecesores.tolist()
+    
+    # Floyd-Warshall: probar todos los nodos como intermediarios.
+    # Para cada k, todas las parejas (i, j) se actualizan a la vez con broadcasting.
     for k in range(n):
-        for i in range(n):
-            for j in range(n):
-                # Si el camino a través de k es más corto
-                if distancias[i][k] + distancias[k][j] < distancias[i][j]:
-                    distancias[i][j] = distancias[i][k] + distancias[k][j]
-                    predecesores[i][j] = predecesores[k][j]
-    
-    return distancias, predecesores
+        # Solo las filas i que llegan a k pueden mejorar (dist[i][k] finito)
+        filas = np.flatnonzero(np.isfinite(distancias[:, k]))
+        
+        # Distancia pasando por k: dist[i][k] + dist[k][j]
+        nuevas = np.add.outer(distancias[filas, k], distancias[k, :])
+        mejora = np.less(nuevas, distancias[filas])
+        distancias[filas] = np.where(mejora, nuevas, distancias[filas])
+        predecesores[filas] = np.where(mejora, predecesores[k, :][None, :], predecesores[filas])
+    
+    return distancias.tolist(), predecesores.tolist()
 
 def reconstruir_camino_floyd_warshall(
     inicio_idx: int, 
@@ -79,9 +97,10 @@ def reconstruir_camino_floyd_warshall(
     return camino
 
 def encontrar_camino_floyd_warshall(
-    matriz_adyacencia: List[List[float]], 
+    matriz_adyacencia: np.ndarray, 
     inicio_idx: int, 
-    fin_idx: int
+    fin_idx: int,
+    resultado: Optional[Tuple[List[List[float]], List[List[int]]]] = None
 ) -> Tuple[float, List[int]]:
     """
     Encuentra el camino más corto entre dos nodos usando Floyd-Warshall.
@@ -90,12 +109,16 @@ def encontrar_camino_floyd_warshall(
         matriz_adyacencia: Matriz de adyacencia con pesos
         inicio_idx: Índice del nodo inicial
         fin_idx: Índice del nodo destino
+        resultado: Tupla (distancias, predecesores) ya calculada por floyd_warshall.
+            Si se pasa, solo se reconstruye el camino (O(largo del camino))
     
     Returns:
         Tupla (distancia_total, camino) donde camino es lista de índices
     """
-    # Ejecutar Floyd-Warshall
-    distancias, predecesores = floyd_warshall(matriz_adyacencia)
+    # Ejecutar Floyd-Warshall solo si no hay un resultado previo
+    if resultado is None:
+        resultado = floyd_warshall(matriz_adyacencia)
+    distancias, predecesores = resultado
     
     # Obtener la distancia mínima
     distancia_total = distancias[inicio_idx][fin_idx]
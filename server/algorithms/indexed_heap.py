@@ -0,0 +1,84 @@
+from typing import Tuple
+
+class IndexedHeap:
+    """
+    Heap binario indexado por nodo con operación decrease-key.
+    Cada nodo aparece a lo sumo una vez, así que la cola nunca acumula entradas obsoletas.
+    Los empates se resuelven por (clave, nodo), igual que heapq con tuplas.
+    """
+    
+    def __init__(self, n: int):
+        self._heap = []  # Nodos ordenados como heap
+        self._pos = [-1] * n  # Posición de cada nodo en el heap (-1 si no está)
+        self._claves = [0.0] * n  # Clave actual de cada nodo
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+    
+    def __contains__(self, nodo: int) -> bool:
+        return self._pos[nodo] != -1
+    
+    def insert(self, nodo: int, clave: float):
+        """Agrega un nodo nuevo con su clave"""
+        self._claves[nodo] = clave
+        self._pos[nodo] = len(self._heap)
+        self._heap.append(nodo)
+        self._subir(len(self._heap) - 1)
+    
+    def decrease_key(self, nodo: int, clave: float):
+        """Reduce la clave de un nodo que ya está en el heap"""
+        self._claves[nodo] = clave
+        self._subir(self._pos[nodo])
+    
+    def peek_min(self) -> Tuple[float, int]:
+        """Retorna (clave, nodo) del mínimo sin extraerlo"""
+        nodo = self._heap[0]
+        return self._claves[nodo], nodo
+    
+    def pop_min(self) -> Tuple[float, int]:
+        """Extrae el nodo con menor clave y retorna (clave, nodo)"""
+        heap = self._heap
+        nodo = heap[0]
+        ultimo = heap.pop()
+        self._pos[nodo] = -1
+        if heap:
+            heap[0] = ultimo
+            self._pos[ultimo] = 0
+            self._bajar(0)
+        return self._claves[nodo], nodo
+    
+    def _menor(self, a: int, b: int) -> bool:
+        """Compara dos nodos por (clave, nodo)"""
+        clave_a, clave_b = self._claves[a], self._claves[b]
+        return clave_a < clave_b or (clave_a == clave_b and a < b)
+    
+    def _subir(self, i: int):
+        heap, pos = self._heap, self._pos
+        nodo = heap[i]
+        while i > 0:
+            padre = (i - 1) >> 1
+            if not self._menor(nodo, heap[padre]):
+                break
+            heap[i] = heap[padre]
+            pos[heap[i]] = i
+            i = padre
+        heap[i] = nodo
+        pos[nodo] = i
+    
+    def _bajar(self, i: int):
+        heap, pos = self._heap, self._pos
+        n = len(heap)
+        nodo = heap[i]
+        while True:
+            hijo = 2 * i + 1
+            if hijo >= n:
+                break
+            if hijo + 1 < n and self._menor(heap[hijo + 1], heap[hijo]):
+                hijo += 1
+            if not self._menor(heap[hijo], nodo):
+                break
+            heap[i] = heap[hijo]
+            pos[heap[i]] = i
+            i = hijo
+        heap[i] = nodo
+        pos[nodo] = i
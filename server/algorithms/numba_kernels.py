@@ -0,0 +1,464 @@
+"""
+Kernels compilados con Numba para los algoritmos de caminos mínimos,
+la búsqueda de nodos cercanos al construir el grafo y la elección de
+nodos por distancia geográfica (Haversine) de los pedidos mock.
+Si Numba no está instalado, NUMBA_DISPONIBLE es False y los algoritmos
+usan su implementación con NumPy / Python puro.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_DISPONIBLE = True
+except ImportError:
+    NUMBA_DISPONIBLE = False
+
+# fastmath sin 'nnan'/'ninf': las distancias usan np.inf como "sin conexión"
+# y las comparaciones contra infinito deben seguir siendo válidas
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+if NUMBA_DISPONIBLE:
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _floyd_warshall_numba(dist, pred):
+        """
+        Relajación de Floyd-Warshall en sitio sobre dist (float64[:, :]) y pred (int32[:, :]).
+        La fila k no cambia durante la iteración k (dist[k, k] = 0), por lo que
+        las filas i se pueden procesar en paralelo.
+        """
+        n = dist.shape[0]
+        for k in range(n):
+            for i in prange(n):
+                dik = dist[i, k]
+                if dik == np.inf:
+                    continue
+                for j in range(n):
+                    nueva = dik + dist[k, j]
+                    if nueva < dist[i, j]:
+                        dist[i, j] = nueva
+                        pred[i, j] = pred[k, j]
+    
+    @njit(cache=True)
+    def _heap_menor(claves, nodos, a, b):
+        """Compara dos entradas del heap como tuplas (clave, nodo), igual que heapq"""
+        return claves[a] < claves[b] or (claves[a] == claves[b] and nodos[a] < nodos[b])
+    
+    @njit(cache=True)
+    def _heap_intercambiar(claves, nodos, a, b):
+        claves[a], claves[b] = claves[b], claves[a]
+        nodos[a], nodos[b] = nodos[b], nodos[a]
+    
+    @njit(cache=True)
+    def _heap_push(claves, nodos, tam, clave, nodo):
+        """Inserta (clave, nodo) en el heap binario y retorna el nuevo tamaño"""
+        i = tam
+        claves[i] = clave
+        nodos[i] = nodo
+        while i > 0:
+            padre = (i - 1) >> 1
+            if not _heap_menor(claves, nodos, i, padre):
+                break
+            _heap_intercambiar(claves, nodos, i, padre)
+            i = padre
+        return tam + 1
+    
+    @njit(cache=True)
+    def _heap_pop(claves, nodos, tam):
+        """Extrae el mínimo del heap y retorna (clave, nodo, nuevo_tamaño)"""
+        clave = claves[0]
+        nodo = nodos[0]
+        tam -= 1
+        claves[0] = claves[tam]
+        nodos[0] = nodos[tam]
+        i = 0
+        while True:
+            menor = i
+            izq = 2 * i + 1
+            der = izq + 1
+            if izq < tam and _heap_menor(claves, nodos, izq, menor):
+                menor = izq
+            if der < tam and _heap_menor(claves, nodos, der, menor):
+                menor = der
+            if menor == i:
+                break
+            _heap_intercambiar(claves, nodos, i, menor)
+            i = menor
+        return clave, nodo, tam
+    
+    @njit(cache=True)
+    def _dijkstra_numba(indptr, indices, pesos, inicio, fin):
+        """
+        Dijkstra sobre un grafo CSR con heap binario de arreglos (sin tuplas ni floats boxeados).
+        
+        Returns:
+            Tupla (distancia, camino) donde camino es un arreglo int32 (vacío si no hay camino)
+        """
+        n = indptr.shape[0] - 1
+        distancias = np.full(n, np.inf)
+        previos = np.full(n, -1, dtype=np.int32)
+        
+        # Cada relajación exitosa inserta a lo sumo una entrada: basta con |E| + 1
+        capacidad = indices.shape[0] + 1
+        claves = np.empty(capacidad, dtype=np.float64)
+        nodos = np.empty(capacidad, dtype=np.int32)
+        
+        distancias[inicio] = 0.0
+        tam = _heap_push(claves, nodos, 0, 0.0, inicio)
+        
+        while tam > 0:
+            dist_actual, nodo_actual, tam = _heap_pop(claves, nodos, tam)
+            # Entrada obsoleta: el nodo ya se alcanzó con una distancia menor
+            if dist_actual > distancias[nodo_actual]:
+                continue
+            if nodo_actual == fin:
+                break
+            for k in range(indptr[nodo_actual], indptr[nodo_actual + 1]):
+                vecino = indices[k]
+                nueva_dist = dist_actual + pesos[k]
+                # No encolar caminos que ya no pueden mejorar la distancia al destino
+                if nueva_dist < distancias[vecino] and nueva_dist < distancias[fin]:
+                    distancias[vecino] = nueva_dist
+                    previos[vecino] = nodo_actual
+                    tam = _heap_push(claves, nodos, tam, nueva_dist, vecino)
+        
+        if distancias[fin] == np.inf:
+            return np.inf, np.empty(0, dtype=np.int32)
+        
+        # Reconstruir el camino desde el destino
+        camino = np.empty(n, dtype=np.int32)
+        largo = 0
+        nodo = fin
+        while nodo != -1:
+            camino[largo] = nodo
+            largo += 1
+            nodo = previos[nodo]
+        return distancias[fin], camino[:largo][::-1].copy()
+    
+    @njit(nogil=True, cache=True)
+    def _dijkstra_acotado_numba(indptr, indices, pesos, inicio, limite, distancias, previos):
+        """
+        Dijkstra desde un origen hacia todos los nodos, escribiendo en las filas
+        distancias (float64[:]) y previos (int32[:]) ya inicializadas con inf / -1.
+        Se detiene cuando el tope del heap supera limite. Libera el GIL (nogil),
+        así que varios orígenes pueden correr en paralelo.
+        """
+        capacidad = indices.shape[0] + 1
+        claves = np.empty(capacidad, dtype=np.float64)
+        nodos = np.empty(capacidad, dtype=np.int32)
+        
+        distancias[inicio] = 0.0
+        previos[inicio] = inicio
+        tam = _heap_push(claves, nodos, 0, 0.0, inicio)
+        
+        while tam > 0:
+            dist_actual, nodo_actual, tam = _heap_pop(claves, nodos, tam)
+            if dist_actual > distancias[nodo_actual]:
+                continue
+            for k in range(indptr[nodo_actual], indptr[nodo_actual + 1]):
+                vecino = indices[k]
+                nueva_dist = dist_actual + pesos[k]
+                # Los nodos más allá del límite quedan en inf (igual que SciPy con limit)
+                if nueva_dist < distancias[vecino] and nueva_dist <= limite:
+                    distancias[vecino] = nueva_dist
+                    previos[vecino] = nodo_actual
+                    tam = _heap_push(claves, nodos, tam, nueva_dist, vecino)
+    
+    @njit(parallel=True, cache=True)
+    def _dijkstra_multi_numba(indptr, indices, pesos, origenes, limite, distancias, previos):
+        """
+        Ejecuta _dijkstra_acotado_numba para cada origen en paralelo (prange).
+        La fila k de distancias / previos corresponde a origenes[k].
+        """
+        for k in prange(origenes.shape[0]):
+            _dijkstra_acotado_numba(indptr, indices, pesos, origenes[k], limite,
+                                    distancias[k], previos[k])
+    
+    @njit(cache=True)
+    def _dijkstra_bidireccional_numba(indptr, indices, pesos, indptr_inv, indices_inv, pesos_inv, inicio, fin):
+        """
+        Dijkstra bidireccional entre inicio y fin: avanza desde ambos extremos (el grafo
+        inverso da las aristas entrantes) y se detiene cuando la suma de los topes de los
+        dos heaps ya no puede mejorar el mejor camino encontrado.
+        
+        Returns:
+            Tupla (distancia, camino) donde camino es un arreglo int32 (vacío si no hay camino)
+        """
+        n = indptr.shape[0] - 1
+        if inicio == fin:
+            camino = np.empty(1, dtype=np.int32)
+            camino[0] = inicio
+            return 0.0, camino
+        
+        dist_ida = np.full(n, np.inf)
+        dist_vuelta = np.full(n, np.inf)
+        previos = np.full(n, -1, dtype=np.int32)  # Árbol desde inicio
+        siguientes = np.full(n, -1, dtype=np.int32)  # Árbol hacia fin (grafo inverso)
+        peso_siguiente = np.zeros(n)  # Peso de la arista nodo -> siguientes[nodo]
+        
+        claves_ida = np.empty(indices.shape[0] + 1, dtype=np.float64)
+        nodos_ida = np.empty(indices.shape[0] + 1, dtype=np.int32)
+        claves_vuelta = np.empty(indices_inv.shape[0] + 1, dtype=np.float64)
+        nodos_vuelta = np.empty(indices_inv.shape[0] + 1, dtype=np.int32)
+        
+        dist_ida[inicio] = 0.0
+        dist_vuelta[fin] = 0.0
+        tam_ida = _heap_push(claves_ida, nodos_ida, 0, 0.0, inicio)
+        tam_vuelta = _heap_push(claves_vuelta, nodos_vuelta, 0, 0.0, fin)
+        
+        # Mejor camino conocido: arista (desde, hasta) que une ambos árboles
+        mejor = np.inf
+        desde = -1
+        hasta = -1
+        peso_union = 0.0
+        
+        while tam_ida > 0 and tam_vuelta > 0:
+            if claves_ida[0] + claves_vuelta[0] >= mejor:
+                break
+            if claves_ida[0] <= claves_vuelta[0]:
+                dist_actual, nodo_actual, tam_ida = _heap_pop(claves_ida, nodos_ida, tam_ida)
+                if dist_actual > dist_ida[nodo_actual]:
+                    continue
+                for k in range(indptr[nodo_actual], indptr[nodo_actual + 1]):
+                    vecino = indices[k]
+                    nueva_dist = dist_actual + pesos[k]
+                    if nueva_dist < dist_ida[vecino]:
+                        dist_ida[vecino] = nueva_dist
+                        previos[vecino] = nodo_actual
+                        tam_ida = _heap_push(claves_ida, nodos_ida, tam_ida, nueva_dist, vecino)
+                    if nueva_dist + dist_vuelta[vecino] < mejor:
+                        mejor = nueva_dist + dist_vuelta[vecino]
+                        desde, hasta, peso_union = nodo_actual, vecino, pesos[k]
+            else:
+                dist_actual, nodo_actual, tam_vuelta = _heap_pop(claves_vuelta, nodos_vuelta, tam_vuelta)
+                if dist_actual > dist_vuelta[nodo_actual]:
+                    continue
+                for k in range(indptr_inv[nodo_actual], indptr_inv[nodo_actual + 1]):
+                    vecino = indices_inv[k]
+                    nueva_dist = dist_actual + pesos_inv[k]
+                    if nueva_dist < dist_vuelta[vecino]:
+                        dist_vuelta[vecino] = nueva_dist
+                        siguientes[vecino] = nodo_actual
+                        peso_siguiente[vecino] = pesos_inv[k]
+                        tam_vuelta = _heap_push(claves_vuelta, nodos_vuelta, tam_vuelta, nueva_dist, vecino)
+                    if nueva_dist + dist_ida[vecino] < mejor:
+                        mejor = nueva_dist + dist_ida[vecino]
+                        desde, hasta, peso_union = vecino, nodo_actual, pesos_inv[k]
+        
+        if mejor == np.inf:
+            return np.inf, np.empty(0, dtype=np.int32)
+        
+        # Camino inicio -> desde (árbol de ida, al revés) y hasta -> fin (árbol de vuelta).
+        # La distancia se vuelve a sumar arista por arista desde inicio, en el mismo orden
+        # que un Dijkstra de un solo sentido
+        camino = np.empty(n, dtype=np.int32)
+        largo = 0
+        nodo = desde
+        while nodo != -1:
+            camino[largo] = nodo
+            largo += 1
+            nodo = previos[nodo]
+        camino[:largo] = camino[:largo][::-1].copy()
+        distancia = dist_ida[desde] + peso_union
+        nodo = hasta
+        while nodo != -1:
+            camino[largo] = nodo
+            largo += 1
+            if nodo != fin:
+                distancia += peso_siguiente[nodo]
+            nodo = siguientes[nodo]
+        return distancia, camino[:largo].copy()
+    
+    @njit(cache=True)
+    def _held_karp_numba(costos, cerrar):
+        """
+        Held-Karp (programación dinámica sobre subconjuntos) para TSP exacto.
+        El nodo 0 es el inicio fijo; dp[mascara, j] es el costo mínimo de salir de 0,
+        visitar los nodos de mascara y terminar en el nodo j + 1.
+        
+        Returns:
+            Arreglo int32 con el orden de visita (empieza en 0). Si cerrar es True
+            se minimiza el ciclo que vuelve a 0; si no, el camino abierto.
+        """
+        m = costos.shape[0]
+        k = m - 1
+        if k == 0:
+            return np.zeros(1, dtype=np.int32)
+        
+        total = 1 << k
+        dp = np.full((total, k), np.inf)
+        padre = np.full((total, k), -1, dtype=np.int8)
+        for j in range(k):
+            dp[1 << j, j] = costos[0, j + 1]
+        
+        for mascara in range(1, total):
+            for j in range(k):
+                actual = dp[mascara, j]
+                if actual == np.inf:
+                    continue
+                for siguiente in range(k):
+                    if mascara & (1 << siguiente):
+                        continue
+                    nueva_mascara = mascara | (1 << siguiente)
+                    nuevo = actual + costos[j + 1, siguiente + 1]
+                    if nuevo < dp[nueva_mascara, siguiente]:
+                        dp[nueva_mascara, siguiente] = nuevo
+                        padre[nueva_mascara, siguiente] = j
+        
+        # Mejor último nodo (sumando la vuelta al inicio si el recorrido es cerrado)
+        completa = total - 1
+        ultimo = 0
+        mejor = np.inf
+        for j in range(k):
+            costo = dp[completa, j]
+            if cerrar:
+                costo += costos[j + 1, 0]
+            if costo < mejor:
+                mejor = costo
+                ultimo = j
+        
+        # Reconstruir el orden desde el final con la tabla de padres
+        orden = np.empty(m, dtype=np.int32)
+        orden[0] = 0
+        mascara = completa
+        for posicion in range(m - 1, 0, -1):
+            orden[posicion] = ultimo + 1
+            anterior = padre[mascara, ultimo]
+            mascara ^= 1 << ultimo
+            ultimo = anterior
+        return orden
+    
+    @njit(cache=True)
+    def _two_opt_numba(costos, ruta, epsilon):
+        """
+        2-opt con "don't look bits" sobre las posiciones de la submatriz de costos.
+        Mismo orden de barrido y de movimientos que _two_opt de tsp.py, así que
+        devuelve la misma ruta.
+        
+        Returns:
+            Copia de ruta mejorada hasta un óptimo local de 2-opt
+        """
+        mejor_ruta = ruta.copy()
+        n = mejor_ruta.shape[0]
+        no_mirar = np.zeros(n, dtype=np.bool_)
+        
+        while True:
+            mejorado = False
+            salto_posiciones = False
+            for i in range(1, n - 2):
+                if no_mirar[i]:
+                    salto_posiciones = True
+                    continue
+                
+                mejora_i = False
+                for j in range(i + 2, n):
+                    a, b = mejor_ruta[i - 1], mejor_ruta[i]
+                    c, d = mejor_ruta[j - 1], mejor_ruta[j]
+                    delta = costos[a, c] + costos[b, d] - costos[a, b] - costos[c, d]
+                    
+                    if delta < -epsilon:
+                        mejor_ruta[i:j] = mejor_ruta[i:j][::-1].copy()
+                        no_mirar[i - 1] = False
+                        no_mirar[i] = False
+                        no_mirar[i + 1] = False
+                        no_mirar[j - 1] = False
+                        no_mirar[j] = False
+                        mejora_i = True
+                        mejorado = True
+                
+                if not mejora_i:
+                    no_mirar[i] = True
+            
+            if not mejorado:
+                if not salto_posiciones:
+                    break
+                no_mirar[:] = False
+        
+        return mejor_ruta
+    
+    @njit(parallel=True, cache=True)
+    def _pares_cercanos_numba(xs, ys, orden, radio):
+        """
+        Pares de nodos a distancia menor que radio, con xs/ys ordenados por x y orden
+        el índice original de cada posición. Cada posición k solo mira las siguientes
+        mientras dx < radio. Dos pasadas en paralelo (prange): contar los pares de cada
+        k y luego escribirlos en el arreglo preasignado con ese tamaño exacto.
+        Retorna un arreglo int64 (P, 2) con (min(i, j), max(i, j)) por par, sin ordenar.
+        """
+        n = xs.shape[0]
+        radio2 = radio * radio
+        cuentas = np.zeros(n + 1, dtype=np.int64)
+        for k in prange(n):
+            total = 0
+            for m in range(k + 1, n):
+                dx = xs[m] - xs[k]
+                if dx >= radio:
+                    break
+                dy = ys[m] - ys[k]
+                if dx * dx + dy * dy < radio2:
+                    total += 1
+            cuentas[k + 1] = total
+        
+        inicio = np.cumsum(cuentas)
+        pares = np.empty((inicio[n], 2), dtype=np.int64)
+        for k in prange(n):
+            p = inicio[k]
+            for m in range(k + 1, n):
+                dx = xs[m] - xs[k]
+                if dx >= radio:
+                    break
+                dy = ys[m] - ys[k]
+                if dx * dx + dy * dy < radio2:
+                    pares[p, 0] = min(orden[k], orden[m])
+                    pares[p, 1] = max(orden[k], orden[m])
+                    p += 1
+        return pares
+    
+    @njit(fastmath=_FASTMATH, cache=True)
+    def _haversine_km_numba(lat1, lon1, lat2, lon2):
+        """Distancia Haversine en km entre dos puntos en grados"""
+        lat1_rad, lat2_rad = np.radians(lat1), np.radians(lat2)
+        dlat = lat2_rad - lat1_rad
+        dlon = np.radians(lon2) - np.radians(lon1)
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+        return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    @njit(fastmath=_FASTMATH, cache=True)
+    def _elegir_candidato_numba(lats, lons, usados, lat_obj, lon_obj, lats_usados, lons_usados,
+                                separacion_km, max_km):
+        """
+        Elige en una sola pasada el nodo libre (usados[i] False) y a al menos separacion_km
+        de todos los (lats_usados, lons_usados) que esté más cerca de (lat_obj, lon_obj),
+        siempre que no pase de max_km. Retorna (mejor, primero_libre): el índice del mejor
+        candidato (-1 si no hay) y el del primer nodo libre y separado (-1 si no hay).
+        """
+        mejor = -1
+        mejor_distancia = np.inf
+        primero_libre = -1
+        for i in range(lats.shape[0]):
+            if usados[i]:
+                continue
+            separado = True
+            for j in range(lats_usados.shape[0]):
+                if _haversine_km_numba(lats_usados[j], lons_usados[j], lats[i], lons[i]) < separacion_km:
+                    separado = False
+                    break
+            if not separado:
+                continue
+            if primero_libre == -1:
+                primero_libre = i
+            distancia = _haversine_km_numba(lat_obj, lon_obj, lats[i], lons[i])
+            # Estricto: en caso de empate gana el primero, como el sort estable
+            if distancia <= max_km and distancia < mejor_distancia:
+                mejor = i
+                mejor_distancia = distancia
+        return mejor, primero_libre
+else:
+    _held_karp_numba = None
+    _two_opt_numba = None
+    _floyd_warshall_numba = None
+    _dijkstra_numba = None
+    _dijkstra_acotado_numba = None
+    _dijkstra_multi_numba = None
+    _dijkstra_bidireccional_numba = None
+    _pares_cercanos_numba = None
+    _haversine_km_numba = None
+    _elegir_candidato_numba = None
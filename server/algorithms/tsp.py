@@ -1,21 +1,38 @@
-from typing import List, Tuple
-import sys
-import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from algorithms.dijkstra import dijkstra
+from typing import List, Tuple, Optional
+import logging
+import numpy as np
+from .numba_kernels import NUMBA_DISPONIBLE, _held_karp_numba, _two_opt_numba
 
-def solve_tsp(matriz_adyacencia: List[List[float]], nodos_a_visitar: List[int], 
-              nodo_to_idx: dict, idx_to_nodo: dict, origen_fijo: int = None) -> Tuple[List[int], float]:
+logger = logging.getLogger(__name__)
+
+# Mejora mínima para aceptar un movimiento de búsqueda local
+_EPSILON = 1e-9
+
+# Costo de un tramo entre nodos sin conexión (componentes distintas del grafo)
+_PENALIZACION = 100.0
+
+# Hasta este número de nodos (inicio incluido) se resuelve exacto con Held-Karp, O(2^n · n²)
+_HELD_KARP_MAX_NODOS = 18
+
+def solve_tsp(matriz_adyacencia: np.ndarray, nodos_a_visitar: List[int], 
+              nodo_to_idx: dict, idx_to_nodo, origen_fijo: int = None,
+              usar_or_opt: bool = True, simetrica: Optional[bool] = None) -> Tuple[List[int], float]:
     """
-    Resuelve el problema del agente viajero (TSP) usando heurística Nearest Neighbor + 2-opt.
+    Resuelve el problema del agente viajero (TSP). Con hasta _HELD_KARP_MAX_NODOS nodos
+    usa Held-Karp (solución exacta); con más, heurística Nearest Neighbor + 2-opt
+    (alternado con Or-opt si usar_or_opt es True).
     Si se especifica origen_fijo, la ruta comenzará y terminará en ese nodo.
     
     Args:
-        matriz_adyacencia: Matriz de adyacencia con pesos
+        matriz_adyacencia: Matriz de distancias de camino mínimo entre todos los pares
+            (inf solo entre componentes no conectadas)
         nodos_a_visitar: Lista de IDs de nodos que deben ser visitados
         nodo_to_idx: Diccionario que mapea ID de nodo a índice en la matriz
-        idx_to_nodo: Diccionario que mapea índice en la matriz a ID de nodo
+        idx_to_nodo: Diccionario o arreglo que mapea índice en la matriz a ID de nodo
         origen_fijo: Nodo que debe ser el inicio y fin de la ruta (opcional)
+        usar_or_opt: Si es True, alterna 2-opt y Or-opt hasta que ninguno mejore la ruta
+        simetrica: Si la distancia de i a j es la misma que de j a i (por defecto se comprueba
+            sobre la submatriz de los nodos a visitar). Con False, la ruta nunca se recorre al revés
     
     Returns:
         Tupla (ruta_optimizada, distancia_total)
@@ -38,43 +55,87 @@ def solve_tsp(matriz_adyacencia: List[List[float]], nodos_a_visitar: List[int],
         # Si el origen no está en la lista, agregarlo
         nodos_para_visitar.insert(0, origen_fijo)
     
+    # Trabajar siempre sobre un ndarray (sin copia si ya lo es, como la matriz de GrafoWrapper)
+    matriz_adyacencia = np.asarray(matriz_adyacencia, dtype=np.float64)
+    
     # Convertir nodos a índices
     indices = [nodo_to_idx[nodo] for nodo in nodos_para_visitar if nodo in nodo_to_idx]
     
     # Logging para depuración
     nodos_no_encontrados = [nodo for nodo in nodos_para_visitar if nodo not in nodo_to_idx]
     if nodos_no_encontrados:
-        print(f"⚠️ ADVERTENCIA TSP: {len(nodos_no_encontrados)} nodos no encontrados en la matriz: {nodos_no_encontrados}")
-        print(f"   Nodos a visitar: {nodos_para_visitar}")
-        print(f"   Nodos encontrados: {len(indices)} de {len(nodos_para_visitar)}")
+        logger.warning("⚠️ ADVERTENCIA TSP: %d nodos no encontrados en la matriz: %s "
+                       "(nodos a visitar: %s, encontrados: %d de %d)", len(nodos_no_encontrados),
+                       nodos_no_encontrados, nodos_para_visitar, len(indices), len(nodos_para_visitar))
     
     if len(indices) == 0:
-        print("⚠️ ERROR TSP: No se encontraron nodos válidos en la matriz")
+        logger.error("⚠️ ERROR TSP: No se encontraron nodos válidos en la matriz")
         return [], 0.0
     
     if len(indices) == 1:
-        print(f"⚠️ ADVERTENCIA TSP: Solo se encontró 1 nodo válido de {len(nodos_para_visitar)} nodos solicitados")
-        nodo_unico = idx_to_nodo[indices[0]]
+        logger.warning("⚠️ ADVERTENCIA TSP: Solo se encontró 1 nodo válido de %d nodos solicitados", len(nodos_para_visitar))
+        nodo_unico = int(idx_to_nodo[indices[0]])
         if origen_fijo is not None:
             return [origen_fijo, nodo_unico, origen_fijo], 0.0
         return [nodo_unico], 0.0
     
-    # Si hay origen fijo, comenzar desde ese nodo
-    if origen_fijo is not None and origen_fijo in nodo_to_idx:
+    # Si hay origen fijo, comenzar desde ese nodo (recorrido cerrado)
+    recorrido_cerrado = origen_fijo is not None and origen_fijo in nodo_to_idx
+    if recorrido_cerrado:
         origen_idx = nodo_to_idx[origen_fijo]
         # Asegurar que el origen esté al inicio
         if origen_idx in indices:
             indices.remove(origen_idx)
-        ruta = _nearest_neighbor_desde_origen(matriz_adyacencia, indices, origen_idx)
+        inicio, resto = origen_idx, indices
     else:
-        # Heurística Nearest Neighbor normal
-        ruta = _nearest_neighbor(matriz_adyacencia, indices)
+        inicio, resto = indices[0], indices[1:]
     
-    # Mejora con 2-opt
-    ruta = _two_opt(matriz_adyacencia, ruta)
+    # Candidatos distintos del inicio, sin repetidos y en el orden recibido
+    resto = [idx for idx in dict.fromkeys(resto) if idx != inicio]
     
-    # Convertir índices de vuelta a IDs de nodos
-    ruta_nodos = [idx_to_nodo[idx] for idx in ruta]
+    if NUMBA_DISPONIBLE and len(resto) + 1 <= _HELD_KARP_MAX_NODOS:
+        # Pocos nodos: solución exacta con programación dinámica sobre subconjuntos
+        ruta = [inicio] + resto
+        matriz_costos = _matriz_penalizada(matriz_adyacencia, ruta)
+        posiciones = _held_karp_numba(matriz_costos, recorrido_cerrado).tolist()
+        if simetrica is None:
+            simetrica = _es_simetrica(matriz_costos)
+        # Con matriz simétrica el ciclo vale lo mismo en ambos sentidos; dejar el tramo más
+        # largo como vuelta al origen, que no se suma a la distancia si no hay conexión.
+        # Con calles de un solo sentido (OSRM) invertirlo dejaría de ser el óptimo
+        if (recorrido_cerrado and simetrica
+                and matriz_costos[0, posiciones[1]] > matriz_costos[posiciones[-1], 0]):
+            posiciones[1:] = posiciones[:0:-1]
+    else:
+        if recorrido_cerrado:
+            ruta = _nearest_neighbor_desde_origen(matriz_adyacencia, indices, origen_idx)
+        else:
+            # Heurística Nearest Neighbor normal
+            ruta = _nearest_neighbor(matriz_adyacencia, indices)
+        
+        # Matriz de costos solo entre los nodos de la ruta, con inf ya reemplazado por la
+        # penalización: 2-opt y la distancia total leen pesos sin comparar contra inf
+        matriz_costos = _matriz_penalizada(matriz_adyacencia, ruta)
+        posiciones = list(range(len(ruta)))
+        if simetrica is None:
+            simetrica = _es_simetrica(matriz_costos)
+        
+        # Mejora con 2-opt (sobre posiciones de la submatriz); Or-opt mueve tramos que 2-opt no alcanza.
+        # Invertir un tramo cambia su costo si la matriz no es simétrica: en ese caso no se usa
+        # 2-opt y Or-opt solo mueve tramos sin invertirlos
+        while True:
+            if simetrica:
+                posiciones = _two_opt(matriz_costos, posiciones)
+            if not usar_or_opt:
+                break
+            nuevas_posiciones = _or_opt(matriz_costos, posiciones, invertir_tramos=simetrica)
+            if nuevas_posiciones == posiciones:
+                break
+            posiciones = nuevas_posiciones
+    ruta = [ruta[p] for p in posiciones]
+    
+    # Convertir índices de vuelta a IDs de nodos (int de Python también si idx_to_nodo es un arreglo)
+    ruta_nodos = [int(idx_to_nodo[idx]) for idx in ruta]
     
     # Si hay origen fijo, agregarlo al inicio y final
     if origen_fijo is not None:
@@ -84,113 +145,189 @@ def solve_tsp(matriz_adyacencia: List[List[float]], nodos_a_visitar: List[int],
             ruta_nodos.append(origen_fijo)
     
     # Calcular distancia total
-    distancia_total = _calcular_distancia_total(matriz_adyacencia, ruta)
+    distancia_total = _calcular_distancia_total(matriz_costos, posiciones)
     
     # Si hay origen fijo, agregar distancia de retorno
     if origen_fijo is not None and len(ruta_nodos) > 1:
         origen_idx = nodo_to_idx[origen_fijo]
         ultimo_idx = nodo_to_idx[ruta_nodos[-2]] if ruta_nodos[-2] in nodo_to_idx else None
         if ultimo_idx is not None:
-            dist_retorno = matriz_adyacencia[ultimo_idx][origen_idx]
+            dist_retorno = matriz_adyacencia[ultimo_idx, origen_idx]
             if dist_retorno != float('inf'):
                 distancia_total += dist_retorno
     
     return ruta_nodos, distancia_total
 
-def _nearest_neighbor(matriz_adyacencia: List[List[float]], indices: List[int]) -> List[int]:
+def _nearest_neighbor(matriz_adyacencia: np.ndarray, indices: List[int]) -> List[int]:
     """Heurística del vecino más cercano"""
     if len(indices) <= 1:
         return indices
     
-    ruta = [indices[0]]
-    no_visitados = set(indices[1:])
-    
-    while no_visitados:
-        ultimo = ruta[-1]
-        mas_cercano = None
-        menor_dist = float('inf')
-        
-        for vecino in no_visitados:
-            dist = matriz_adyacencia[ultimo][vecino]
-            if dist < menor_dist:
-                menor_dist = dist
-                mas_cercano = vecino
-        
-        if mas_cercano is not None:
-            ruta.append(mas_cercano)
-            no_visitados.remove(mas_cercano)
-        else:
-            # Si no hay conexión, agregar el más cercano por distancia euclidiana
-            break
-    
-    return ruta
+    return _vecino_mas_cercano(matriz_adyacencia, indices[0], indices[1:])
 
-def _nearest_neighbor_desde_origen(matriz_adyacencia: List[List[float]], indices: List[int], origen_idx: int) -> List[int]:
+def _nearest_neighbor_desde_origen(matriz_adyacencia: np.ndarray, indices: List[int], origen_idx: int) -> List[int]:
     """Heurística del vecino más cercano comenzando desde un origen fijo"""
     if len(indices) == 0:
         return [origen_idx]
     
-    ruta = [origen_idx]
-    no_visitados = set(indices)
+    return _vecino_mas_cercano(matriz_adyacencia, origen_idx, indices)
+
+def _vecino_mas_cercano(matriz_adyacencia: np.ndarray, inicio: int, indices: List[int]) -> List[int]:
+    """
+    Construye la ruta desde inicio eligiendo siempre el candidato no visitado más cercano.
+    Los no visitados son una máscara booleana y la selección es un argmin vectorizado.
+    """
+    candidatos = np.unique(np.asarray(indices, dtype=np.int64))
+    no_visitados = np.ones(len(candidatos), dtype=bool)
+    ruta = [inicio]
     
-    while no_visitados:
-        ultimo = ruta[-1]
-        mas_cercano = None
-        menor_dist = float('inf')
+    for _ in range(len(candidatos)):
+        posiciones = np.flatnonzero(no_visitados)
+        distancias = matriz_adyacencia[ruta[-1], candidatos[posiciones]]
+        mejor = int(np.argmin(distancias))
         
-        for vecino in no_visitados:
-            dist = matriz_adyacencia[ultimo][vecino]
-            if dist < menor_dist:
-                menor_dist = dist
-                mas_cercano = vecino
-        
-        if mas_cercano is not None:
-            ruta.append(mas_cercano)
-            no_visitados.remove(mas_cercano)
-        else:
-            # Si no hay conexión, agregar el más cercano por distancia euclidiana
+        if distancias[mejor] == np.inf:
+            # Si no hay conexión con ningún candidato restante, terminar
             break
+        
+        no_visitados[posiciones[mejor]] = False
+        ruta.append(int(candidatos[posiciones[mejor]]))
     
     return ruta
 
-def _two_opt(matriz_adyacencia: List[List[float]], ruta: List[int]) -> List[int]:
-    """Mejora la ruta usando 2-opt"""
+def _es_simetrica(matriz_costos: np.ndarray) -> bool:
+    """
+    Si la matriz de costos es simétrica. Con tolerancia relativa: las distancias de camino
+    mínimo del grafo no dirigido pueden diferir en el último bit según el sentido en que
+    se sumaron, mientras que las de calles de un solo sentido (OSRM) difieren en metros.
+    """
+    return np.allclose(matriz_costos, matriz_costos.T, rtol=1e-9, atol=0.0)
+
+def _matriz_penalizada(matriz_adyacencia: np.ndarray, ruta: List[int]) -> np.ndarray:
+    """
+    Submatriz de costos entre los nodos de la ruta (fila/columna k = ruta[k]),
+    con los pares sin conexión a costo _PENALIZACION.
+    """
+    r = np.asarray(ruta)
+    submatriz = matriz_adyacencia[np.ix_(r, r)]
+    return np.where(np.isinf(submatriz), _PENALIZACION, submatriz)
+
+def _two_opt(matriz_costos: np.ndarray, ruta: List[int]) -> List[int]:
+    """
+    Mejora la ruta usando 2-opt.
+    Invertir ruta[i:j] solo cambia dos aristas: (a, b) y (c, d) pasan a ser (a, c) y (b, d),
+    así que la ganancia se calcula en O(1) sin recorrer la ruta completa
+    (la matriz es simétrica: el grafo es no dirigido).
+    
+    Usa "don't look bits": una posición i que no mejoró en su último barrido se salta
+    hasta que una inversión toque sus aristas. Cuando un barrido no mejora nada, se hace
+    una pasada completa sin saltos para confirmar que la ruta es un óptimo local de 2-opt.
+    """
+    if NUMBA_DISPONIBLE:
+        # Mismos movimientos compilados: la búsqueda local es el costo dominante con muchos nodos
+        return _two_opt_numba(matriz_costos, np.asarray(ruta, dtype=np.int64), _EPSILON).tolist()
+    
     mejor_ruta = ruta[:]
-    mejor_dist = _calcular_distancia_total(matriz_adyacencia, mejor_ruta)
-    mejorado = True
+    n = len(mejor_ruta)
+    no_mirar = np.zeros(n, dtype=bool)
     
-    while mejorado:
+    while True:
         mejorado = False
-        for i in range(1, len(mejor_ruta) - 2):
-            for j in range(i + 1, len(mejor_ruta)):
-                if j - i == 1:
+        salto_posiciones = False
+        for i in range(1, n - 2):
+            if no_mirar[i]:
+                salto_posiciones = True
+                continue
+            
+            mejora_i = False
+            for j in range(i + 2, n):
+                a, b = mejor_ruta[i - 1], mejor_ruta[i]
+                c, d = mejor_ruta[j - 1], mejor_ruta[j]
+                delta = (matriz_costos[a, c] + matriz_costos[b, d]
+                         - matriz_costos[a, b] - matriz_costos[c, d])
+                
+                # Intentar swap solo si mejora (con tolerancia para errores de redondeo)
+                if delta < -_EPSILON:
+                    mejor_ruta[i:j] = mejor_ruta[i:j][::-1]
+                    # Las aristas nuevas están en los extremos del tramo invertido
+                    no_mirar[[i - 1, i, i + 1, j - 1, j]] = False
+                    mejora_i = mejorado = True
+            
+            if not mejora_i:
+                no_mirar[i] = True
+        
+        if not mejorado:
+            if not salto_posiciones:
+                break
+            # Confirmar con una pasada completa antes de terminar
+            no_mirar[:] = False
+    
+    return mejor_ruta
+
+def _or_opt(matriz_costos: np.ndarray, ruta: List[int], invertir_tramos: bool = True) -> List[int]:
+    """
+    Mejora la ruta con Or-opt: mueve tramos de 1 a 3 nodos consecutivos a otra posición,
+    opcionalmente invertidos (solo si invertir_tramos es True, es decir, con matriz simétrica).
+    El primer y el último nodo de la ruta no se mueven.
+    """
+    mejor_ruta = ruta[:]
+    
+    while True:
+        movimiento = _buscar_movimiento_or_opt(matriz_costos, mejor_ruta, invertir_tramos)
+        if movimiento is None:
+            return mejor_ruta
+        
+        i, largo, j, invertir = movimiento
+        tramo = mejor_ruta[i:i + largo]
+        if invertir:
+            tramo.reverse()
+        resto = mejor_ruta[:i] + mejor_ruta[i + largo:]
+        # Insertar el tramo después de mejor_ruta[j] (su posición en resto)
+        destino = j + 1 if j < i else j - largo + 1
+        mejor_ruta = resto[:destino] + tramo + resto[destino:]
+
+def _buscar_movimiento_or_opt(matriz_costos: np.ndarray, ruta: List[int],
+                              invertir_tramos: bool = True) -> Optional[Tuple[int, int, int, bool]]:
+    """
+    Busca el primer movimiento Or-opt que mejora la ruta.
+    Quitar el tramo ruta[i:i + largo] y reinsertarlo entre ruta[j] y ruta[j + 1] cambia
+    solo seis aristas, así que la ganancia se calcula en O(1). El tramo invertido solo se
+    evalúa si invertir_tramos es True: su ganancia supone que recorrerlo al revés cuesta
+    lo mismo, lo que no vale con matriz asimétrica.
+    
+    Returns:
+        Tupla (i, largo, j, invertir) o None si ningún movimiento mejora
+    """
+    n = len(ruta)
+    for largo in (1, 2, 3):
+        for i in range(1, n - largo):
+            anterior, primero = ruta[i - 1], ruta[i]
+            ultimo, siguiente = ruta[i + largo - 1], ruta[i + largo]
+            ahorro = (matriz_costos[anterior, primero] + matriz_costos[ultimo, siguiente]
+                      - matriz_costos[anterior, siguiente])
+            
+            for j in range(n - 1):
+                # Las aristas que tocan el tramo no son posiciones de inserción
+                if i - 1 <= j <= i + largo - 1:
                     continue
                 
-                # Intentar swap
-                nueva_ruta = mejor_ruta[:]
-                nueva_ruta[i:j] = reversed(nueva_ruta[i:j])
-                nueva_dist = _calcular_distancia_total(matriz_adyacencia, nueva_ruta)
+                u, v = ruta[j], ruta[j + 1]
+                directo = matriz_costos[u, primero] + matriz_costos[ultimo, v] - matriz_costos[u, v]
+                invertido = matriz_costos[u, ultimo] + matriz_costos[primero, v] - matriz_costos[u, v]
                 
-                if nueva_dist < mejor_dist:
-                    mejor_ruta = nueva_ruta
-                    mejor_dist = nueva_dist
-                    mejorado = True
+                if directo - ahorro < -_EPSILON:
+                    return i, largo, j, False
+                if invertir_tramos and invertido - ahorro < -_EPSILON:
+                    return i, largo, j, True
     
-    return mejor_ruta
+    return None
 
-def _calcular_distancia_total(matriz_adyacencia: List[List[float]], ruta: List[int]) -> float:
-    """Calcula la distancia total de una ruta"""
+def _calcular_distancia_total(matriz_costos: np.ndarray, ruta: List[int]) -> float:
+    """Calcula la distancia total de una ruta sobre la matriz de costos ya penalizada"""
     if len(ruta) <= 1:
         return 0.0
     
-    distancia = 0.0
-    for i in range(len(ruta) - 1):
-        dist = matriz_adyacencia[ruta[i]][ruta[i + 1]]
-        if dist == float('inf'):
-            # Si no hay conexión directa, usar distancia euclidiana aproximada
-            distancia += 100.0  # Penalización
-        else:
-            distancia += dist
-    
-    return distancia
+    # Pesos de todas las aristas consecutivas de la ruta en una sola lectura
+    r = np.asarray(ruta)
+    return float(matriz_costos[r[:-1], r[1:]].sum())
 
@@ -1,11 +1,47 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
-sys.path.insert(0, os.path.dirname(__file__))
+# Único punto que agrega server/ al path: los demás módulos importan models, routes,
+# services, etc. como paquetes de primer nivel (también con `uvicorn server.app:app`)
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
 from routes import pedidos, rutas, grafo, origenes
 
-app = FastAPI(title="Sistema de Gestión de Pedidos", version="1.0.0")
+# ORJSONResponse necesita orjson instalado; basta con saber si está, sin importarlo aquí
+ORJSON_DISPONIBLE = find_spec("orjson") is not None
+
+# Nivel INFO por defecto: los mensajes de depuración de rutas y OSRM (logger.debug)
+# ni se formatean; LOG_LEVEL=DEBUG los muestra al diagnosticar
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(levelname)s %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El grafo no cambia durante la sesión: calcular al arrancar las distancias de camino
+    # mínimo entre todos los pares que usa el TSP (RutaService las guarda para las peticiones)
+    rutas.ruta_service.obtener_matriz_distancias()
+    # Árboles de caminos mínimos desde los orígenes fijos de Saga y Ripley: sus rutas
+    # solo reconstruyen el camino en lugar de correr Dijkstra en cada petición
+    origenes_fijos = await origenes.obtener_origenes()
+    rutas.ruta_service.precalcular_arboles([origen.nodo_id for origen in origenes_fijos.values()])
+    # Cargar los pedidos mock en segundo plano: el servidor empieza a atender de inmediato
+    # y las peticiones que los necesitan esperan la carga en un hilo (esperar_datos_mock),
+    # sin bloquear el event loop
+    app.state.carga_mock = [asyncio.create_task(asyncio.to_thread(repositorio._asegurar_datos_mock))
+                            for repositorio in (pedidos.repository, rutas.pedido_repository)]
+    yield
+
+# Las rutas devuelven miles de coordenadas: orjson las serializa en C, mucho más rápido
+# que json de la biblioteca estándar (mismo JSON compacto en ambos casos)
+app = FastAPI(title="Sistema de Gestión de Pedidos", version="1.0.0", lifespan=lifespan,
+              default_response_class=ORJSONResponse if ORJSON_DISPONIBLE else JSONResponse)
 
 # Configurar CORS
 app.add_middleware(
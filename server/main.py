@@ -1,6 +1,19 @@
+import matplotlib
+matplotlib.use('Agg')  # Solo se generan archivos: backend sin interfaz gráfica
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import csv
-import math
+from collections import deque
+import numpy as np
+from algorithms.numba_kernels import NUMBA_DISPONIBLE, _pares_cercanos_numba
+
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_DISPONIBLE = True
+except ImportError:
+    SCIPY_DISPONIBLE = False
+
+RADIO_FUSION = 10  # Puntos a menos de esta distancia se consideran el mismo nodo
 
 class Graph:
     """Representa un grafo para modelar el sistema vial de Lima"""
@@ -8,17 +21,25 @@ class Graph:
         self.Vertices = []  # Lista de todos los nodos del grafo
         self.label2v = dict()  # Mapeo de etiquetas a índices de vértices
         self.G = []  # Lista de adyacencia para representar las conexiones
-        self.coordenadas = {}  # Guarda la posición geográfica de cada nodo
-        self.lineas_nodo = {}  # Registra qué líneas de transporte pasan por cada nodo
+        self.G_rev = []  # Lista de adyacencia inversa (quién apunta a cada nodo)
+        self._coords = np.zeros((16, 2), dtype=np.float64)  # Posición de cada nodo por índice (capacidad creciente)
+        self.lineas_nodo = {}  # Líneas que pasan por cada nodo, como bitset (bit i = línea i)
 
     def node(self, label, x=None, y=None, lineas=None):
         """Crea un nuevo nodo en el grafo con su ubicación y líneas de transporte"""
         self.label2v[label] = len(self.Vertices)  # Asigna un índice único al nodo
         self.Vertices.append(label)  # Agrega el nodo a la lista principal
         self.G.append([])  # Inicializa la lista de conexiones vacía
+        self.G_rev.append([])  # Inicializa la lista de conexiones entrantes vacía
+        indice = self.label2v[label]
+        if indice >= len(self._coords):
+            # Duplica la capacidad del arreglo de coordenadas (filas nuevas en (0, 0))
+            self._coords = np.concatenate([self._coords, np.zeros_like(self._coords)])
         if x is not None and y is not None:
-            self.coordenadas[label] = (x, y)  # Guarda la posición geográfica
+            self._coords[indice] = (x, y)  # Guarda la posición geográfica
         if lineas is not None:
+            if not isinstance(lineas, int):
+                lineas = sum(1 << linea for linea in set(lineas))  # Convierte un conjunto a bitset
             self.lineas_nodo[label] = lineas  # Registra las líneas que pasan por aquí
 
     def nodes(self, labels):
@@ -31,19 +52,41 @@ class Graph:
         u = self.label2v[u]  # Convierte la etiqueta a índice
         v = self.label2v[v]  # Convierte la etiqueta a índice
         self.G[u].append(v)  # Agrega la conexión en la lista de adyacencia
+        self.G_rev[v].append(u)  # Y la conexión inversa para consultar padres en O(grado)
 
     def edges(self, u, vs):
         """Conecta un nodo con varios otros nodos de una vez"""
         for v in vs:
             self.edge(u, v)
     
+    @property
+    def coords(self):
+        """Arreglo float64 (N, 2) con la posición de cada nodo, indexado por vértice"""
+        return self._coords[:len(self.Vertices)]
+    
     def get_node_coords(self, label):
         """Devuelve la posición geográfica (latitud, longitud) de un nodo"""
-        return self.coordenadas.get(label, (0, 0))  # Retorna (0,0) si no existe
+        if label not in self.label2v:
+            return (0, 0)  # Retorna (0,0) si no existe
+        return tuple(self._coords[self.label2v[label]].tolist())
     
     def get_node_lineas(self, label):
         """Devuelve todas las líneas de transporte que pasan por este nodo"""
-        return self.lineas_nodo.get(label, set())  # Retorna conjunto vacío si no hay líneas
+        mascara = self.get_node_lineas_mascara(label)
+        lineas = set()  # Retorna conjunto vacío si no hay líneas
+        while mascara:
+            bit = mascara & -mascara  # Bit encendido más bajo
+            lineas.add(bit.bit_length() - 1)
+            mascara ^= bit
+        return lineas
+    
+    def get_node_lineas_mascara(self, label):
+        """Devuelve las líneas del nodo como bitset; intersecar es un solo AND"""
+        return self.lineas_nodo.get(label, 0)  # 0 si no hay líneas
+    
+    def get_num_lineas(self, label):
+        """Cuenta las líneas de transporte que pasan por este nodo"""
+        return self.get_node_lineas_mascara(label).bit_count()
     
     def get_children(self, label):
         """Encuentra todos los nodos conectados directamente desde este nodo"""
@@ -57,12 +100,8 @@ class Graph:
         if label not in self.label2v:
             return []  # El nodo no existe
         v = self.label2v[label]  # Obtiene el índice del nodo
-        parents = []
-        # Busca en todas las listas de adyacencia
-        for u in range(len(self.G)):
-            if v in self.G[u]:  # Si encuentra este nodo como destino
-                parents.append(self.Vertices[u])  # Agrega el nodo origen
-        return parents
+        # Orígenes sin repetir y en orden de índice, como al recorrer todas las listas
+        return [self.Vertices[u] for u in sorted(set(self.G_rev[v]))]
     
     def is_leaf(self, label):
         """Determina si un nodo es terminal (no tiene conexiones salientes)"""
@@ -90,59 +129,109 @@ class ArbolVialLima:
     def __init__(self):
         self.graph = Graph()  # Estructura de datos para el grafo
         self.lineas_viales = []  # Lista de todas las rutas de transporte
-        self.aristas = []  # Conexiones entre nodos con sus pesos
+        # Conexiones entre nodos con sus pesos como arreglos paralelos (una posición por arista)
+        self.edges_src = np.empty(0, dtype=np.int32)  # Nodo de origen
+        self.edges_dst = np.empty(0, dtype=np.int32)  # Nodo de destino
+        self.edges_w = np.empty(0, dtype=np.float32)  # Peso de la conexión
+        self._aristas = None  # Lista de tuplas reconstruida a pedido (ver aristas)
         self.raiz = None  # Nodo principal del árbol (el más conectado)
+        self._celda_a_nodos = {}  # Celda (RADIO_FUSION x RADIO_FUSION) -> [(índice, x, y)] de sus nodos
+    
+    @property
+    def aristas(self):
+        """Conexiones como lista de tuplas (nodo1, nodo2, peso), construida desde los arreglos la primera vez"""
+        if self._aristas is None:
+            self._aristas = list(zip(self.edges_src.tolist(), self.edges_dst.tolist(), self.edges_w.tolist()))
+        return self._aristas
     
     def cargar_datos_csv(self, archivo_csv):
         """Lee el archivo CSV y construye la red de nodos del sistema vial"""
         print("Cargando datos del sistema vial...")
         
-        with open(archivo_csv, 'r', encoding='utf-8') as archivo:
-            lector = csv.DictReader(archivo)
+        coordenadas, ids = self._leer_columnas_csv(archivo_csv)
+        
+        for (x_inicio, y_inicio, x_fin, y_fin), id_linea in zip(coordenadas.tolist(), ids.tolist()):
+            # Crea o encuentra nodos para los puntos de inicio y fin
+            nodo_inicio = self._crear_o_obtener_nodo(x_inicio, y_inicio, id_linea)
+            nodo_fin = self._crear_o_obtener_nodo(x_fin, y_fin, id_linea)
             
-            for fila in lector:
-                try:
-                    # Extrae las coordenadas de inicio y fin de cada ruta
-                    x_inicio = float(fila['longitud'])
-                    y_inicio = float(fila['latitud'])
-                    x_fin = float(fila['longitud_final'])
-                    y_fin = float(fila['latitud_final'])
-                    id_linea = int(fila['id'])
-                    
-                    # Crea o encuentra nodos para los puntos de inicio y fin
-                    nodo_inicio = self._crear_o_obtener_nodo(x_inicio, y_inicio, id_linea)
-                    nodo_fin = self._crear_o_obtener_nodo(x_fin, y_fin, id_linea)
-                    
-                    # Registra esta ruta en nuestro sistema
-                    self.lineas_viales.append({
-                        'id': id_linea,
-                        'inicio': nodo_inicio,
-                        'fin': nodo_fin
-                    })
-                    
-                except (ValueError, KeyError):
-                    continue  # Ignora filas con datos inválidos
+            # Registra esta ruta en nuestro sistema
+            self.lineas_viales.append({
+                'id': id_linea,
+                'inicio': nodo_inicio,
+                'fin': nodo_fin
+            })
         
         print(f"Procesados {len(self.graph.Vertices)} nodos y {len(self.lineas_viales)} rutas")
     
+    def _leer_columnas_csv(self, archivo_csv):
+        """
+        Lee las coordenadas (longitud, latitud, longitud_final, latitud_final) y el id
+        de cada ruta como arreglos NumPy. La conversión se hace en bloque; si alguna
+        fila tiene datos inválidos, se filtran fila por fila y se ignoran.
+        """
+        columnas = ['longitud', 'latitud', 'longitud_final', 'latitud_final', 'id']
+        with open(archivo_csv, 'r', encoding='utf-8') as archivo:
+            lector = csv.reader(archivo)
+            encabezado = next(lector, [])
+            if not all(columna in encabezado for columna in columnas):
+                return np.empty((0, 4), dtype=np.float64), np.empty(0, dtype=np.int64)
+            posiciones = [encabezado.index(columna) for columna in columnas]
+            filas = [[fila[p] for p in posiciones] for fila in lector if len(fila) > max(posiciones)]
+        
+        if not filas:
+            return np.empty((0, 4), dtype=np.float64), np.empty(0, dtype=np.int64)
+        
+        try:
+            # Conversión en bloque (en C) de todas las filas a la vez
+            texto = np.array(filas)
+            return texto[:, :4].astype(np.float64), texto[:, 4].astype(np.int64)
+        except ValueError:
+            pass
+        
+        # Alguna fila no es numérica: conservar solo las válidas
+        validas = []
+        for fila in filas:
+            try:
+                validas.append(([float(valor) for valor in fila[:4]], int(fila[4])))
+            except ValueError:
+                continue  # Ignora filas con datos inválidos
+        coordenadas = np.array([c for c, _ in validas], dtype=np.float64).reshape(-1, 4)
+        return coordenadas, np.array([i for _, i in validas], dtype=np.int64)
+    
     def _crear_o_obtener_nodo(self, x, y, id_linea):
         """Encuentra un nodo cercano existente o crea uno nuevo si no hay ninguno cerca"""
         # Busca si ya existe un nodo muy cerca de estas coordenadas
-        for label in self.graph.Vertices:
-            nx, ny = self.graph.get_node_coords(label)
-            distancia = math.sqrt((x - nx)**2 + (y - ny)**2)
-            if distancia < 10:  # Si está a menos de 10 unidades de distancia
-                # Actualiza las líneas que pasan por este nodo existente
-                lineas_actuales = self.graph.get_node_lineas(label)
-                lineas_actuales.add(id_linea)
-                self.graph.lineas_nodo[label] = lineas_actuales
-                return label  # Retorna el nodo existente
+        label = self._buscar_nodo_cercano(x, y)
+        if label is not None:
+            # Actualiza las líneas que pasan por este nodo existente
+            self.graph.lineas_nodo[label] = self.graph.get_node_lineas_mascara(label) | (1 << id_linea)
+            return label  # Retorna el nodo existente
         
         # Si no hay nodos cercanos, crea uno nuevo
         nodo_id = len(self.graph.Vertices)  # Usa el número de nodos como ID
-        self.graph.node(nodo_id, x, y, {id_linea})  # Crea el nodo con esta línea
+        self.graph.node(nodo_id, x, y, 1 << id_linea)  # Crea el nodo con esta línea
+        
+        # Registra el nodo en la celda de la grilla que le corresponde
+        celda = (int(x // RADIO_FUSION), int(y // RADIO_FUSION))
+        self._celda_a_nodos.setdefault(celda, []).append((self.graph.label2v[nodo_id], x, y))
         return nodo_id
     
+    def _buscar_nodo_cercano(self, x, y):
+        """Devuelve el primer nodo (en orden de creación) a menos de RADIO_FUSION de (x, y), o None"""
+        radio2 = RADIO_FUSION * RADIO_FUSION  # Compara distancias al cuadrado, sin sqrt
+        
+        # Con celdas del tamaño del radio, cualquier nodo a menos de RADIO_FUSION está
+        # en la celda del punto o en una de sus 8 vecinas: búsqueda O(1) por fila
+        cx, cy = int(x // RADIO_FUSION), int(y // RADIO_FUSION)
+        mejor = None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for indice, nx, ny in self._celda_a_nodos.get((cx + dx, cy + dy), ()):
+                    if (mejor is None or indice < mejor) and (x - nx)**2 + (y - ny)**2 < radio2:
+                        mejor = indice
+        return None if mejor is None else self.graph.Vertices[mejor]
+    
     def construir_arbol(self):
         """Organiza los nodos en una estructura de árbol jerárquica"""
         print("Construyendo estructura de árbol...")
@@ -151,8 +240,7 @@ class ArbolVialLima:
         self._detectar_conexiones()
         
         # Elige como raíz al nodo con más líneas de transporte (más importante)
-        nodo_raiz_id = max(self.graph.Vertices, 
-                          key=lambda label: len(self.graph.get_node_lineas(label)))
+        nodo_raiz_id = self.graph.Vertices[int(self._contar_lineas_por_nodo().argmax())]
         self.raiz = nodo_raiz_id
         
         # Construye el árbol usando búsqueda en amplitud desde la raíz
@@ -162,123 +250,167 @@ class ArbolVialLima:
     
     def _detectar_conexiones(self):
         """Identifica todas las conexiones posibles entre nodos del sistema"""
+        # Una sola arista por par de nodos (sin importar el sentido); si se repite, queda el peso de la última
+        aristas_por_par = {}
+        
+        def agregar_arista(nodo1, nodo2, peso):
+            clave = (min(nodo1, nodo2), max(nodo1, nodo2))
+            existente = aristas_por_par.get(clave)
+            if existente is None:
+                aristas_por_par[clave] = (nodo1, nodo2, peso)
+            else:
+                # Mismo lugar y sentido que la primera; el peso de la última (como la matriz,
+                # donde la última asignación de la celda era la que quedaba)
+                aristas_por_par[clave] = (existente[0], existente[1], peso)
+        
         # Conecta nodos que comparten líneas de transporte (conexiones directas)
         for linea in self.lineas_viales:
             nodo_inicio = linea['inicio']
             nodo_fin = linea['fin']
             
             if nodo_inicio != nodo_fin:  # Evita auto-conexiones
-                lineas_inicio = self.graph.get_node_lineas(nodo_inicio)
-                lineas_fin = self.graph.get_node_lineas(nodo_fin)
-                peso = len(lineas_inicio.intersection(lineas_fin))  # Líneas compartidas
+                lineas_inicio = self.graph.get_node_lineas_mascara(nodo_inicio)
+                lineas_fin = self.graph.get_node_lineas_mascara(nodo_fin)
+                peso = (lineas_inicio & lineas_fin).bit_count()  # Líneas compartidas
                 if peso > 0:
-                    self.aristas.append((nodo_inicio, nodo_fin, peso))
+                    agregar_arista(nodo_inicio, nodo_fin, peso)
         
         # Conecta nodos cercanos geográficamente (conexiones por proximidad)
         nodos_lista = self.graph.Vertices
-        for i, nodo1 in enumerate(nodos_lista):
-            x1, y1 = self.graph.get_node_coords(nodo1)
-            lineas1 = self.graph.get_node_lineas(nodo1)
-            
-            for j, nodo2 in enumerate(nodos_lista[i+1:], i+1):
-                x2, y2 = self.graph.get_node_coords(nodo2)
-                lineas2 = self.graph.get_node_lineas(nodo2)
-                
-                distancia = math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
-                
-                # Si están cerca pero no comparten líneas, los conecta
-                if distancia < 50 and not lineas1.intersection(lineas2):
-                    peso = max(1, int(100 / distancia))  # Peso inverso a la distancia
-                    self.aristas.append((nodo1, nodo2, peso))
-        
-        print(f"Identificadas {len(self.aristas)} conexiones entre nodos")
+        coords = self.graph.coords  # Arreglo (N, 2) contiguo, sin accesos por nodo
+        pares, distancias = self._pares_cercanos(coords, 50)
+        
+        for (i, j), distancia in zip(pares.tolist(), distancias.tolist()):
+            nodo1, nodo2 = nodos_lista[i], nodos_lista[j]
+            # Si están cerca pero no comparten líneas, los conecta
+            if not self.graph.get_node_lineas_mascara(nodo1) & self.graph.get_node_lineas_mascara(nodo2):
+                peso = max(1, int(100 / distancia))  # Peso inverso a la distancia
+                agregar_arista(nodo1, nodo2, peso)
+        
+        # Congela las conexiones en arreglos paralelos para los recorridos vectorizados
+        origenes, destinos, pesos = zip(*aristas_por_par.values()) if aristas_por_par else ((), (), ())
+        self.edges_src = np.array(origenes, dtype=np.int32)
+        self.edges_dst = np.array(destinos, dtype=np.int32)
+        self.edges_w = np.array(pesos, dtype=np.float32)
+        self._aristas = None
+        print(f"Identificadas {len(self.edges_src)} conexiones entre nodos")
+    
+    def _pares_cercanos(self, coords, radio):
+        """Pares (i, j) con i < j a distancia menor que radio, en orden (i, j) y con sus distancias"""
+        if SCIPY_DISPONIBLE:
+            # Búsqueda por radio en el kd-tree (C) en lugar del doble bucle en Python
+            pares = cKDTree(coords).query_pairs(radio, output_type='ndarray')
+        elif NUMBA_DISPONIBLE:
+            # Sin SciPy pero con Numba: el mismo barrido por x compilado y repartido entre núcleos
+            orden = np.argsort(coords[:, 0], kind='stable')
+            pares = _pares_cercanos_numba(np.ascontiguousarray(coords[orden, 0]), np.ascontiguousarray(coords[orden, 1]),
+                                          orden.astype(np.int64), float(radio))
+        else:
+            # Sin SciPy: barrido sobre los nodos ordenados por x. Para cada nodo solo se
+            # miran los siguientes con dx < radio (búsqueda binaria), y se descartan los
+            # que tienen |dy| >= radio antes de calcular la distancia al cuadrado
+            orden = np.argsort(coords[:, 0], kind='stable')
+            xs, ys = coords[orden, 0], coords[orden, 1]
+            limites = np.searchsorted(xs, xs + radio, side='left')
+            filas = []
+            for k in range(len(orden) - 1):
+                ventana = np.arange(k + 1, limites[k])
+                dy = ys[ventana] - ys[k]
+                cerca_y = np.abs(dy) < radio
+                ventana, dy = ventana[cerca_y], dy[cerca_y]
+                dx = xs[ventana] - xs[k]
+                ventana = ventana[dx * dx + dy * dy < radio * radio]
+                if len(ventana) > 0:
+                    i, j = orden[k], orden[ventana]
+                    filas.append(np.column_stack((np.minimum(i, j), np.maximum(i, j))))
+            pares = np.concatenate(filas) if filas else np.empty((0, 2), dtype=np.intp)
+        
+        pares = pares[np.lexsort((pares[:, 1], pares[:, 0]))]  # Mismo orden que el doble bucle
+        diferencia = coords[pares[:, 0]] - coords[pares[:, 1]]
+        distancias = np.sqrt(diferencia[:, 0] * diferencia[:, 0] + diferencia[:, 1] * diferencia[:, 1])
+        cerca = distancias < radio  # query_pairs incluye el borde; aquí la condición es estricta
+        return pares[cerca], distancias[cerca]
+    
+    def _contar_lineas_por_nodo(self):
+        """Número de líneas de cada nodo como arreglo int32, en el orden de Vertices"""
+        return np.fromiter((self.graph.get_node_lineas_mascara(label).bit_count() for label in self.graph.Vertices),
+                           dtype=np.int32, count=len(self.graph.Vertices))
     
     def _construir_arbol_bfs(self):
         """Construye la estructura de árbol usando búsqueda en amplitud desde la raíz"""
         # Primero, crear TODAS las conexiones bidireccionales basadas en las aristas
         # Esto asegura que el grafo sea completamente conectado para pathfinding
-        for nodo1, nodo2, peso in self.aristas:
+        for nodo1, nodo2 in zip(self.edges_src.tolist(), self.edges_dst.tolist()):
             # Crear conexión bidireccional
             self.graph.edge(nodo1, nodo2)
             self.graph.edge(nodo2, nodo1)
         
-        print(f"Conexiones bidireccionales creadas: {len(self.aristas) * 2} aristas")
+        print(f"Conexiones bidireccionales creadas: {len(self.edges_src) * 2} aristas")
         
         # Luego, construir el árbol usando BFS desde la raíz (para estructura jerárquica)
         visitados = set()  # Nodos ya procesados
-        cola = [self.raiz]  # Cola para procesar nodos nivel por nivel
+        cola = deque([self.raiz])  # Cola para procesar nodos nivel por nivel
         visitados.add(self.raiz)
         
         while cola:
-            nodo_actual = cola.pop(0)  # Toma el siguiente nodo de la cola
+            nodo_actual = cola.popleft()  # Toma el siguiente nodo de la cola en O(1)
             
-            # Busca nodos conectados que aún no han sido visitados
-            for nodo1, nodo2, peso in self.aristas:
-                nodo_conectado = None
-                
-                # Determina cuál nodo está conectado al actual
-                if nodo1 == nodo_actual and nodo2 not in visitados:
-                    nodo_conectado = nodo2
-                elif nodo2 == nodo_actual and nodo1 not in visitados:
-                    nodo_conectado = nodo1
-                
-                if nodo_conectado:
-                    # Las conexiones ya están creadas arriba, solo marcamos como visitado
+            # Recorre solo los vecinos del nodo actual (lista de adyacencia ya construida arriba)
+            for v_idx in self.graph.G[self.graph.label2v[nodo_actual]]:
+                nodo_conectado = self.graph.Vertices[v_idx]
+                if nodo_conectado not in visitados:
                     visitados.add(nodo_conectado)  # Marca como visitado
                     cola.append(nodo_conectado)  # Lo agrega para procesar después
     
-    def generar_visualizacion(self, archivo_salida="lima_vial_geografico_completo.png"):
+    def generar_visualizacion(self, archivo_salida="lima_vial_geografico_completo.png", dpi=300):
         """Crea una imagen visual del sistema vial de Lima con colores y tamaños representativos"""
         print("Generando visualización del sistema vial...")
         
+        # Ejes ocupando toda la figura: bbox_inches='tight' recorta después, sin un tight_layout extra
         fig, ax = plt.subplots(1, 1, figsize=(20, 16))
+        fig.subplots_adjust(left=0, right=1, bottom=0, top=1)
         ax.set_facecolor('white')
         
         # Extrae todas las coordenadas para normalizar la visualización
-        x_coords = [self.graph.get_node_coords(label)[0] for label in self.graph.Vertices]
-        y_coords = [self.graph.get_node_coords(label)[1] for label in self.graph.Vertices]
+        x_coords = self.graph.coords[:, 0]
+        y_coords = self.graph.coords[:, 1]
         
         # Calcula los límites del mapa
-        x_min, x_max = min(x_coords), max(x_coords)
-        y_min, y_max = min(y_coords), max(y_coords)
+        x_min, x_max = x_coords.min(), x_coords.max()
+        y_min, y_max = y_coords.min(), y_coords.max()
         
         # Normaliza las coordenadas para que quepan bien en la imagen
-        x_norm = [(x - x_min) / (x_max - x_min) * 18 - 9 for x in x_coords]
-        y_norm = [(y - y_min) / (y_max - y_min) * 14 - 7 for y in y_coords]
-        
-        # Dibuja las conexiones entre nodos con colores según su importancia
-        for nodo1, nodo2, peso in self.aristas:
-            idx1 = self.graph.Vertices.index(nodo1)
-            idx2 = self.graph.Vertices.index(nodo2)
-            x1, y1 = x_norm[idx1], y_norm[idx1]
-            x2, y2 = x_norm[idx2], y_norm[idx2]
-            
-            # Asigna colores y grosor según la importancia de la conexión
-            if peso > 3:  # Conexiones muy importantes
-                color, alpha, width = '#FF6B6B', 0.8, 2.0  # Rojo fuerte
-            elif peso > 1:  # Conexiones importantes
-                color, alpha, width = '#4ECDC4', 0.6, 1.5  # Turquesa
-            else:  # Conexiones menores
-                color, alpha, width = '#45B7D1', 0.4, 1.0  # Azul claro
-            
-            ax.plot([x1, x2], [y1, y2], color=color, alpha=alpha, 
-                    linewidth=width, zorder=1)
+        x_norm = (x_coords - x_min) / (x_max - x_min) * 18 - 9
+        y_norm = (y_coords - y_min) / (y_max - y_min) * 14 - 7
         
-        # Dibuja los nodos con tamaños según su importancia
-        for i, label in enumerate(self.graph.Vertices):
-            x_norm_val, y_norm_val = x_norm[i], y_norm[i]
-            
-            num_conexiones = len(self.graph.get_node_lineas(label))
-            # Asigna tamaño y color según el número de líneas que pasan por el nodo
-            if num_conexiones > 5:  # Nodos muy importantes
-                size, color = 80, '#E74C3C'  # Rojo - estaciones principales
-            elif num_conexiones > 2:  # Nodos importantes
-                size, color = 50, '#F39C12'  # Naranja - estaciones secundarias
-            else:  # Nodos menores
-                size, color = 30, '#3498DB'  # Azul - paradas simples
-            
-            ax.scatter(x_norm_val, y_norm_val, s=size, c=color, alpha=0.8, 
-                      edgecolors='white', linewidth=1, zorder=2)
+        # Índices de los extremos de cada arista: la etiqueta de cada nodo es su índice de vértice
+        idx1 = self.edges_src
+        idx2 = self.edges_dst
+        pesos = self.edges_w
+        
+        # Segmentos (n_aristas, 2, 2): [[x1, y1], [x2, y2]] por arista
+        segmentos = np.stack([np.column_stack([x_norm[idx1], y_norm[idx1]]),
+                              np.column_stack([x_norm[idx2], y_norm[idx2]])], axis=1)
+        
+        # Dibuja las conexiones con un LineCollection por nivel de importancia (un solo artista cada uno)
+        niveles = [
+            (pesos <= 1, '#45B7D1', 0.4, 1.0),  # Conexiones menores - Azul claro
+            ((pesos > 1) & (pesos <= 3), '#4ECDC4', 0.6, 1.5),  # Conexiones importantes - Turquesa
+            (pesos > 3, '#FF6B6B', 0.8, 2.0),  # Conexiones muy importantes - Rojo fuerte
+        ]
+        for mascara, color, alpha, width in niveles:
+            if mascara.any():
+                ax.add_collection(LineCollection(segmentos[mascara], colors=color, alpha=alpha,
+                                                 linewidths=width, capstyle='projecting', zorder=1))
+        
+        # Dibuja los nodos con tamaños y colores según su importancia en una sola llamada
+        num_conexiones = self._contar_lineas_por_nodo()
+        sizes = np.where(num_conexiones > 5, 80, np.where(num_conexiones > 2, 50, 30))
+        colores = np.where(num_conexiones > 5, '#E74C3C',  # Rojo - estaciones principales
+                           np.where(num_conexiones > 2, '#F39C12',  # Naranja - estaciones secundarias
+                                    '#3498DB'))  # Azul - paradas simples
+        ax.scatter(x_norm, y_norm, s=sizes, c=colores, alpha=0.8, 
+                   edgecolors='white', linewidth=1, zorder=2)
         
         # Configura los límites y aspecto de la visualización
         ax.set_xlim(-10, 10)
@@ -290,14 +422,13 @@ class ArbolVialLima:
         ax.text(0, -7.5, 'Sistema Vial Metropolitano de Lima - Red de Nodos Viales', 
                 fontsize=16, ha='center', weight='bold', color='#2C3E50')
         
-        ax.text(0, -8, f'Nodos: {len(self.graph.Vertices)} | Conexiones: {len(self.aristas)} | Rutas: {len(self.lineas_viales)}', 
+        ax.text(0, -8, f'Nodos: {len(self.graph.Vertices)} | Conexiones: {len(self.edges_src)} | Rutas: {len(self.lineas_viales)}', 
                 fontsize=12, ha='center', color='#7F8C8D')
         
-        # Guarda la imagen en alta resolución
-        plt.tight_layout()
-        plt.savefig(archivo_salida, dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
-        plt.close()
+        # Guarda la imagen (alta resolución por defecto; dpi=150 basta para vistas previas)
+        fig.savefig(archivo_salida, dpi=dpi, bbox_inches='tight', 
+                    facecolor='white', edgecolor='none')
+        plt.close(fig)
         
         print(f"Imagen guardada como: {archivo_salida}")
     
@@ -311,16 +442,15 @@ class ArbolVialLima:
         nodos_internos = total_nodos - nodos_hoja
         
         print(f"Total de nodos: {total_nodos} | Terminales: {nodos_hoja} | Intermedios: {nodos_internos}")
-        print(f"Total de conexiones: {len(self.aristas)}")
+        print(f"Total de conexiones: {len(self.edges_src)}")
         
-        # Identifica los nodos más importantes del sistema
-        nodos_ordenados = sorted(self.graph.Vertices, 
-                               key=lambda label: len(self.graph.get_node_lineas(label)), reverse=True)
+        # Identifica los nodos más importantes del sistema (orden estable ante empates)
+        num_lineas = self._contar_lineas_por_nodo()
+        top = np.argsort(-num_lineas, kind='stable')[:5]
         
         print("\nTop 5 estaciones más importantes:")
-        for i, label in enumerate(nodos_ordenados[:5]):
-            lineas = len(self.graph.get_node_lineas(label))
-            print(f"{i+1}. Estación {label}: {lineas} líneas de transporte")
+        for i, idx in enumerate(top.tolist()):
+            print(f"{i+1}. Estación {self.graph.Vertices[idx]}: {num_lineas[idx]} líneas de transporte")
         
         # Información sobre el nodo central del sistema
         hijos_raiz = self.graph.get_children(self.raiz)
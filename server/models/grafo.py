@@ -1,12 +1,15 @@
-from pydantic import BaseModel
-from typing import List, Tuple
+from pydantic import BaseModel, ConfigDict
 
 class NodoResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     id: int
     latitud: float
     longitud: float
     
 class AristaResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     origen: int
     destino: int
     peso: float
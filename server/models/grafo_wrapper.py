@@ -1,18 +1,108 @@
 import os
-import sys
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import hashlib
+import logging
+import pickle
+import threading
+import numpy as np
 from main import ArbolVialLima
 
+logger = logging.getLogger(__name__)
+
+# Directorio donde se guarda el grafo ya construido entre reinicios del servidor
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache")
+# Subir este número al cambiar cómo se construye el grafo invalida los cachés anteriores
+VERSION_CACHE_GRAFO = 3
+
+try:
+    from pyproj import Transformer
+    # UTM Zone 18S para Lima, Perú (EPSG:32718) -> WGS84 (EPSG:4326) para lat/lon.
+    # Se construye una sola vez: crearlo procesa las definiciones de PROJ y es costoso
+    _TRANSFORMER = Transformer.from_crs("EPSG:32718", "EPSG:4326", always_xy=True)
+    _TRANSFORMER_INVERSO = Transformer.from_crs("EPSG:4326", "EPSG:32718", always_xy=True)
+except ImportError:
+    _TRANSFORMER = None
+    _TRANSFORMER_INVERSO = None
+
+try:
+    from scipy.spatial import cKDTree
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components, reverse_cuthill_mckee
+    SCIPY_DISPONIBLE = True
+except ImportError:
+    SCIPY_DISPONIBLE = False
+
+def convertir_utm_a_latlon(utm_x: float, utm_y: float):
+    """
+    Convierte coordenadas UTM (Zone 18S, EPSG:32718) a lat/lon (WGS84, EPSG:4326)
+    Lima, Perú está en UTM Zone 18S
+    """
+    if _TRANSFORMER is None:
+        # Si pyproj no está disponible, usar aproximación simple
+        lat = -12.0464 + (utm_y - 8650000) / 111000
+        lon = -77.0428 + (utm_x - 300000) / (111000 * 0.6)
+        return lat, lon
+    try:
+        lon, lat = _TRANSFORMER.transform(utm_x, utm_y)
+        return lat, lon
+    except Exception as e:
+        logger.warning("Error en conversión UTM: %s", e)
+        return -12.0464, -77.0428
+
+def convertir_utm_a_latlon_bulk(xs: np.ndarray, ys: np.ndarray):
+    """
+    Igual que convertir_utm_a_latlon pero para arreglos completos: pyproj transforma
+    todos los puntos en una sola llamada en lugar de una por punto.
+    
+    Returns:
+        Tupla (lats, lons) de arreglos float64
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if _TRANSFORMER is None:
+        return -12.0464 + (ys - 8650000) / 111000, -77.0428 + (xs - 300000) / (111000 * 0.6)
+    try:
+        lons, lats = _TRANSFORMER.transform(xs, ys)
+        return np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    except Exception as e:
+        logger.warning("Error en conversión UTM: %s", e)
+        return np.full(len(xs), -12.0464), np.full(len(xs), -77.0428)
+
+def convertir_latlon_a_utm(lat: float, lon: float):
+    """Conversión inversa de convertir_utm_a_latlon: lat/lon (WGS84) a (utm_x, utm_y) en Zone 18S"""
+    if _TRANSFORMER_INVERSO is None:
+        # Inversa de la misma aproximación simple
+        return 300000 + (lon + 77.0428) * (111000 * 0.6), 8650000 + (lat + 12.0464) * 111000
+    try:
+        return _TRANSFORMER_INVERSO.transform(lon, lat)
+    except Exception as e:
+        logger.warning("Error en conversión UTM: %s", e)
+        return 300000.0, 8650000.0
+
 class GrafoWrapper:
     """Wrapper para exponer el grafo a través de la API"""
     
     _instance = None
     _arbol = None
+    _matriz_cache = None  # (matriz, nodo_to_idx) de get_matriz_adyacencia
+    _clave_matriz = None  # Estado de las aristas con el que se construyó el caché
+    _componentes_cache = None  # Componente conexa de cada vértice (get_componentes)
+    _clave_componentes = None  # Estado de las aristas con el que se calcularon las componentes
+    _coords_cache = None  # (node_ids, utm_x, utm_y, lat, lon) de ensure_coord_cache
+    _node_index = None  # Id de nodo -> fila en los arreglos de _coords_cache
+    _latlon_por_nodo = None  # Id de nodo -> (lat, lon) de los nodos con posición
+    _kd_cache = None  # (arbol, filas) de get_arbol_kd
+    _vertices_tuple = None  # Copia inmutable de Vertices compartida (vertices_tuple)
+    _lock = threading.Lock()  # Evita cargar el CSV o construir la matriz dos veces en paralelo
     
-    def __init__(self):
-        if GrafoWrapper._instance is None:
-            GrafoWrapper._instance = self
-            self._cargar_grafo()
+    def __new__(cls):
+        # Singleton con doble verificación: solo el primer hilo carga el grafo
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instancia = super().__new__(cls)
+                    instancia._cargar_grafo()
+                    cls._instance = instancia
+        return cls._instance
     
     def _cargar_grafo(self):
         """Carga el grafo desde el CSV"""
@@ -23,9 +113,40 @@ class GrafoWrapper:
             if not os.path.exists(csv_path):
                 # Intentar ruta relativa desde models
                 csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Sistema_Vial_Metropolitano_A74.csv")
-            GrafoWrapper._arbol = ArbolVialLima()
-            GrafoWrapper._arbol.cargar_datos_csv(csv_path)
-            GrafoWrapper._arbol.construir_arbol()
+            GrafoWrapper._arbol = self._leer_cache(csv_path)
+            if GrafoWrapper._arbol is None:
+                GrafoWrapper._arbol = ArbolVialLima()
+                GrafoWrapper._arbol.cargar_datos_csv(csv_path)
+                GrafoWrapper._arbol.construir_arbol()
+                self._guardar_cache(csv_path, GrafoWrapper._arbol)
+    
+    def _ruta_cache(self, csv_path: str) -> str:
+        """Archivo de caché para este CSV: cambia si el CSV se modifica (ruta, mtime y tamaño)"""
+        estado = os.stat(csv_path)
+        clave = f"{os.path.abspath(csv_path)}|{estado.st_mtime_ns}|{estado.st_size}|{VERSION_CACHE_GRAFO}"
+        return os.path.join(CACHE_DIR, f"grafo_{hashlib.sha1(clave.encode()).hexdigest()[:16]}.pkl")
+    
+    def _leer_cache(self, csv_path: str):
+        """Carga el árbol vial guardado para este CSV, o None si no hay caché válido"""
+        try:
+            with open(self._ruta_cache(csv_path), "rb") as archivo:
+                arbol = pickle.load(archivo)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        logger.info("Grafo cargado desde caché: %d nodos y %d conexiones", len(arbol.graph.Vertices), len(arbol.edges_src))
+        return arbol
+    
+    def _guardar_cache(self, csv_path: str, arbol: ArbolVialLima):
+        """Guarda el árbol vial construido; si no se puede escribir, se sigue sin caché"""
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            ruta = self._ruta_cache(csv_path)
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with open(temporal, "wb") as archivo:
+                pickle.dump(arbol, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)  # Reemplazo atómico: nunca queda un caché a medio escribir
+        except OSError as e:
+            logger.warning("No se pudo guardar el caché del grafo: %s", e)
     
     @property
     def arbol(self) -> ArbolVialLima:
@@ -37,37 +158,237 @@ class GrafoWrapper:
         """Obtiene el grafo"""
         return GrafoWrapper._arbol.graph
     
+    @property
+    def vertices_tuple(self) -> tuple:
+        """
+        Vertices como tupla inmutable, creada una sola vez y compartida por quienes la
+        recorren o muestrean (sin copiar la lista en cada uso). Se rehace si cambia la
+        cantidad de nodos del grafo.
+        """
+        vertices = GrafoWrapper._vertices_tuple
+        if vertices is None or len(vertices) != len(self.graph.Vertices):
+            vertices = GrafoWrapper._vertices_tuple = tuple(self.graph.Vertices)
+        return vertices
+    
     @property
     def aristas(self):
         """Obtiene las aristas con pesos"""
         return GrafoWrapper._arbol.aristas
     
+    def _orden_cuthill_mckee(self, nodos) -> list:
+        """
+        Calcula un orden Reverse Cuthill-McKee de los nodos: las aristas quedan cerca
+        de la diagonal de la matriz y los recorridos por filas aprovechan mejor la caché.
+        Sin SciPy se conserva el orden original de los vértices.
+        """
+        if not SCIPY_DISPONIBLE:
+            return list(range(len(nodos)))
+        
+        # La etiqueta de cada nodo es su índice de vértice: las aristas ya son filas y columnas
+        filas, columnas = self.arbol.edges_src, self.arbol.edges_dst
+        n = len(nodos)
+        patron = csr_matrix((np.ones(len(filas)), (filas, columnas)), shape=(n, n))
+        return reverse_cuthill_mckee(patron, symmetric_mode=False).tolist()
+    
     def get_matriz_adyacencia(self):
-        """Construye una matriz de adyacencia con pesos para los algoritmos"""
+        """
+        Construye una matriz de adyacencia con pesos para los algoritmos.
+        El resultado se guarda en caché (de solo lectura) y se reutiliza mientras
+        las aristas no cambien.
+        """
+        clave = (id(self.arbol.edges_src), len(self.arbol.edges_src), len(self.graph.Vertices))
+        if GrafoWrapper._matriz_cache is not None and GrafoWrapper._clave_matriz == clave:
+            return GrafoWrapper._matriz_cache
+        
+        with GrafoWrapper._lock:
+            # Otro hilo pudo construirla mientras se esperaba el lock
+            if GrafoWrapper._matriz_cache is None or GrafoWrapper._clave_matriz != clave:
+                GrafoWrapper._matriz_cache = self._construir_matriz_adyacencia()
+                GrafoWrapper._clave_matriz = clave
+        return GrafoWrapper._matriz_cache
+    
+    def get_componentes(self) -> np.ndarray:
+        """
+        Índice de alcanzabilidad: componente conexa de cada vértice (ignorando el sentido
+        de las conexiones), en el orden de Vertices. Dos nodos tienen camino entre sí si y
+        solo si tienen la misma etiqueta, así que cada consulta es O(1). Se recalcula solo
+        si cambian las aristas.
+        
+        Returns:
+            Arreglo int32 (de solo lectura) con la etiqueta de componente de cada vértice
+        """
+        clave = (id(self.arbol.edges_src), len(self.arbol.edges_src), len(self.graph.Vertices))
+        if GrafoWrapper._componentes_cache is not None and GrafoWrapper._clave_componentes == clave:
+            return GrafoWrapper._componentes_cache
+        
+        with GrafoWrapper._lock:
+            if GrafoWrapper._componentes_cache is None or GrafoWrapper._clave_componentes != clave:
+                GrafoWrapper._componentes_cache = self._calcular_componentes()
+                GrafoWrapper._clave_componentes = clave
+        return GrafoWrapper._componentes_cache
+    
+    def _calcular_componentes(self) -> np.ndarray:
+        """Etiqueta las componentes conexas débiles (SciPy, o union-find sin SciPy)"""
+        n = len(self.graph.Vertices)
+        origenes, destinos = self.arbol.edges_src, self.arbol.edges_dst
+        if SCIPY_DISPONIBLE:
+            patron = csr_matrix((np.ones(len(origenes)), (origenes, destinos)), shape=(n, n))
+            _, etiquetas = connected_components(patron, directed=True, connection='weak')
+            etiquetas = etiquetas.astype(np.int32)
+        else:
+            # Union-find con compresión de caminos sobre las aristas
+            padre = list(range(n))
+            def raiz(x):
+                while padre[x] != x:
+                    padre[x] = padre[padre[x]]
+                    x = padre[x]
+                return x
+            for a, b in zip(origenes.tolist(), destinos.tolist()):
+                ra, rb = raiz(a), raiz(b)
+                if ra != rb:
+                    padre[max(ra, rb)] = min(ra, rb)
+            etiquetas = np.array([raiz(x) for x in range(n)], dtype=np.int32)
+        
+        etiquetas.flags.writeable = False
+        return etiquetas
+    
+    def ensure_coord_cache(self):
+        """
+        Coordenadas de todos los nodos como arreglos contiguos (struct-of-arrays), calculadas
+        una sola vez: la conversión UTM -> lat/lon se hace en una sola llamada para
+        todos los puntos en lugar de una por nodo. La fila de cada nodo está en node_index.
+        
+        Returns:
+            Tupla (node_ids, utm_x, utm_y, lat, lon) de arreglos de solo lectura en el orden
+            de Vertices; los nodos sin posición tienen utm_x = utm_y = 0
+        """
+        if GrafoWrapper._coords_cache is not None and len(GrafoWrapper._coords_cache[0]) == len(self.graph.Vertices):
+            return GrafoWrapper._coords_cache
+        
+        with GrafoWrapper._lock:
+            if GrafoWrapper._coords_cache is None or len(GrafoWrapper._coords_cache[0]) != len(self.graph.Vertices):
+                cache = self._construir_coords()
+                GrafoWrapper._node_index = {nodo: fila for fila, nodo in enumerate(cache[0].tolist())}
+                node_ids, utm_x, utm_y, lat, lon = cache
+                con_posicion = (utm_x != 0) | (utm_y != 0)
+                GrafoWrapper._latlon_por_nodo = dict(zip(node_ids[con_posicion].tolist(),
+                                                         zip(lat[con_posicion].tolist(), lon[con_posicion].tolist())))
+                GrafoWrapper._coords_cache = cache
+        return GrafoWrapper._coords_cache
+    
+    @property
+    def node_index(self) -> dict:
+        """Id de nodo -> fila en los arreglos de ensure_coord_cache"""
+        self.ensure_coord_cache()
+        return GrafoWrapper._node_index
+    
+    @property
+    def latlon_por_nodo(self) -> dict:
+        """
+        Id de nodo -> (lat, lon) ya convertidos, solo para los nodos con posición (sin
+        utm_x = utm_y = 0): obtener las coordenadas de una ruta es un acceso por nodo
+        """
+        self.ensure_coord_cache()
+        return GrafoWrapper._latlon_por_nodo
+    
+    def get_arbol_kd(self):
+        """
+        KD-tree sobre las coordenadas UTM (en metros) de los nodos con posición, construido
+        una sola vez: las búsquedas por radio visitan solo los nodos cercanos en lugar de todos.
+        
+        Returns:
+            Tupla (arbol, filas): el cKDTree (None sin SciPy) y la fila en ensure_coord_cache
+            de cada punto del árbol, en orden creciente
+        """
+        node_ids = self.ensure_coord_cache()[0]
+        if GrafoWrapper._kd_cache is not None and GrafoWrapper._kd_cache[2] is node_ids:
+            return GrafoWrapper._kd_cache[:2]
+        
+        with GrafoWrapper._lock:
+            if GrafoWrapper._kd_cache is None or GrafoWrapper._kd_cache[2] is not node_ids:
+                _, utm_x, utm_y, _, _ = GrafoWrapper._coords_cache
+                filas = np.flatnonzero((utm_x != 0) | (utm_y != 0))
+                filas.flags.writeable = False
+                arbol = cKDTree(np.column_stack([utm_x[filas], utm_y[filas]])) if SCIPY_DISPONIBLE and len(filas) else None
+                GrafoWrapper._kd_cache = (arbol, filas, node_ids)
+        return GrafoWrapper._kd_cache[:2]
+    
+    def filas_en_radio(self, lat: float, lon: float, radio_km: float) -> np.ndarray:
+        """
+        Filas de ensure_coord_cache de los nodos con posición que pueden estar a menos de
+        radio_km del punto. Es un superconjunto (la distancia en UTM difiere un poco de
+        Haversine, por eso el 5% de margen): quien llama filtra con la distancia exacta.
+        
+        Args:
+            lat, lon: Centro de la búsqueda en grados
+            radio_km: Radio de la búsqueda en km
+        
+        Returns:
+            Arreglo de filas en orden creciente (el de Vertices); sin SciPy, todas las filas con posición
+        """
+        arbol, filas = self.get_arbol_kd()
+        if arbol is None:
+            return filas
+        cercanos = arbol.query_ball_point(convertir_latlon_a_utm(lat, lon), r=radio_km * 1000 * 1.05)
+        return filas[np.sort(np.asarray(cercanos, dtype=np.intp))]
+    
+    def _construir_coords(self):
+        """Construye los arreglos de ensure_coord_cache sin usar el caché"""
+        node_ids = np.asarray(self.graph.Vertices, dtype=np.int64)
+        coords = self.graph.coords
+        utm_x = np.ascontiguousarray(coords[:, 0])
+        utm_y = np.ascontiguousarray(coords[:, 1])
+        lat, lon = convertir_utm_a_latlon_bulk(utm_x, utm_y)
+        
+        cache = (node_ids, utm_x, utm_y, lat, lon)
+        for arreglo in cache:
+            arreglo.flags.writeable = False  # Compartidos entre peticiones: no se deben modificar
+        return cache
+    
+    def _construir_matriz_adyacencia(self):
+        """Construye (matriz, nodo_to_idx) sin usar el caché"""
         nodos = self.graph.Vertices
         n = len(nodos)
-        # Inicializar con infinito
-        matriz = [[float('inf')] * n for _ in range(n)]
-        
-        # Crear diccionario de nodo a índice
-        nodo_to_idx = {nodo: i for i, nodo in enumerate(nodos)}
-        
-        # Llenar con los pesos de las aristas
-        for origen, destino, peso in self.aristas:
-            if origen in nodo_to_idx and destino in nodo_to_idx:
-                i = nodo_to_idx[origen]
-                j = nodo_to_idx[destino]
-                # El peso es inverso a la distancia, así que usamos 1/peso como distancia
-                distancia = 1.0 / peso if peso > 0 else float('inf')
-                matriz[i][j] = distancia
-                matriz[j][i] = distancia  # Grafo no dirigido
+        # Matriz densa contigua (n, n) float64, inicializada con infinito
+        matriz = np.full((n, n), np.inf, dtype=np.float64)
+        
+        # Crear diccionario de nodo a índice siguiendo el orden Reverse Cuthill-McKee
+        orden = self._orden_cuthill_mckee(nodos)
+        nodo_to_idx = {nodos[pos]: i for i, pos in enumerate(orden)}
+        
+        # Llenar con los pesos de las aristas en una sola asignación vectorizada
+        if len(self.arbol.edges_src):
+            posicion = np.empty(n, dtype=np.intp)  # Índice de vértice -> fila de la matriz
+            posicion[orden] = np.arange(n)
+            origenes = posicion[self.arbol.edges_src]
+            destinos = posicion[self.arbol.edges_dst]
+            pesos = self.arbol.edges_w.astype(np.float64)
+            # El peso es inverso a la distancia, así que usamos 1/peso como distancia
+            distancias = np.full(len(pesos), np.inf)
+            np.divide(1.0, pesos, out=distancias, where=pesos > 0)
+            
+            # Grafo no dirigido: (i, j) y (j, i) intercalados en el orden de las aristas
+            filas = np.column_stack([origenes, destinos]).ravel()
+            columnas = np.column_stack([destinos, origenes]).ravel()
+            valores = np.repeat(distancias, 2)
+            # Si una celda se repite, gana la última asignación (igual que al recorrer las aristas)
+            celdas = filas * n + columnas
+            _, ultimas = np.unique(celdas[::-1], return_index=True)
+            ultimas = len(celdas) - 1 - ultimas
+            matriz[filas[ultimas], columnas[ultimas]] = valores[ultimas]
         
         # Diagonal en 0
-        for i in range(n):
-            matriz[i][i] = 0.0
+        np.fill_diagonal(matriz, 0.0)
         
+        matriz.flags.writeable = False  # Compartida entre llamadas: no se debe modificar
         return matriz, nodo_to_idx
 
 # Instancia global
 grafo_wrapper = GrafoWrapper()
+# Construir la matriz, el índice de alcanzabilidad, las coordenadas y el KD-tree al importar para que
+# las peticiones encuentren los cachés listos
+grafo_wrapper.get_matriz_adyacencia()
+grafo_wrapper.get_componentes()
+grafo_wrapper.ensure_coord_cache()
+grafo_wrapper.get_arbol_kd()
 
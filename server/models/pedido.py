@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from datetime import date
 
@@ -23,9 +23,8 @@ class PedidoUpdate(BaseModel):
     cliente_telefono: Optional[str] = None
 
 class Pedido(PedidoBase):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     ruta_optimizada: Optional[List[int]] = Field(None, description="Ruta optimizada calculada por TSP")
-    
-    class Config:
-        from_attributes = True
 
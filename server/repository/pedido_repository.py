@@ -1,62 +1,110 @@
 from typing import List, Optional, Tuple
 from datetime import date, timedelta
-import random
-import sys
+import asyncio
+import logging
+import math
 import os
-import heapq
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import json
+import hashlib
+import threading
+import numpy as np
+from collections import defaultdict
 from models.pedido import Pedido, PedidoCreate, PedidoUpdate
 from models.grafo_wrapper import grafo_wrapper
+from algorithms.numba_kernels import NUMBA_DISPONIBLE, _elegir_candidato_numba
+from services.ruta_service import distancia_haversine, distancia_haversine_vec, UMBRAL_HAVERSINE_VEC
+
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_DISPONIBLE = True
+except ImportError:
+    SCIPY_DISPONIBLE = False
+
+logger = logging.getLogger(__name__)
+
+# Nodos precalculados de los pedidos mock (se generan con scripts/generar_pedidos_mock.py)
+RUTA_NODOS_MOCK = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "mock_pedidos.json")
+VERSION_NODOS_MOCK = 1  # Incrementar si cambia la lógica de _calcular_nodos_mock
 
 class PedidoRepository:
     """Repository pattern para gestionar pedidos en memoria"""
     
+    _componentes = None  # Nodo -> componente conexa; se calcula al primer uso (grafo estático)
+    _nodos_por_componente = None  # Id de componente -> lista de sus nodos
+    _etiquetas_componentes = None  # Arreglo de grafo_wrapper.get_componentes del que salen los dos anteriores
+    
     def __init__(self):
-        self._pedidos: dict[int, Pedido] = {}
+        # Pedidos en una lista contigua (orden de creación) + posición de cada id en ella
+        self._pedidos: list[Pedido] = []
+        self._indice_por_id: dict[int, int] = {}
+        # Tienda en minúsculas -> sus pedidos por id, en orden de creación
+        self._por_tienda: dict[str, dict[int, Pedido]] = defaultdict(dict)
         self._next_id = 1
-        self._inicializar_datos_mock()
+        # Id de pedido -> (origen, destino, ruta, distancia, coordenadas) del último camino calculado
+        # para él, fuera del modelo Pedido para no guardarlo ni exponerlo con los datos del pedido
+        self._caminos_calculados: dict[int, tuple] = {}
+        # Los pedidos mock se cargan recién en el primer acceso (ver _asegurar_datos_mock)
+        self._inicializado = False
+        self._lock_inicializacion = threading.Lock()
+    
+    def _asegurar_datos_mock(self):
+        """
+        Carga los pedidos mock la primera vez que se usa el repositorio, no al construirlo.
+        Con la variable de entorno LOAD_MOCK=0 (producción) no se cargan.
+        """
+        if self._inicializado:
+            return
+        with self._lock_inicializacion:
+            # Otro hilo pudo cargarlos mientras se esperaba el lock
+            if not self._inicializado:
+                if os.environ.get("LOAD_MOCK", "1") == "1":
+                    self._inicializar_datos_mock()
+                self._inicializado = True
+    
+    async def esperar_datos_mock(self):
+        """
+        _asegurar_datos_mock para handlers async: si la carga no terminó, se hace (o se espera
+        en su lock mientras la termina el lifespan) en un hilo, sin bloquear el event loop
+        """
+        if not self._inicializado:
+            await asyncio.to_thread(self._asegurar_datos_mock)
     
-    def _verificar_camino_entre_nodos(self, origen: int, destino: int, max_intentos: int = 1000) -> bool:
+    def _verificar_camino_entre_nodos(self, origen: int, destino: int) -> bool:
         """
-        Verifica si existe un camino entre dos nodos usando BFS simplificado.
+        Verifica si existe un camino entre dos nodos (ignorando el sentido de las conexiones).
+        Las consultas se responden con la tabla de componentes conexas, que se arma una sola
+        vez y memoriza la alcanzabilidad de todos los pares: cada consulta es O(1), sin BFS.
         
         Args:
             origen: ID del nodo origen
             destino: ID del nodo destino
-            max_intentos: Máximo número de nodos a explorar
         
         Returns:
             True si existe un camino, False en caso contrario
         """
-        if origen not in grafo_wrapper.graph.label2v or destino not in grafo_wrapper.graph.label2v:
-            return False
-        
-        if origen == destino:
-            return True
-        
-        visitados = set()
-        cola = [origen]
-        visitados.add(origen)
-        intentos = 0
-        
-        while cola and intentos < max_intentos:
-            intentos += 1
-            nodo_actual = cola.pop(0)
-            
-            if nodo_actual == destino:
-                return True
-            
-            # Obtener vecinos
-            vecinos = grafo_wrapper.graph.get_children(nodo_actual)
-            padres = grafo_wrapper.graph.get_parents(nodo_actual)
-            todos_vecinos = set(vecinos + padres)
-            
-            for vecino in todos_vecinos:
-                if vecino not in visitados:
-                    visitados.add(vecino)
-                    cola.append(vecino)
+        componentes = self._obtener_componentes()
+        componente_origen = componentes.get(origen)
+        return componente_origen is not None and componente_origen == componentes.get(destino)
+    
+    @classmethod
+    def _obtener_componentes(cls) -> dict:
+        """
+        Componente conexa de cada nodo, a partir del índice de alcanzabilidad del grafo
+        (grafo_wrapper.get_componentes). Se rearma solo si el grafo recalculó ese índice.
         
-        return False
+        Returns:
+            Diccionario {nodo: id de componente}
+        """
+        etiquetas = grafo_wrapper.get_componentes()
+        if cls._componentes is None or cls._etiquetas_componentes is not etiquetas:
+            componentes = dict(zip(grafo_wrapper.graph.Vertices, etiquetas.tolist()))
+            nodos_por_componente = {}
+            for nodo, componente in componentes.items():
+                nodos_por_componente.setdefault(componente, []).append(nodo)
+            cls._nodos_por_componente = nodos_por_componente
+            cls._componentes = componentes
+            cls._etiquetas_componentes = etiquetas
+        return cls._componentes
     
     def _obtener_nodos_reales(self, cantidad: int) -> List[int]:
         """
@@ -69,323 +117,450 @@ class PedidoRepository:
         Returns:
             Lista de IDs de nodos del grafo, donde los primeros 2 tienen camino válido
         """
+        return self._obtener_nodos_reales_lote([cantidad])[0]
+    
+    def _obtener_nodos_reales_lote(self, cantidades: List[int]) -> List[List[int]]:
+        """
+        Versión por lotes de _obtener_nodos_reales: selecciona los nodos de varios pedidos
+        con unas pocas llamadas vectorizadas a NumPy en lugar de un sorteo por pedido.
+        
+        Args:
+            cantidades: Número de nodos a seleccionar para cada pedido (mínimo 2 cada uno)
+        
+        Returns:
+            Una lista de IDs de nodos por pedido, donde los primeros 2 tienen camino válido
+        """
         try:
-            nodos_disponibles = list(grafo_wrapper.graph.Vertices)
+            nodos_disponibles = grafo_wrapper.vertices_tuple
             if len(nodos_disponibles) == 0:
-                print("⚠️ ADVERTENCIA PedidoRepository: No hay nodos disponibles en el grafo")
-                return []
+                logger.warning("⚠️ ADVERTENCIA PedidoRepository: No hay nodos disponibles en el grafo")
+                return [[] for _ in cantidades]
             
             # Asegurar que siempre haya al menos 2 nodos
-            cantidad = max(2, cantidad)
-            cantidad = min(cantidad, len(nodos_disponibles))
+            cantidades = np.clip(np.asarray(cantidades, dtype=np.int64), 2, len(nodos_disponibles))
+            filas = len(cantidades)
+            rng = np.random.default_rng()
+            
+            # Muestra sin repetición por fila (índices de grafo_wrapper.vertices_tuple)
+            muestras = [self._muestra_indices(rng, cantidad) for cantidad in cantidades.tolist()]
+            
+            # Elegir directamente un par conectado, sin sortear pares al azar y reintentar:
+            # una componente con probabilidad proporcional a su cantidad de pares ordenados
+            # |c|·(|c| - 1) y dos nodos distintos de ella. Es la misma distribución que
+            # sortear pares hasta que uno tenga camino, pero acierta en el primer intento
+            self._obtener_componentes()
+            grupos = [nodos for nodos in PedidoRepository._nodos_por_componente.values() if len(nodos) > 1]
+            
+            if not grupos:
+                # Ninguna componente tiene dos nodos: no existe un par con camino, usar selección aleatoria simple
+                logger.warning("⚠️ ADVERTENCIA: No existe ningún par de nodos con camino válido en el grafo. "
+                               "Usando selección aleatoria simple (puede fallar al calcular ruta)")
+                return [[nodos_disponibles[k] for k in fila] for fila in muestras]
             
-            # Seleccionar origen y destino que tengan camino válido
-            max_intentos_busqueda = 50  # Intentar hasta 50 veces encontrar un par válido
-            intentos = 0
+            tamanos = np.array([len(nodos) for nodos in grupos], dtype=np.int64)
+            pares = tamanos * (tamanos - 1)
+            elegidas = rng.choice(len(grupos), size=filas, p=pares / pares.sum())
+            # Dos posiciones distintas dentro de cada componente elegida
+            n = tamanos[elegidas]
+            pos_origen = rng.integers(0, n)
+            pos_destino = rng.integers(0, n - 1)
+            pos_destino += pos_destino >= pos_origen
             
-            while intentos < max_intentos_busqueda:
-                intentos += 1
+            seleccion = []
+            for fila, (componente, i, j, cantidad) in enumerate(zip(elegidas.tolist(), pos_origen.tolist(),
+                                                                    pos_destino.tolist(), cantidades.tolist())):
+                origen, destino = grupos[componente][i], grupos[componente][j]
                 
-                # Seleccionar origen y destino aleatorios
-                origen, destino = random.sample(nodos_disponibles, 2)
+                # Resto de nodos: los de la muestra de la fila sin origen/destino. La muestra tiene
+                # `cantidad` nodos, así que quitando esos dos quedan al menos cantidad - 2
+                nodos_adicionales = [nodos_disponibles[k] for k in muestras[fila]
+                                     if nodos_disponibles[k] != origen and nodos_disponibles[k] != destino]
+                nodos_seleccionados = [origen, destino] + nodos_adicionales[:cantidad - 2]
                 
-                # Verificar que existe camino entre origen y destino
-                if self._verificar_camino_entre_nodos(origen, destino):
-                    # Si hay camino, seleccionar el resto de nodos aleatoriamente
-                    nodos_restantes = [n for n in nodos_disponibles if n != origen and n != destino]
-                    
-                    if cantidad == 2:
-                        nodos_seleccionados = [origen, destino]
-                    else:
-                        # Seleccionar nodos adicionales aleatoriamente
-                        cantidad_adicional = cantidad - 2
-                        nodos_adicionales = random.sample(nodos_restantes, min(cantidad_adicional, len(nodos_restantes)))
-                        nodos_seleccionados = [origen, destino] + nodos_adicionales
-                    
-                    print(f"✅ PedidoRepository: Seleccionados {len(nodos_seleccionados)} nodos con camino válido")
-                    print(f"   Origen: {origen}, Destino: {destino}")
-                    print(f"   Nodos completos: {nodos_seleccionados}")
-                    print(f"   Total de nodos disponibles en grafo: {len(nodos_disponibles)}")
-                    return nodos_seleccionados
-            
-            # Si después de varios intentos no se encontró un par válido, usar selección aleatoria simple
-            print(f"⚠️ ADVERTENCIA: No se encontró par con camino válido después de {max_intentos_busqueda} intentos")
-            print(f"   Usando selección aleatoria simple (puede fallar al calcular ruta)")
-            nodos_seleccionados = random.sample(nodos_disponibles, cantidad)
-            return nodos_seleccionados
+                # %-formato diferido: la lista de nodos solo se convierte a texto si DEBUG está activo
+                logger.debug("✅ PedidoRepository: Seleccionados %d nodos con camino válido "
+                             "(origen: %s, destino: %s, nodos: %s, disponibles en grafo: %d)",
+                             len(nodos_seleccionados), origen, destino, nodos_seleccionados, len(nodos_disponibles))
+                seleccion.append(nodos_seleccionados)
+            return seleccion
             
         except Exception as e:
-            print(f"❌ ERROR al obtener nodos del grafo: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+            logger.exception("❌ ERROR al obtener nodos del grafo: %s", e)
+            return [[] for _ in cantidades]
+    
+    def _muestra_indices(self, rng: np.random.Generator, k: int) -> List[int]:
+        """
+        k índices distintos de grafo_wrapper.vertices_tuple en orden aleatorio. Si k es pequeño frente
+        al total se sortean índices y se descartan los repetidos con un conjunto, sin
+        permutar (ni copiar) la lista entera de nodos.
+        """
+        n = len(grafo_wrapper.vertices_tuple)
+        if 4 * k > n:
+            return rng.permutation(n)[:k].tolist()
+        
+        elegidos = set()
+        muestra = []
+        while len(muestra) < k:
+            for indice in rng.integers(n, size=k - len(muestra)).tolist():
+                if indice not in elegidos:
+                    elegidos.add(indice)
+                    muestra.append(indice)
+        return muestra
     
     def _obtener_nodos_por_zona(self, lat_centro: float, lon_centro: float, radio_km: float = 15.0, separacion_minima_km: float = 1.0) -> List[int]:
         """
         Obtiene nodos que están dentro de un radio específico desde un punto central,
         asegurando que estén separados entre sí por una distancia mínima.
         """
-        from services.ruta_service import convertir_utm_a_latlon
-        import math
-        
-        def distancia_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-            """Calcula distancia entre dos puntos en km"""
-            R = 6371
-            lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
-            lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
-            dlat = lat2_rad - lat1_rad
-            dlon = lon2_rad - lon1_rad
-            a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            return R * c
-        
-        nodos_en_zona = []
-        grafo = grafo_wrapper.graph
-        
-        for nodo_id in grafo.Vertices:
-            coords_utm = grafo.get_node_coords(nodo_id)
-            if coords_utm and coords_utm != (0, 0):
-                lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-                
-                # Calcular distancia al centro
-                distancia = distancia_haversine(lat_centro, lon_centro, lat, lon)
-                
-                if distancia <= radio_km:
-                    nodos_en_zona.append((nodo_id, distancia, lat, lon))
-        
-        # Ordenar por distancia al centro
-        nodos_en_zona.sort(key=lambda x: x[1])
-        
-        # Filtrar para asegurar separación mínima entre nodos seleccionados
-        nodos_seleccionados = []
-        for nodo_id, distancia, lat, lon in nodos_en_zona:
-            # Verificar que esté suficientemente separado de los nodos ya seleccionados
-            muy_cerca = False
-            for nodo_sel_id, _, lat_sel, lon_sel in nodos_seleccionados:
-                dist_entre_nodos = distancia_haversine(lat, lon, lat_sel, lon_sel)
-                if dist_entre_nodos < separacion_minima_km:
-                    muy_cerca = True
-                    break
-            
+        # Coordenadas ya convertidas (caché de grafo_wrapper) de los nodos que el KD-tree deja
+        # como candidatos dentro del radio
+        node_ids, _, _, lats, lons = grafo_wrapper.ensure_coord_cache()
+        filas = grafo_wrapper.filas_en_radio(lat_centro, lon_centro, radio_km)
+        ids, lats, lons = node_ids[filas], lats[filas], lons[filas]
+        
+        # Distancia exacta de los candidatos al centro en una sola operación vectorizada
+        distancias = distancia_haversine_vec(lat_centro, lon_centro, lats, lons)
+        en_zona = np.flatnonzero(distancias <= radio_km)
+        # Ordenar por distancia al centro (estable: a igual distancia se respeta el orden de Vertices)
+        en_zona = en_zona[np.argsort(distancias[en_zona], kind='stable')]
+        
+        # Filtrar para asegurar separación mínima entre nodos seleccionados: con pocos
+        # seleccionados se compara con math (cortando en el primero muy cercano); con
+        # muchos, contra todos a la vez con NumPy
+        # Con math, primero una aproximación equirectangular en grados² (coseno del centro
+        # precalculado, sin raíz) descarta los pares claramente separados; solo los que quedan
+        # a menos del umbral + 1% de margen se miden con Haversine exacto
+        cos_centro = math.cos(math.radians(lat_centro))
+        umbral_grados2 = (separacion_minima_km * 1.01 / (6371 * math.pi / 180)) ** 2
+        lats_lista, lons_lista = lats.tolist(), lons.tolist()
+        seleccionados = []
+        for i in en_zona.tolist():
+            lat, lon = lats_lista[i], lons_lista[i]
+            if len(seleccionados) < UMBRAL_HAVERSINE_VEC:
+                muy_cerca = any((lat - lats_lista[j]) ** 2 + ((lon - lons_lista[j]) * cos_centro) ** 2 < umbral_grados2
+                                and distancia_haversine(lat, lon, lats_lista[j], lons_lista[j]) < separacion_minima_km
+                                for j in seleccionados)
+            else:
+                muy_cerca = (distancia_haversine_vec(lat, lon, lats[seleccionados], lons[seleccionados]) < separacion_minima_km).any()
             if not muy_cerca:
-                nodos_seleccionados.append((nodo_id, distancia, lat, lon))
+                seleccionados.append(i)
         
-        return [nodo[0] for nodo in nodos_seleccionados]
+        return ids[seleccionados].tolist()
     
-    def _inicializar_datos_mock(self):
-        """Inicializa el repositorio con datos mock usando coordenadas hardcodeadas"""
-        try:
-            hoy = date.today()
-            
-            # COORDENADAS HARDCODEADAS - Cada pedido tiene coordenadas fijas que nunca cambian
-            # IMPORTANTE: Tanto SAGA como RIPLEY deben tener pedidos BIEN ESPARCIDOS por toda Lima Metropolitana
-            # SAGA (índices pares: 0, 2, 4, 6, 8, 10): 6 pedidos distribuidos
-            # RIPLEY (índices impares: 1, 3, 5, 7, 9, 11): 6 pedidos distribuidos en DIFERENTES zonas
-            # Coordenadas en formato (latitud, longitud)
-            # Mínimo 12-15km entre cada pedido de la misma tienda
-            coordenadas_saga = [
-                (-12.0950, -77.0280),  # 0 - María González - San Isidro (CENTRO)
-                (-12.2200, -76.9500),  # 2 - Ana Martínez - Villa El Salvador (SUR-ESTE - ~18km)
-                (-11.9000, -77.1000),  # 4 - Carmen López - Comas (NORTE - ~22km)
-                (-12.0500, -76.8000),  # 6 - Patricia Torres - Chaclacayo (ESTE - ~20km)
-                (-12.2800, -77.0000),  # 8 - Sofía Herrera - Punta Hermosa (SUR - ~20km)
-                (-11.8500, -77.0500),  # 10 - Laura Jiménez - Carabayllo (NORTE - ~25km)
-            ]
-            
-            coordenadas_ripley = [
-                (-12.0400, -77.1200),  # 1 - Carlos Rodríguez - Callao (OESTE - ~10km)
-                (-12.1600, -77.0200),  # 3 - Luis Fernández - Barranco (SUR - ~8km)
-                (-12.0700, -76.9200),  # 5 - Roberto Sánchez - La Molina (ESTE - ~12km)
-                (-12.1100, -77.0500),  # 7 - Jorge Ramírez - San Borja (SUR - ~6km)
-                (-11.9800, -77.0200),  # 9 - Miguel Vargas - Independencia (NORTE - ~12km)
-                (-12.1800, -77.0800),  # 11 - Diego Morales - Chorrillos (SUR-OESTE - ~12km)
-            ]
-            
-            # Datos hardcodeados de clientes - SAGA (6 pedidos)
-            clientes_saga = [
-                {"nombre": "María González", "direccion": "Av. Javier Prado 1234, San Isidro", "telefono": "987654321", "coords": coordenadas_saga[0], "tienda": "Saga"},
-                {"nombre": "Ana Martínez", "direccion": "Av. Arequipa 890, Miraflores", "telefono": "987654323", "coords": coordenadas_saga[1], "tienda": "Saga"},
-                {"nombre": "Carmen López", "direccion": "Av. La Marina 456, San Miguel", "telefono": "987654325", "coords": coordenadas_saga[2], "tienda": "Saga"},
-                {"nombre": "Patricia Torres", "direccion": "Av. Angamos 321, Surco", "telefono": "987654327", "coords": coordenadas_saga[3], "tienda": "Saga"},
-                {"nombre": "Sofía Herrera", "direccion": "Av. Túpac Amaru 987, Independencia", "telefono": "987654329", "coords": coordenadas_saga[4], "tienda": "Saga"},
-                {"nombre": "Laura Jiménez", "direccion": "Av. Primavera 258, Chorrillos", "telefono": "987654331", "coords": coordenadas_saga[5], "tienda": "Saga"},
-            ]
-            
-            # Datos hardcodeados de clientes - RIPLEY (6 pedidos diferentes)
-            clientes_ripley = [
-                {"nombre": "Carlos Rodríguez", "direccion": "Av. Guardia Civil 456, Callao", "telefono": "987654322", "coords": coordenadas_ripley[0], "tienda": "Ripley"},
-                {"nombre": "Luis Fernández", "direccion": "Av. Grau 789, Barranco", "telefono": "987654324", "coords": coordenadas_ripley[1], "tienda": "Ripley"},
-                {"nombre": "Roberto Sánchez", "direccion": "Av. La Molina 321, La Molina", "telefono": "987654326", "coords": coordenadas_ripley[2], "tienda": "Ripley"},
-                {"nombre": "Jorge Ramírez", "direccion": "Av. San Borja Norte 654, San Borja", "telefono": "987654328", "coords": coordenadas_ripley[3], "tienda": "Ripley"},
-                {"nombre": "Miguel Vargas", "direccion": "Av. Túpac Amaru 147, Independencia", "telefono": "987654330", "coords": coordenadas_ripley[4], "tienda": "Ripley"},
-                {"nombre": "Diego Morales", "direccion": "Av. Defensores del Morro 369, Chorrillos", "telefono": "987654332", "coords": coordenadas_ripley[5], "tienda": "Ripley"},
-            ]
-            
-            # Procesar SAGA y RIPLEY por separado con la misma lógica
-            # Cada tienda debe tener nodos bien distribuidos por toda Lima
-            nodos_seleccionados_saga = []
-            nodos_seleccionados_ripley = []
-            nodos_ya_usados = set()  # Para asegurar que cada nodo sea único (entre todas las tiendas)
+    @staticmethod
+    def _clientes_mock() -> Tuple[List[dict], List[dict]]:
+        """
+        Datos fijos de los clientes mock de cada tienda.
+        
+        Returns:
+            Tupla (clientes de SAGA, clientes de RIPLEY)
+        """
+        # COORDENADAS HARDCODEADAS - Cada pedido tiene coordenadas fijas que nunca cambian
+        # IMPORTANTE: Tanto SAGA como RIPLEY deben tener pedidos BIEN ESPARCIDOS por toda Lima Metropolitana
+        # SAGA (índices pares: 0, 2, 4, 6, 8, 10): 6 pedidos distribuidos
+        # RIPLEY (índices impares: 1, 3, 5, 7, 9, 11): 6 pedidos distribuidos en DIFERENTES zonas
+        # Coordenadas en formato (latitud, longitud)
+        # Mínimo 12-15km entre cada pedido de la misma tienda
+        coordenadas_saga = [
+            (-12.0950, -77.0280),  # 0 - María González - San Isidro (CENTRO)
+            (-12.2200, -76.9500),  # 2 - Ana Martínez - Villa El Salvador (SUR-ESTE - ~18km)
+            (-11.9000, -77.1000),  # 4 - Carmen López - Comas (NORTE - ~22km)
+            (-12.0500, -76.8000),  # 6 - Patricia Torres - Chaclacayo (ESTE - ~20km)
+            (-12.2800, -77.0000),  # 8 - Sofía Herrera - Punta Hermosa (SUR - ~20km)
+            (-11.8500, -77.0500),  # 10 - Laura Jiménez - Carabayllo (NORTE - ~25km)
+        ]
+        
+        coordenadas_ripley = [
+            (-12.0400, -77.1200),  # 1 - Carlos Rodríguez - Callao (OESTE - ~10km)
+            (-12.1600, -77.0200),  # 3 - Luis Fernández - Barranco (SUR - ~8km)
+            (-12.0700, -76.9200),  # 5 - Roberto Sánchez - La Molina (ESTE - ~12km)
+            (-12.1100, -77.0500),  # 7 - Jorge Ramírez - San Borja (SUR - ~6km)
+            (-11.9800, -77.0200),  # 9 - Miguel Vargas - Independencia (NORTE - ~12km)
+            (-12.1800, -77.0800),  # 11 - Diego Morales - Chorrillos (SUR-OESTE - ~12km)
+        ]
+        
+        # Datos hardcodeados de clientes - SAGA (6 pedidos)
+        clientes_saga = [
+            {"nombre": "María González", "direccion": "Av. Javier Prado 1234, San Isidro", "telefono": "987654321", "coords": coordenadas_saga[0], "tienda": "Saga"},
+            {"nombre": "Ana Martínez", "direccion": "Av. Arequipa 890, Miraflores", "telefono": "987654323", "coords": coordenadas_saga[1], "tienda": "Saga"},
+            {"nombre": "Carmen López", "direccion": "Av. La Marina 456, San Miguel", "telefono": "987654325", "coords": coordenadas_saga[2], "tienda": "Saga"},
+            {"nombre": "Patricia Torres", "direccion": "Av. Angamos 321, Surco", "telefono": "987654327", "coords": coordenadas_saga[3], "tienda": "Saga"},
+            {"nombre": "Sofía Herrera", "direccion": "Av. Túpac Amaru 987, Independencia", "telefono": "987654329", "coords": coordenadas_saga[4], "tienda": "Saga"},
+            {"nombre": "Laura Jiménez", "direccion": "Av. Primavera 258, Chorrillos", "telefono": "987654331", "coords": coordenadas_saga[5], "tienda": "Saga"},
+        ]
+        
+        # Datos hardcodeados de clientes - RIPLEY (6 pedidos diferentes)
+        clientes_ripley = [
+            {"nombre": "Carlos Rodríguez", "direccion": "Av. Guardia Civil 456, Callao", "telefono": "987654322", "coords": coordenadas_ripley[0], "tienda": "Ripley"},
+            {"nombre": "Luis Fernández", "direccion": "Av. Grau 789, Barranco", "telefono": "987654324", "coords": coordenadas_ripley[1], "tienda": "Ripley"},
+            {"nombre": "Roberto Sánchez", "direccion": "Av. La Molina 321, La Molina", "telefono": "987654326", "coords": coordenadas_ripley[2], "tienda": "Ripley"},
+            {"nombre": "Jorge Ramírez", "direccion": "Av. San Borja Norte 654, San Borja", "telefono": "987654328", "coords": coordenadas_ripley[3], "tienda": "Ripley"},
+            {"nombre": "Miguel Vargas", "direccion": "Av. Túpac Amaru 147, Independencia", "telefono": "987654330", "coords": coordenadas_ripley[4], "tienda": "Ripley"},
+            {"nombre": "Diego Morales", "direccion": "Av. Defensores del Morro 369, Chorrillos", "telefono": "987654332", "coords": coordenadas_ripley[5], "tienda": "Ripley"},
+        ]
+        
+        return clientes_saga, clientes_ripley
+    
+    def _calcular_nodos_mock(self, clientes_saga: List[dict], clientes_ripley: List[dict]) -> List[int]:
+        """
+        Busca en el grafo un nodo real cerca de las coordenadas de cada cliente mock.
+        
+        Args:
+            clientes_saga: Clientes de SAGA (ver _clientes_mock)
+            clientes_ripley: Clientes de RIPLEY
+        
+        Returns:
+            Nodos seleccionados, en el orden de clientes_saga + clientes_ripley
+        """
+        # Procesar SAGA y RIPLEY por separado con la misma lógica
+        # Cada tienda debe tener nodos bien distribuidos por toda Lima
+        nodos_seleccionados_saga = []
+        nodos_seleccionados_ripley = []
+        
+        # Nodos con posición dentro del área de Lima: una sola máscara vectorizada sobre el
+        # caché de coordenadas de grafo_wrapper, compartida por las dos tiendas
+        node_ids, utm_x, utm_y, lats, lons = grafo_wrapper.ensure_coord_cache()
+        validos = np.logical_and.reduce([(utm_x != 0) | (utm_y != 0),
+                                         -13.0 < lats, lats < -11.0, -78.0 < lons, lons < -76.0])
+        filas_coords = np.flatnonzero(validos)
+        ids_coords, lats_coords, lons_coords = node_ids[filas_coords], lats[filas_coords], lons[filas_coords]
+        
+        # Para asegurar que cada nodo sea único (entre todas las tiendas): bitset por posición
+        # de vértice (la misma en grafo_wrapper.vertices_tuple y en el caché de coordenadas)
+        nodo_usado = np.zeros(len(node_ids), dtype=bool)
+        
+        def siguiente_libre(inicio: int) -> int:
+            """Posición del primer vértice no usado desde inicio, dando la vuelta al final (-1 si no hay)"""
+            desplazamiento = int(np.argmin(nodo_usado[inicio:]))  # Primer False desde inicio
+            if not nodo_usado[inicio + desplazamiento]:
+                return inicio + desplazamiento
+            primero = int(np.argmin(nodo_usado))
+            return -1 if nodo_usado[primero] else primero
+        
+        arbol_kd = None
+        if SCIPY_DISPONIBLE and len(ids_coords):
+            # Proyección equirectangular local (km) alrededor del centroide: la
+            # distancia euclídea aproxima a Haversine y el KD-tree acota los candidatos
+            cos_lat0 = np.cos(np.radians(lats_coords.mean()))
+            def proyectar(lat, lon):
+                return np.column_stack([np.radians(lat) * 6371.0, np.radians(lon) * 6371.0 * cos_lat0])
+            arbol_kd = cKDTree(proyectar(lats_coords, lons_coords))
+        
+        # Función auxiliar para procesar clientes de una tienda
+        def procesar_clientes_tienda(clientes_tienda, nombre_tienda):
+            """Procesa los clientes de una tienda y retorna los nodos seleccionados"""
+            nodos_seleccionados = []
+            coordenadas_nodos_usados = []  # Para verificar separación mínima dentro de esta tienda
             
-            # Función auxiliar para procesar clientes de una tienda
-            def procesar_clientes_tienda(clientes_tienda, nombre_tienda):
-                """Procesa los clientes de una tienda y retorna los nodos seleccionados"""
-                nodos_seleccionados = []
-                coordenadas_nodos_usados = []  # Para verificar separación mínima dentro de esta tienda
-                
-                # Verificar que el grafo esté disponible
-                if hasattr(grafo_wrapper, 'graph') and grafo_wrapper.graph is not None:
-                    try:
-                        nodos_reales = list(grafo_wrapper.graph.Vertices) if hasattr(grafo_wrapper.graph, 'Vertices') and grafo_wrapper.graph.Vertices else []
-                        
-                        # Obtener coordenadas de TODOS los nodos disponibles
-                        nodos_con_coords = []
-                        for nodo_id in nodos_reales:
-                            try:
-                                coords_utm = grafo_wrapper.graph.get_node_coords(nodo_id)
-                                if coords_utm is not None and len(coords_utm) == 2:
-                                    utm_x, utm_y = coords_utm[0], coords_utm[1]
-                                    if utm_x != 0 or utm_y != 0:
-                                        try:
-                                            nodo_lat, nodo_lon = self._convertir_utm_a_latlon(utm_x, utm_y)
-                                            if -13.0 < nodo_lat < -11.0 and -78.0 < nodo_lon < -76.0:
-                                                nodos_con_coords.append((nodo_id, nodo_lat, nodo_lon))
-                                        except Exception:
-                                            pass
-                            except Exception:
-                                continue
+            # Verificar que el grafo esté disponible
+            if hasattr(grafo_wrapper, 'graph') and grafo_wrapper.graph is not None:
+                try:
+                    nodos_reales = grafo_wrapper.vertices_tuple
+                    
+                    # Si no hay nodos con coordenadas válidas, usar distribución directa
+                    if len(ids_coords) == 0 and len(nodos_reales) > 0:
+                        logger.warning("⚠️ [%s] No se encontraron nodos con coordenadas válidas. Usando distribución directa...", nombre_tienda)
+                        paso = max(1, len(nodos_reales) // len(clientes_tienda))
+                        for i, cliente in enumerate(clientes_tienda):
+                            indice_nodo = siguiente_libre((i * paso) % len(nodos_reales))
+                            if indice_nodo == -1:
+                                raise Exception("No quedan nodos libres en el grafo")
+                            nodo_id = nodos_reales[indice_nodo]
+                            nodo_usado[indice_nodo] = True
+                            nodos_seleccionados.append(nodo_id)
+                            lat_obj, lon_obj = cliente["coords"]
+                            coordenadas_nodos_usados.append((lat_obj, lon_obj))
+                            logger.debug("✅ [%s] Cliente %s: Nodo %s (distribuido uniformemente)", nombre_tienda, cliente['nombre'], nodo_id)
+                    else:
+                        # Buscar nodos distribuidos para cada cliente
+                        separacion_minima_km = 8.0
+                        radio_busqueda_km = 25.0
+                        # Distancia de cada nodo al nodo ya elegido más cercano de esta tienda: se
+                        # actualiza con un solo mínimo vectorizado por cada nodo elegido (como en
+                        # farthest-point sampling), sin volver a medir contra todos los usados
+                        distancia_a_usados = np.full(len(ids_coords), np.inf)
                         
-                        # Si no hay nodos con coordenadas válidas, usar distribución directa
-                        if len(nodos_con_coords) == 0 and len(nodos_reales) > 0:
-                            print(f"⚠️ [{nombre_tienda}] No se encontraron nodos con coordenadas válidas. Usando distribución directa...")
-                            paso = max(1, len(nodos_reales) // len(clientes_tienda))
-                            for i, cliente in enumerate(clientes_tienda):
-                                indice_nodo = (i * paso) % len(nodos_reales)
-                                nodo_id = nodos_reales[indice_nodo]
-                                while nodo_id in nodos_ya_usados:
-                                    indice_nodo = (indice_nodo + 1) % len(nodos_reales)
-                                    nodo_id = nodos_reales[indice_nodo]
-                                nodos_seleccionados.append(nodo_id)
-                                nodos_ya_usados.add(nodo_id)
-                                lat_obj, lon_obj = cliente["coords"]
-                                coordenadas_nodos_usados.append((lat_obj, lon_obj))
-                                print(f"✅ [{nombre_tienda}] Cliente {cliente['nombre']}: Nodo {nodo_id} (distribuido uniformemente)")
-                        else:
-                            # Buscar nodos distribuidos para cada cliente
-                            separacion_minima_km = 8.0
+                        for cliente in clientes_tienda:
+                            lat_objetivo, lon_objetivo = cliente["coords"]
+                            nodo_seleccionado = None
                             
-                            for cliente in clientes_tienda:
-                                lat_objetivo, lon_objetivo = cliente["coords"]
-                                nodo_seleccionado = None
-                                mejor_distancia = float('inf')
-                                
-                                # Buscar nodos candidatos cerca de la coordenada objetivo
-                                candidatos = []
-                                for nodo_id, nodo_lat, nodo_lon in nodos_con_coords:
-                                    if nodo_id in nodos_ya_usados:
-                                        continue
-                                    
-                                    distancia_objetivo = self._distancia_haversine(lat_objetivo, lon_objetivo, nodo_lat, nodo_lon)
-                                    if distancia_objetivo > 25.0:
-                                        continue
-                                    
-                                    muy_cerca_de_otros = False
-                                    for (lat_otro, lon_otro) in coordenadas_nodos_usados:
-                                        distancia_entre_nodos = self._distancia_haversine(nodo_lat, nodo_lon, lat_otro, lon_otro)
-                                        if distancia_entre_nodos < separacion_minima_km:
-                                            muy_cerca_de_otros = True
-                                            break
-                                    
-                                    if not muy_cerca_de_otros:
-                                        candidatos.append((nodo_id, distancia_objetivo, nodo_lat, nodo_lon))
-                                
-                                candidatos.sort(key=lambda x: x[1])
+                            usados = nodo_usado[filas_coords]
+                            
+                            if arbol_kd is not None:
+                                # Solo los nodos dentro del radio (con 5% de margen por el error de la
+                                # proyección); las distancias finales son Haversine exactas
+                                cercanos = arbol_kd.query_ball_point(proyectar([lat_objetivo], [lon_objetivo])[0],
+                                                                     r=radio_busqueda_km * 1.05)
+                                cercanos = np.sort(np.asarray(cercanos, dtype=np.intp))
+                                cercanos = cercanos[~usados[cercanos]]
+                                cercanos = cercanos[distancia_a_usados[cercanos] >= separacion_minima_km]
+                                distancia_objetivo = distancia_haversine_vec(lat_objetivo, lon_objetivo, lats_coords[cercanos], lons_coords[cercanos])
+                                dentro = distancia_objetivo <= radio_busqueda_km
+                                if dentro.any():
+                                    # argmin devuelve el primero en caso de empate, como el sort estable
+                                    nodo_seleccionado = int(ids_coords[cercanos[dentro][np.argmin(distancia_objetivo[dentro])]])
+                            
+                            # Sin SciPy, o sin candidatos en el radio: recorrer todos los nodos
+                            if nodo_seleccionado is None and NUMBA_DISPONIBLE:
+                                # Una sola pasada compilada: filtra, mide y elige sin arreglos intermedios
+                                lats_usados = np.array([c[0] for c in coordenadas_nodos_usados], dtype=np.float64)
+                                lons_usados = np.array([c[1] for c in coordenadas_nodos_usados], dtype=np.float64)
+                                mejor, primero_libre = _elegir_candidato_numba(
+                                    lats_coords, lons_coords, usados, lat_objetivo, lon_objetivo,
+                                    lats_usados, lons_usados, separacion_minima_km, radio_busqueda_km)
+                                indice = mejor if mejor != -1 else primero_libre
+                                if indice != -1:
+                                    nodo_seleccionado = int(ids_coords[indice])
+                            elif nodo_seleccionado is None:
+                                # Una sola pasada vectorizada sobre todos los nodos: distancia al objetivo y
+                                # separación de los usados; de ahí salen las dos opciones de selección
+                                separados = ~usados & (distancia_a_usados >= separacion_minima_km)
+                                distancia_objetivo = distancia_haversine_vec(lat_objetivo, lon_objetivo, lats_coords, lons_coords)
+                                en_radio = separados & (distancia_objetivo <= radio_busqueda_km)
                                 
-                                if candidatos:
-                                    nodo_seleccionado, mejor_distancia, nodo_lat, nodo_lon = candidatos[0]
+                                if en_radio.any():
+                                    # El más cercano a menos de 25 km (argmin: el primero en caso de empate)
+                                    nodo_seleccionado = int(ids_coords[np.argmin(np.where(en_radio, distancia_objetivo, np.inf))])
+                                elif separados.any():
+                                    # Cualquier nodo no usado y bien separado: el primero en orden
+                                    nodo_seleccionado = int(ids_coords[np.argmax(separados)])
+                            
+                            if nodo_seleccionado is None:
+                                # Último recurso: cualquier nodo no usado
+                                indice_nodo = siguiente_libre(0)
+                                if indice_nodo != -1:
+                                    nodo_seleccionado = nodos_reales[indice_nodo]
+                            
+                            if nodo_seleccionado is not None:
+                                fila = grafo_wrapper.node_index[nodo_seleccionado]
+                                if utm_x[fila] != 0 or utm_y[fila] != 0:
+                                    nodo_lat_final, nodo_lon_final = float(lats[fila]), float(lons[fila])
                                 else:
-                                    # Buscar cualquier nodo no usado y bien separado
-                                    for nodo_id, nodo_lat, nodo_lon in nodos_con_coords:
-                                        if nodo_id in nodos_ya_usados:
-                                            continue
-                                        
-                                        muy_cerca = False
-                                        for (lat_otro, lon_otro) in coordenadas_nodos_usados:
-                                            distancia_entre = self._distancia_haversine(nodo_lat, nodo_lon, lat_otro, lon_otro)
-                                            if distancia_entre < separacion_minima_km:
-                                                muy_cerca = True
-                                                break
-                                        
-                                        if not muy_cerca:
-                                            nodo_seleccionado = nodo_id
-                                            mejor_distancia = self._distancia_haversine(lat_objetivo, lon_objetivo, nodo_lat, nodo_lon)
-                                            break
-                                
-                                if nodo_seleccionado is None:
-                                    # Último recurso: cualquier nodo no usado
-                                    for nodo_id in nodos_reales:
-                                        if nodo_id not in nodos_ya_usados:
-                                            nodo_seleccionado = nodo_id
-                                            break
+                                    nodo_lat_final, nodo_lon_final = lat_objetivo, lon_objetivo
                                 
-                                if nodo_seleccionado is not None:
-                                    try:
-                                        coords_utm = grafo_wrapper.graph.get_node_coords(nodo_seleccionado)
-                                        if coords_utm and coords_utm != (0, 0):
-                                            nodo_lat_final, nodo_lon_final = self._convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-                                        else:
-                                            nodo_lat_final, nodo_lon_final = lat_objetivo, lon_objetivo
-                                    except:
-                                        nodo_lat_final, nodo_lon_final = lat_objetivo, lon_objetivo
-                                    
-                                    nodos_seleccionados.append(nodo_seleccionado)
-                                    nodos_ya_usados.add(nodo_seleccionado)
-                                    coordenadas_nodos_usados.append((nodo_lat_final, nodo_lon_final))
-                                    print(f"✅ [{nombre_tienda}] Cliente {cliente['nombre']}: Nodo {nodo_seleccionado} en ({nodo_lat_final:.6f}, {nodo_lon_final:.6f})")
-                                else:
-                                    raise Exception(f"No se pudo encontrar nodo para {cliente['nombre']}")
-                        
-                        return nodos_seleccionados
+                                nodos_seleccionados.append(nodo_seleccionado)
+                                nodo_usado[fila] = True
+                                coordenadas_nodos_usados.append((nodo_lat_final, nodo_lon_final))
+                                np.minimum(distancia_a_usados,
+                                           distancia_haversine_vec(nodo_lat_final, nodo_lon_final, lats_coords, lons_coords),
+                                           out=distancia_a_usados)
+                                logger.debug("✅ [%s] Cliente %s: Nodo %s en (%.6f, %.6f)", nombre_tienda, cliente['nombre'],
+                                             nodo_seleccionado, nodo_lat_final, nodo_lon_final)
+                            else:
+                                raise Exception(f"No se pudo encontrar nodo para {cliente['nombre']}")
                     
-                    except Exception as e:
-                        print(f"⚠️ ERROR [{nombre_tienda}]: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        # Fallback: usar nodos distribuidos
-                        if len(nodos_reales) > 0:
-                            paso = max(1, len(nodos_reales) // len(clientes_tienda))
-                            nodos_fallback = []
-                            for i, cliente in enumerate(clientes_tienda):
-                                indice_nodo = (i * paso) % len(nodos_reales)
-                                nodo_id = nodos_reales[indice_nodo]
-                                while nodo_id in nodos_ya_usados:
-                                    indice_nodo = (indice_nodo + 1) % len(nodos_reales)
-                                    nodo_id = nodos_reales[indice_nodo]
-                                nodos_fallback.append(nodo_id)
-                                nodos_ya_usados.add(nodo_id)
-                            return nodos_fallback
-                        return []
-                else:
-                    raise Exception("El grafo no está disponible")
-            
-            # Procesar SAGA primero
-            print(f"\n🏪 Procesando pedidos de SAGA...")
-            nodos_seleccionados_saga = procesar_clientes_tienda(clientes_saga, "SAGA")
-            
-            # Procesar RIPLEY después
-            print(f"\n🏪 Procesando pedidos de RIPLEY...")
-            nodos_seleccionados_ripley = procesar_clientes_tienda(clientes_ripley, "RIPLEY")
-            
-            # Combinar todos los nodos seleccionados (Saga primero, luego Ripley)
-            nodos_seleccionados = nodos_seleccionados_saga + nodos_seleccionados_ripley
+                    return nodos_seleccionados
+                
+                except Exception as e:
+                    logger.exception("⚠️ ERROR [%s]: %s", nombre_tienda, e)
+                    # Fallback: usar nodos distribuidos
+                    if len(nodos_reales) > 0:
+                        paso = max(1, len(nodos_reales) // len(clientes_tienda))
+                        nodos_fallback = []
+                        for i, cliente in enumerate(clientes_tienda):
+                            indice_nodo = siguiente_libre((i * paso) % len(nodos_reales))
+                            if indice_nodo == -1:
+                                raise Exception("No quedan nodos libres en el grafo")
+                            nodo_id = nodos_reales[indice_nodo]
+                            nodo_usado[indice_nodo] = True
+                            nodos_fallback.append(nodo_id)
+                        return nodos_fallback
+                    return []
+            else:
+                raise Exception("El grafo no está disponible")
+        
+        # Procesar SAGA primero
+        logger.debug("🏪 Procesando pedidos de SAGA...")
+        nodos_seleccionados_saga = procesar_clientes_tienda(clientes_saga, "SAGA")
+        
+        # Procesar RIPLEY después
+        logger.debug("🏪 Procesando pedidos de RIPLEY...")
+        nodos_seleccionados_ripley = procesar_clientes_tienda(clientes_ripley, "RIPLEY")
+        
+        # Combinar todos los nodos seleccionados (Saga primero, luego Ripley)
+        nodos_seleccionados = nodos_seleccionados_saga + nodos_seleccionados_ripley
+        
+        logger.info("📊 Resumen: SAGA: %d nodos seleccionados | RIPLEY: %d nodos seleccionados | Total: %d nodos únicos",
+                    len(nodos_seleccionados_saga), len(nodos_seleccionados_ripley), len(nodos_seleccionados))
+        return nodos_seleccionados
+    
+    @staticmethod
+    def _huella_nodos_mock(clientes: List[dict]) -> str:
+        """
+        Huella de todo lo que determina los nodos mock: los nodos del grafo con sus
+        coordenadas UTM y los clientes con sus coordenadas objetivo.
+        
+        Args:
+            clientes: Clientes de SAGA + RIPLEY, en orden
+        
+        Returns:
+            Hash hexadecimal (sha1)
+        """
+        node_ids, utm_x, utm_y, _, _ = grafo_wrapper.ensure_coord_cache()
+        huella = hashlib.sha1(f"{VERSION_NODOS_MOCK}|{len(node_ids)}".encode())
+        for arreglo in (node_ids, utm_x, utm_y):
+            huella.update(np.ascontiguousarray(arreglo).tobytes())
+        huella.update(repr([(c["nombre"], c["tienda"], c["coords"]) for c in clientes]).encode())
+        return huella.hexdigest()
+    
+    def _leer_nodos_mock(self, clientes: List[dict]) -> Optional[List[int]]:
+        """
+        Lee los nodos precalculados de RUTA_NODOS_MOCK.
+        
+        Args:
+            clientes: Clientes de SAGA + RIPLEY, en orden
+        
+        Returns:
+            Nodo de cada cliente, o None si el archivo no existe o no corresponde a este grafo
+        """
+        try:
+            with open(RUTA_NODOS_MOCK, "r", encoding="utf-8") as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError):
+            return None
+        
+        pedidos = datos.get("pedidos", [])
+        if (datos.get("huella") != self._huella_nodos_mock(clientes) or len(pedidos) != len(clientes)
+                or any(p["cliente"] != c["nombre"] for p, c in zip(pedidos, clientes))):
+            logger.info("⚠️ %s no corresponde al grafo actual: se recalculan los nodos mock", RUTA_NODOS_MOCK)
+            return None
+        return [int(p["nodo_destino"]) for p in pedidos]
+    
+    def guardar_nodos_mock(self) -> List[int]:
+        """
+        Calcula los nodos de los clientes mock y los guarda en RUTA_NODOS_MOCK para que
+        los próximos arranques no tengan que buscarlos en el grafo.
+        
+        Returns:
+            Nodo de cada cliente, en el orden de SAGA + RIPLEY
+        """
+        clientes_saga, clientes_ripley = self._clientes_mock()
+        clientes = clientes_saga + clientes_ripley
+        nodos = self._calcular_nodos_mock(clientes_saga, clientes_ripley)
+        datos = {
+            "huella": self._huella_nodos_mock(clientes),
+            "pedidos": [{"cliente": c["nombre"], "tienda": c["tienda"], "nodo_destino": nodo, "coords": list(c["coords"])}
+                        for c, nodo in zip(clientes, nodos)],
+        }
+        os.makedirs(os.path.dirname(RUTA_NODOS_MOCK), exist_ok=True)
+        with open(RUTA_NODOS_MOCK, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo, ensure_ascii=False, indent=2)
+        return nodos
+    
+    def _inicializar_datos_mock(self):
+        """Inicializa el repositorio con datos mock usando coordenadas hardcodeadas"""
+        try:
+            hoy = date.today()
+            clientes_saga, clientes_ripley = self._clientes_mock()
             
             # Combinar todos los clientes (Saga primero, luego Ripley)
             clientes_data = clientes_saga + clientes_ripley
             
-            print(f"\n📊 Resumen:")
-            print(f"   SAGA: {len(nodos_seleccionados_saga)} nodos seleccionados")
-            print(f"   RIPLEY: {len(nodos_seleccionados_ripley)} nodos seleccionados")
-            print(f"   Total: {len(nodos_seleccionados)} nodos únicos")
+            # Nodos ya calculados en data/mock_pedidos.json (scripts/generar_pedidos_mock.py); si el
+            # archivo no existe o se generó con otro grafo u otros clientes, se vuelven a buscar
+            nodos_seleccionados = self._leer_nodos_mock(clientes_data)
+            if nodos_seleccionados is None:
+                nodos_seleccionados = self._calcular_nodos_mock(clientes_saga, clientes_ripley)
             
             # Crear pedidos mock con información de clientes
             pedidos_mock = []
@@ -408,22 +583,26 @@ class PedidoRepository:
             # Crear los pedidos
             for i, pedido_data in enumerate(pedidos_mock):
                 try:
-                    self.create(pedido_data)
+                    self._crear(pedido_data)
                     lat, lon = clientes_data[i]["coords"]
-                    print(f"✅ Pedido creado: {pedido_data.cliente_nombre} - Nodo: {pedido_data.nodo_destino} - Coordenadas fijas: ({lat:.6f}, {lon:.6f})")
+                    logger.debug("✅ Pedido creado: %s - Nodo: %s - Coordenadas fijas: (%.6f, %.6f)",
+                                 pedido_data.cliente_nombre, pedido_data.nodo_destino, lat, lon)
                 except Exception as e:
-                    print(f"❌ ERROR al crear pedido para {pedido_data.cliente_nombre}: {e}")
+                    logger.error("❌ ERROR al crear pedido para %s: %s", pedido_data.cliente_nombre, e)
             
-            print(f"✅ Inicialización completada: {len(pedidos_mock)} pedidos creados exitosamente con coordenadas hardcodeadas")
+            logger.info("✅ Inicialización completada: %d pedidos creados exitosamente con coordenadas hardcodeadas", len(pedidos_mock))
         
         except Exception as e:
-            print(f"❌ ERROR CRÍTICO en _inicializar_datos_mock: {e}")
-            import traceback
-            traceback.print_exc()
-            print("⚠️ Continuando sin datos mock. El servidor funcionará pero sin pedidos iniciales.")
+            logger.exception("❌ ERROR CRÍTICO en _inicializar_datos_mock: %s", e)
+            logger.warning("⚠️ Continuando sin datos mock. El servidor funcionará pero sin pedidos iniciales.")
     
     def create(self, pedido_data: PedidoCreate) -> Pedido:
         """Crea un nuevo pedido"""
+        self._asegurar_datos_mock()
+        return self._crear(pedido_data)
+    
+    def _crear(self, pedido_data: PedidoCreate) -> Pedido:
+        """Crea el pedido sin pasar por la carga de datos mock (la usa esa misma carga)"""
         pedido = Pedido(
             id=self._next_id,
             tienda=pedido_data.tienda,
@@ -434,46 +613,96 @@ class PedidoRepository:
             cliente_telefono=pedido_data.cliente_telefono,
             ruta_optimizada=None
         )
-        self._pedidos[self._next_id] = pedido
+        self._indice_por_id[self._next_id] = len(self._pedidos)
+        self._pedidos.append(pedido)
+        self._por_tienda[pedido.tienda.lower()][self._next_id] = pedido
         self._next_id += 1
         return pedido
     
     def get_by_id(self, pedido_id: int) -> Optional[Pedido]:
         """Obtiene un pedido por su ID"""
-        return self._pedidos.get(pedido_id)
+        self._asegurar_datos_mock()
+        indice = self._indice_por_id.get(pedido_id)
+        return None if indice is None else self._pedidos[indice]
+    
+    def get_by_ids(self, pedido_ids: List[int]) -> List[Optional[Pedido]]:
+        """Obtiene varios pedidos en una sola llamada, en el orden de pedido_ids (None si no existe)"""
+        self._asegurar_datos_mock()
+        indices = [self._indice_por_id.get(pedido_id) for pedido_id in pedido_ids]
+        return [None if indice is None else self._pedidos[indice] for indice in indices]
     
     def get_all(self, tienda: Optional[str] = None) -> List[Pedido]:
         """Obtiene todos los pedidos, opcionalmente filtrados por tienda"""
-        pedidos = list(self._pedidos.values())
+        self._asegurar_datos_mock()
         if tienda:
-            pedidos = [p for p in pedidos if p.tienda.lower() == tienda.lower()]
-        return pedidos
+            # Índice por tienda: una búsqueda en el dict y una copia de sus pedidos, ya ordenados
+            return list(self._por_tienda.get(tienda.lower(), {}).values())
+        return self._pedidos[:]  # Copia de la lista contigua, en orden de creación
     
     def update(self, pedido_id: int, pedido_data: PedidoUpdate) -> Optional[Pedido]:
         """Actualiza un pedido existente"""
-        if pedido_id not in self._pedidos:
+        pedido = self.get_by_id(pedido_id)
+        if pedido is None:
             return None
         
-        pedido = self._pedidos[pedido_id]
-        update_data = pedido_data.dict(exclude_unset=True)
+        # Solo los campos enviados, leídos directamente del modelo (sin armar un dict con model_dump)
+        campos = pedido_data.model_fields_set
         
-        for field, value in update_data.items():
-            setattr(pedido, field, value)
+        if "tienda" in campos and pedido_data.tienda is not None:
+            # Mover el pedido a su nueva tienda en el índice, manteniendo el orden por id
+            self._por_tienda[pedido.tienda.lower()].pop(pedido_id, None)
+            clave = pedido_data.tienda.lower()
+            destino = self._por_tienda[clave]
+            ultimo_id = next(reversed(destino), 0)
+            destino[pedido_id] = pedido
+            if pedido_id < ultimo_id:
+                # Quedó al final pero no es el más reciente: reordenar (cambio de tienda, poco frecuente)
+                self._por_tienda[clave] = dict(sorted(destino.items()))
+        
+        for field in campos:
+            setattr(pedido, field, getattr(pedido_data, field))
         
         return pedido
     
     def delete(self, pedido_id: int) -> bool:
         """Elimina un pedido"""
-        if pedido_id in self._pedidos:
-            del self._pedidos[pedido_id]
-            return True
-        return False
+        self._asegurar_datos_mock()
+        indice = self._indice_por_id.pop(pedido_id, None)
+        if indice is None:
+            return False
+        
+        pedido = self._pedidos.pop(indice)
+        self._por_tienda[pedido.tienda.lower()].pop(pedido_id, None)
+        self._caminos_calculados.pop(pedido_id, None)
+        # Se conserva el orden de creación: los pedidos posteriores retroceden una posición
+        for siguiente in self._pedidos[indice:]:
+            self._indice_por_id[siguiente.id] -= 1
+        return True
     
     def update_ruta_optimizada(self, pedido_id: int, ruta: List[int]) -> Optional[Pedido]:
         """Actualiza la ruta optimizada de un pedido"""
-        if pedido_id not in self._pedidos:
+        pedido = self.get_by_id(pedido_id)
+        if pedido is None:
             return None
         
-        self._pedidos[pedido_id].ruta_optimizada = ruta
-        return self._pedidos[pedido_id]
-
+        pedido.ruta_optimizada = ruta
+        return pedido
+    
+    def get_camino_calculado(self, pedido_id: int, origen: int,
+                             destino: int) -> Optional[Tuple[List[int], float, List[Tuple[float, float]]]]:
+        """
+        Camino ya calculado para el pedido entre origen y destino.
+        
+        Returns:
+            Tupla (ruta, distancia, coordenadas), o None si no se calculó o fue para otros nodos
+        """
+        camino = self._caminos_calculados.get(pedido_id)
+        if camino is None or camino[:2] != (origen, destino):
+            return None
+        return camino[2:]
+    
+    def update_camino_calculado(self, pedido_id: int, origen: int, destino: int, ruta: List[int],
+                                distancia: float, coordenadas: List[Tuple[float, float]]) -> None:
+        """Guarda el camino calculado entre origen y destino para no recalcularlo en cada consulta"""
+        if pedido_id in self._indice_por_id:
+            self._caminos_calculados[pedido_id] = (origen, destino, ruta, distancia, coordenadas)
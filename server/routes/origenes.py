@@ -1,53 +1,53 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-from typing import Dict, List
-import sys
-import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from typing import Dict, List, Optional
+import heapq
+import logging
+import numpy as np
 from models.grafo_wrapper import grafo_wrapper
+from services.ruta_service import distancia_haversine_vec
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Construida con model_construct a partir de datos propios del grafo (sin validación)
 class OrigenResponse(BaseModel):
     nodo_id: int
     nombre: str
     latitud: float
     longitud: float
 
-def convertir_utm_a_latlon(utm_x: float, utm_y: float):
-    """Convierte coordenadas UTM a lat/lon"""
-    try:
-        from pyproj import Transformer
-        transformer = Transformer.from_crs("EPSG:32718", "EPSG:4326", always_xy=True)
-        lon, lat = transformer.transform(utm_x, utm_y)
-        return lat, lon
-    except ImportError:
-        lat = -12.0464 + (utm_y - 8650000) / 111000
-        lon = -77.0428 + (utm_x - 300000) / (111000 * 0.6)
-        return lat, lon
-    except Exception as e:
-        print(f"Error en conversión UTM: {e}")
-        return -12.0464, -77.0428
+_origenes: Optional[Dict[str, OrigenResponse]] = None  # Se calculan en la primera consulta
 
 @router.get("/", response_model=Dict[str, OrigenResponse])
-def obtener_origenes():
+async def obtener_origenes():
     """
     Obtiene los puntos de origen para Saga y Ripley.
     Estos son nodos hardcodeados pero reales del grafo de Lima.
     """
-    grafo = grafo_wrapper.graph
-    nodos_disponibles = list(grafo.Vertices)
+    # Los orígenes solo dependen del grafo, que no cambia mientras corre el servidor: se calculan
+    # una vez, no en cada request. Ya calculados la respuesta es inmediata, así que se atiende
+    # en el event loop sin pasar por el threadpool
+    global _origenes
+    if _origenes is None:
+        _origenes = _calcular_origenes()
+    return dict(_origenes)
+
+def _calcular_origenes() -> Dict[str, OrigenResponse]:
+    """Calcula los orígenes de Saga y Ripley a partir del grafo"""
+    nodos_disponibles = grafo_wrapper.vertices_tuple
     
     if len(nodos_disponibles) == 0:
         # Fallback si no hay nodos
         return {
-            "Saga": OrigenResponse(
+            "Saga": OrigenResponse.model_construct(
                 nodo_id=0,
                 nombre="Saga Falabella - Centro de Lima",
                 latitud=-12.0464,
                 longitud=-77.0428
             ),
-            "Ripley": OrigenResponse(
+            "Ripley": OrigenResponse.model_construct(
                 nodo_id=1,
                 nombre="Ripley - Jockey Plaza",
                 latitud=-12.0833,
@@ -60,67 +60,57 @@ def obtener_origenes():
     lima_centro_lat = -12.0464
     lima_centro_lon = -77.0428
     
-    def obtener_nodos_por_zona(lat_centro: float, lon_centro: float, radio_km: float = 3.0) -> List[int]:
-        """Obtiene nodos cerca del centro de Lima"""
-        from services.ruta_service import convertir_utm_a_latlon
-        import math
+    def obtener_nodos_por_zona(lat_centro: float, lon_centro: float, radio_km: float = 3.0,
+                               cantidad: Optional[int] = None) -> List[int]:
+        """Obtiene nodos cerca del centro de Lima (solo los `cantidad` más cercanos si se indica)"""
+        # Coordenadas ya convertidas de UTM (caché de grafo_wrapper) de los nodos que el
+        # KD-tree deja como candidatos dentro del radio
+        node_ids, _, _, lats, lons = grafo_wrapper.ensure_coord_cache()
+        filas = grafo_wrapper.filas_en_radio(lat_centro, lon_centro, radio_km)
+        ids = node_ids[filas]
         
-        nodos_en_zona = []
-        for nodo_id in nodos_disponibles:
-            coords_utm = grafo.get_node_coords(nodo_id)
-            if coords_utm and coords_utm != (0, 0):
-                lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-                
-                # Calcular distancia usando Haversine
-                R = 6371  # Radio de la Tierra en km
-                lat1, lon1 = math.radians(lat_centro), math.radians(lon_centro)
-                lat2, lon2 = math.radians(lat), math.radians(lon)
-                
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                
-                a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-                c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                distancia = R * c
-                
-                if distancia <= radio_km:
-                    nodos_en_zona.append((nodo_id, distancia, lat, lon))
+        # Distancia Haversine exacta de los candidatos al centro en una sola pasada de NumPy
+        distancias = distancia_haversine_vec(lat_centro, lon_centro, lats[filas], lons[filas])
+        en_zona = np.flatnonzero(distancias <= radio_km)
         
-        # Ordenar por distancia al centro
-        nodos_en_zona.sort(key=lambda x: x[1])
-        return [nodo[0] for nodo in nodos_en_zona]
+        if cantidad is not None:
+            # Solo los k más cercanos con un heap de tamaño k, sin ordenar toda la zona; el
+            # desempate por posición da el mismo orden que el sort estable
+            return [int(ids[i]) for _, i in heapq.nsmallest(cantidad, zip(distancias[en_zona].tolist(), en_zona.tolist()))]
+        
+        # Ordenar por distancia al centro (estable: a igual distancia se respeta el orden de Vertices)
+        en_zona = en_zona[np.argsort(distancias[en_zona], kind='stable')]
+        return ids[en_zona].tolist()
     
-    # Obtener nodos en Lima central (dentro de 3 km del centro)
-    nodos_lima_central = obtener_nodos_por_zona(lima_centro_lat, lima_centro_lon, radio_km=3.0)
+    # Obtener los 2 nodos más cercanos al centro de Lima (dentro de 3 km), los únicos que se usan
+    nodos_lima_central = obtener_nodos_por_zona(lima_centro_lat, lima_centro_lon, radio_km=3.0, cantidad=2)
     
     if len(nodos_lima_central) >= 2:
         # Saga: primer nodo más cercano al centro
         # Ripley: segundo nodo más cercano al centro (separados pero ambos en el centro)
         nodo_saga = nodos_lima_central[0]
         nodo_ripley = nodos_lima_central[1] if len(nodos_lima_central) > 1 else nodos_lima_central[0]
-        print(f"Saga y Ripley en Lima central - Nodos: {nodo_saga}, {nodo_ripley}")
+        logger.info("Saga y Ripley en Lima central - Nodos: %s, %s", nodo_saga, nodo_ripley)
     else:
         # Fallback: usar nodos ordenados
         nodos_ordenados = sorted(nodos_disponibles)
         nodo_saga = nodos_ordenados[0] if nodos_ordenados else 0
         nodo_ripley = nodos_ordenados[1] if len(nodos_ordenados) > 1 else nodo_saga
-        print(f"Fallback: usando primeros nodos ordenados")
-    
-    # Obtener coordenadas
-    coords_saga_utm = grafo.get_node_coords(nodo_saga)
-    coords_ripley_utm = grafo.get_node_coords(nodo_ripley)
+        logger.warning("Fallback: usando primeros nodos ordenados")
     
-    lat_saga, lon_saga = convertir_utm_a_latlon(coords_saga_utm[0], coords_saga_utm[1]) if coords_saga_utm != (0, 0) else (-12.0464, -77.0428)
-    lat_ripley, lon_ripley = convertir_utm_a_latlon(coords_ripley_utm[0], coords_ripley_utm[1]) if coords_ripley_utm != (0, 0) else (-12.0833, -76.9667)
+    # Obtener coordenadas (ya convertidas en grafo_wrapper; sin posición, las de la tienda)
+    latlon_por_nodo = grafo_wrapper.latlon_por_nodo
+    lat_saga, lon_saga = latlon_por_nodo.get(nodo_saga, (-12.0464, -77.0428))
+    lat_ripley, lon_ripley = latlon_por_nodo.get(nodo_ripley, (-12.0833, -76.9667))
     
     return {
-        "Saga": OrigenResponse(
+        "Saga": OrigenResponse.model_construct(
             nodo_id=nodo_saga,
             nombre="Saga Falabella - Centro de Lima",
             latitud=lat_saga,
             longitud=lon_saga
         ),
-        "Ripley": OrigenResponse(
+        "Ripley": OrigenResponse.model_construct(
             nodo_id=nodo_ripley,
             nombre="Ripley - Jockey Plaza",
             latitud=lat_ripley,
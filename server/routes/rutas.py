@@ -1,40 +1,106 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Tuple
-import sys
-import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Tuple
+from importlib.util import find_spec
+import logging
+import numpy as np
+from algorithms.tsp import solve_tsp
 from services.ruta_service import RutaService
+from services.osrm_service import OSRMService
 from repository.pedido_repository import PedidoRepository
 
+# ORJSONResponse necesita orjson instalado; basta con saber si está, sin importarlo aquí
+ORJSON_DISPONIBLE = find_spec("orjson") is not None
+if ORJSON_DISPONIBLE:
+    from fastapi.responses import ORJSONResponse as RespuestaJSON
+else:
+    from fastapi.responses import JSONResponse as RespuestaJSON
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 ruta_service = RutaService()
 pedido_repository = PedidoRepository()
 
 class CalcularRutaRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     pedido_id: int
     algoritmo: str = "dijkstra"  # "dijkstra" o "floyd_warshall"
-    
-    class Config:
-        from_attributes = True
 
 class CalcularRutaMultipleRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     pedido_ids: List[int]
     nodo_origen: int  # Nodo de origen (Saga o Ripley)
     algoritmo: str = "dijkstra"  # "dijkstra" o "floyd_warshall"
-    
-    class Config:
-        from_attributes = True
 
+# Esquema de la respuesta (documentación de la API). Las rutas no lo instancian: arman el
+# JSON con _respuesta_ruta, porque con response_model FastAPI vuelve a validar cada punto
 class RutaResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     pedido_id: int
     ruta: List[int]
     distancia_total: float
     coordenadas: List[List[float]]  # Coordenadas de los nodos principales (para compatibilidad)
     segmentos: List[List[List[float]]] = []  # Segmentos del camino real en el grafo
 
-@router.post("/calcular", response_model=RutaResponse)
-def calcular_ruta(request: CalcularRutaRequest):
+def _respuesta_ruta(pedido_id: int, ruta: List[int], distancia_total: float,
+                   coordenadas: list, segmentos: list) -> RespuestaJSON:
+    """
+    Respuesta con la forma de RutaResponse armada directamente: los datos vienen del propio
+    servicio, así que no pasan por Pydantic (que validaría y copiaría cada float de las miles
+    de coordenadas). orjson escribe las listas y arreglos de NumPy como listas JSON en C.
+    
+    Args:
+        pedido_id: ID del pedido
+        ruta: Nodos de la ruta
+        distancia_total: Distancia total de la ruta
+        coordenadas: Coordenadas [lat, lon] de la ruta
+        segmentos: Segmentos del camino, cada uno una lista de coordenadas
+    
+    Returns:
+        Respuesta JSON lista para enviar
+    """
+    return RespuestaJSON({
+        "pedido_id": pedido_id,
+        "ruta": ruta,
+        "distancia_total": float(distancia_total),
+        "coordenadas": coordenadas,
+        "segmentos": segmentos
+    })
+
+def _segmentos_y_coordenadas(coords_segmento: list, origen: int, destino: int,
+                             ruta_optimizada: List[int]) -> Tuple[list, list]:
+    """
+    Segmentos y coordenadas de la respuesta de una ruta punto A a punto B.
+    
+    Args:
+        coords_segmento: Coordenadas [lat, lon] del camino en el grafo (vacía si no hay camino)
+        origen: Nodo de origen
+        destino: Nodo de destino
+        ruta_optimizada: Nodos de la ruta, para las coordenadas si no hay camino
+    
+    Returns:
+        Tupla (segmentos, coordenadas). Con camino, ambos usan la misma lista coords_segmento
+        (ya incluye todos los nodos intermedios) sin copiarla
+    """
+    if coords_segmento:
+        return [coords_segmento], coords_segmento
+    
+    # Fallback: línea recta si no hay camino en el grafo (coordenadas ya convertidas por nodo)
+    latlon_por_nodo = ruta_service.grafo.latlon_por_nodo
+    segmentos = []
+    if origen in latlon_por_nodo and destino in latlon_por_nodo:
+        segmentos.append([list(latlon_por_nodo[origen]), list(latlon_por_nodo[destino])])
+    coordenadas = [list(latlon_por_nodo[nodo_id]) for nodo_id in ruta_optimizada if nodo_id in latlon_por_nodo]
+    return segmentos, coordenadas
+
+@router.post("/calcular", response_model=RutaResponse,
+             dependencies=[Depends(pedido_repository.esperar_datos_mock)])
+async def calcular_ruta(request: CalcularRutaRequest, background: BackgroundTasks):
     """Calcula la ruta optimizada para un pedido (punto A a punto B)"""
     pedido = pedido_repository.get_by_id(request.pedido_id)
     if not pedido:
@@ -48,61 +114,32 @@ def calcular_ruta(request: CalcularRutaRequest):
     destino = pedido.nodos[1]
     ruta_optimizada = [origen, destino]
     
-    print(f"Calculando ruta de punto A a punto B: {origen} -> {destino} usando {request.algoritmo.upper()}")
+    logger.debug("Calculando ruta de punto A a punto B: %s -> %s usando %s", origen, destino, request.algoritmo.upper())
     
-    # Calcular camino mínimo entre origen y destino
-    from services.ruta_service import convertir_utm_a_latlon
-    ruta_camino, distancia_total, coords_segmento = ruta_service.calcular_ruta_entre_nodos(origen, destino, request.algoritmo)
+    # Calcular camino mínimo entre origen y destino (en el threadpool: no bloquea el event loop)
+    ruta_camino, distancia_total, coords_segmento = await run_in_threadpool(
+        ruta_service.calcular_ruta_entre_nodos, origen, destino, request.algoritmo)
     
     # Si se encontró un camino con nodos intermedios, usar esa ruta completa
     if ruta_camino and len(ruta_camino) > 2:
         ruta_optimizada = ruta_camino
-        print(f"Ruta encontrada con {len(ruta_camino)} nodos intermedios")
+        logger.debug("Ruta encontrada con %d nodos intermedios", len(ruta_camino))
     
-    # Construir segmentos (solo uno entre origen y destino)
-    segmentos = []
-    if coords_segmento and len(coords_segmento) > 0:
-        segmentos.append(coords_segmento)
-        print(f"Segmento calculado con {len(coords_segmento)} puntos")
+    # Segmento y coordenadas de TODOS los nodos de la ruta (una sola lista compartida)
+    segmentos, coordenadas = _segmentos_y_coordenadas(coords_segmento, origen, destino, ruta_optimizada)
+    if coords_segmento:
+        logger.debug("Segmento calculado con %d puntos", len(coords_segmento))
     else:
-        # Fallback: línea recta si no hay camino en el grafo
-        coords_origen_utm = ruta_service.grafo.graph.get_node_coords(origen)
-        coords_destino_utm = ruta_service.grafo.graph.get_node_coords(destino)
-        
-        if coords_origen_utm and coords_origen_utm != (0, 0) and coords_destino_utm and coords_destino_utm != (0, 0):
-            lat_origen, lon_origen = convertir_utm_a_latlon(coords_origen_utm[0], coords_origen_utm[1])
-            lat_destino, lon_destino = convertir_utm_a_latlon(coords_destino_utm[0], coords_destino_utm[1])
-            segmentos.append([(lat_origen, lon_origen), (lat_destino, lon_destino)])
-            print("Usando línea recta como fallback")
-    
-    # Obtener coordenadas de TODOS los nodos de la ruta (incluyendo intermedios)
-    coordenadas = []
-    if coords_segmento and len(coords_segmento) > 0:
-        # Usar las coordenadas del segmento que ya incluyen todos los nodos intermedios
-        coordenadas = [[lat, lon] for lat, lon in coords_segmento]
-        print(f"Coordenadas obtenidas del segmento: {len(coordenadas)} puntos")
-    else:
-        # Fallback: obtener coordenadas de todos los nodos de la ruta optimizada
-        for nodo_id in ruta_optimizada:
-            coords_utm = ruta_service.grafo.graph.get_node_coords(nodo_id)
-            if coords_utm and coords_utm != (0, 0):
-                lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-                coordenadas.append([lat, lon])
-        print(f"Coordenadas obtenidas de ruta optimizada: {len(coordenadas)} puntos")
-    
-    # Actualizar el pedido con la ruta optimizada
-    pedido_repository.update_ruta_optimizada(request.pedido_id, ruta_optimizada)
-    
-    return RutaResponse(
-        pedido_id=request.pedido_id,
-        ruta=ruta_optimizada,
-        distancia_total=distancia_total,
-        coordenadas=coordenadas,
-        segmentos=[[[lat, lon] for lat, lon in segmento] for segmento in segmentos]
-    )
+        logger.debug("Usando línea recta como fallback; coordenadas de ruta optimizada: %d puntos", len(coordenadas))
+    
+    # Actualizar el pedido con la ruta optimizada después de enviar la respuesta
+    background.add_task(pedido_repository.update_ruta_optimizada, request.pedido_id, ruta_optimizada)
+    
+    return _respuesta_ruta(request.pedido_id, ruta_optimizada, distancia_total, coordenadas, segmentos)
 
-@router.get("/pedido/{pedido_id}", response_model=RutaResponse)
-def obtener_ruta_pedido(pedido_id: int):
+@router.get("/pedido/{pedido_id}", response_model=RutaResponse,
+            dependencies=[Depends(pedido_repository.esperar_datos_mock)])
+async def obtener_ruta_pedido(pedido_id: int, background: BackgroundTasks):
     """Obtiene la ruta de un pedido (calcula si no existe) - punto A a punto B"""
     pedido = pedido_repository.get_by_id(pedido_id)
     if not pedido:
@@ -123,55 +160,54 @@ def obtener_ruta_pedido(pedido_id: int):
     else:
         ruta_optimizada = [origen, destino]
     
-    # Calcular camino mínimo entre origen y destino
-    from services.ruta_service import convertir_utm_a_latlon
-    ruta_camino, distancia_total, coords_segmento = ruta_service.calcular_ruta_entre_nodos(origen, destino)
+    # Calcular camino mínimo entre origen y destino, salvo que ya se haya calculado para estos nodos
+    camino = pedido_repository.get_camino_calculado(pedido_id, origen, destino)
+    if camino is not None:
+        ruta_camino, distancia_total, coords_segmento = camino
+    else:
+        ruta_camino, distancia_total, coords_segmento = await run_in_threadpool(
+            ruta_service.calcular_ruta_entre_nodos, origen, destino)
+        pedido_repository.update_camino_calculado(pedido_id, origen, destino, ruta_camino, distancia_total, coords_segmento)
     
     # Si se encontró un camino con nodos intermedios, usar esa ruta completa
     if ruta_camino and len(ruta_camino) > 2:
         ruta_optimizada = ruta_camino
     
-    # Construir segmentos (solo uno entre origen y destino)
-    segmentos = []
-    if coords_segmento and len(coords_segmento) > 0:
-        segmentos.append(coords_segmento)
-    else:
-        # Fallback: línea recta si no hay camino en el grafo
-        coords_origen_utm = ruta_service.grafo.graph.get_node_coords(origen)
-        coords_destino_utm = ruta_service.grafo.graph.get_node_coords(destino)
-        
-        if coords_origen_utm and coords_origen_utm != (0, 0) and coords_destino_utm and coords_destino_utm != (0, 0):
-            lat_origen, lon_origen = convertir_utm_a_latlon(coords_origen_utm[0], coords_origen_utm[1])
-            lat_destino, lon_destino = convertir_utm_a_latlon(coords_destino_utm[0], coords_destino_utm[1])
-            segmentos.append([(lat_origen, lon_origen), (lat_destino, lon_destino)])
-    
-    # Obtener coordenadas de TODOS los nodos de la ruta (incluyendo intermedios)
-    coordenadas = []
-    if coords_segmento and len(coords_segmento) > 0:
-        # Usar las coordenadas del segmento que ya incluyen todos los nodos intermedios
-        coordenadas = [[lat, lon] for lat, lon in coords_segmento]
-    else:
-        # Fallback: obtener coordenadas de todos los nodos de la ruta optimizada
-        for nodo_id in ruta_optimizada:
-            coords_utm = ruta_service.grafo.graph.get_node_coords(nodo_id)
-            if coords_utm and coords_utm != (0, 0):
-                lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-                coordenadas.append([lat, lon])
-    
-    # Actualizar el pedido con la ruta optimizada si no tenía una
+    # Segmento y coordenadas de TODOS los nodos de la ruta (una sola lista compartida)
+    segmentos, coordenadas = _segmentos_y_coordenadas(coords_segmento, origen, destino, ruta_optimizada)
+    
+    # Actualizar el pedido con la ruta optimizada si no tenía una (después de enviar la respuesta)
     if not pedido.ruta_optimizada:
-        pedido_repository.update_ruta_optimizada(pedido_id, ruta_optimizada)
-    
-    return RutaResponse(
-        pedido_id=pedido_id,
-        ruta=ruta_optimizada,
-        distancia_total=distancia_total,
-        coordenadas=coordenadas,
-        segmentos=[[[lat, lon] for lat, lon in segmento] for segmento in segmentos]
-    )
+        background.add_task(pedido_repository.update_ruta_optimizada, pedido_id, ruta_optimizada)
+    
+    return _respuesta_ruta(pedido_id, ruta_optimizada, distancia_total, coordenadas, segmentos)
 
-@router.post("/calcular-multiple", response_model=RutaResponse)
-def calcular_ruta_multiple(request: CalcularRutaMultipleRequest):
+def _ordenar_con_matriz_osrm(nodos: List[int], coords_por_nodo: dict) -> Optional[List[int]]:
+    """
+    Orden de visita (TSP) según las distancias por calle de OSRM entre todos los puntos,
+    obtenidas con una sola consulta de matriz.
+    
+    Args:
+        nodos: Nodos a visitar; el primero y el último son el origen fijo
+        coords_por_nodo: Diccionario nodo_id -> (lat, lon) de todos los nodos
+    
+    Returns:
+        Ruta ordenada que comienza y termina en el origen, o None si OSRM no respondió
+    """
+    nodos_unicos = list(dict.fromkeys(nodos))
+    matriz = OSRMService.calcular_matriz([coords_por_nodo[nodo_id] for nodo_id in nodos_unicos])
+    if matriz is None:
+        return None
+    
+    nodo_to_idx = {nodo_id: idx for idx, nodo_id in enumerate(nodos_unicos)}
+    # Las calles de un solo sentido hacen que la matriz de OSRM no sea simétrica
+    ruta, _ = solve_tsp(matriz, nodos[:-1], nodo_to_idx, dict(enumerate(nodos_unicos)),
+                        origen_fijo=nodos[0], simetrica=False)
+    return ruta
+
+@router.post("/calcular-multiple", response_model=RutaResponse,
+             dependencies=[Depends(pedido_repository.esperar_datos_mock)])
+async def calcular_ruta_multiple(request: CalcularRutaMultipleRequest):
     """
     Calcula la ruta optimizada para múltiples pedidos usando OSRM (rutas reales que siguen calles).
     La ruta comienza en el origen, visita todos los destinos seleccionados (TSP),
@@ -180,54 +216,62 @@ def calcular_ruta_multiple(request: CalcularRutaMultipleRequest):
     if not request.pedido_ids or len(request.pedido_ids) == 0:
         raise HTTPException(status_code=400, detail="Debe seleccionar al menos un pedido")
     
-    # Importar servicios
-    from services.ruta_service import convertir_utm_a_latlon
-    from services.osrm_service import OSRMService
-    
-    # Obtener todos los pedidos
-    pedidos = []
-    nodos_destino = []
-    for pedido_id in request.pedido_ids:
-        pedido = pedido_repository.get_by_id(pedido_id)
-        if not pedido:
-            raise HTTPException(status_code=404, detail=f"Pedido {pedido_id} no encontrado")
-        pedidos.append(pedido)
-        nodos_destino.append(pedido.nodo_destino)
-    
-    print(f"Calculando ruta múltiple desde nodo {request.nodo_origen} para {len(nodos_destino)} destinos")
-    
-    # Paso 1: Obtener coordenadas de todos los nodos (origen + destinos)
-    def obtener_coordenadas_nodo(nodo_id: int) -> tuple:
-        """Obtiene coordenadas (lat, lon) de un nodo"""
-        coords_utm = ruta_service.grafo.graph.get_node_coords(nodo_id)
-        if coords_utm and coords_utm != (0, 0):
-            lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-            return (lat, lon)
-        return None
+    # Obtener todos los pedidos con una sola consulta al repositorio (sin ids repetidos,
+    # conservando el orden en que llegaron)
+    pedido_ids = list(dict.fromkeys(request.pedido_ids))
+    pedidos = pedido_repository.get_by_ids(pedido_ids)
+    
+    # Validar en una sola pasada y reportar todos los ids inexistentes a la vez
+    faltantes = [pedido_id for pedido_id, pedido in zip(pedido_ids, pedidos) if pedido is None]
+    if len(faltantes) == 1:
+        raise HTTPException(status_code=404, detail=f"Pedido {faltantes[0]} no encontrado")
+    if faltantes:
+        raise HTTPException(status_code=404, detail=f"Pedidos no encontrados: {', '.join(map(str, faltantes))}")
+    nodos_destino = [pedido.nodo_destino for pedido in pedidos]
+    
+    logger.debug("Calculando ruta múltiple desde nodo %s para %d destinos", request.nodo_origen, len(nodos_destino))
+    
+    # Paso 1: Obtener coordenadas (lat, lon) de todos los nodos (origen + destinos), ya
+    # convertidas en grafo_wrapper; los nodos sin posición no están en el diccionario
+    latlon_por_nodo = ruta_service.grafo.latlon_por_nodo
     
     # Obtener coordenadas del origen
-    origen_coords = obtener_coordenadas_nodo(request.nodo_origen)
+    origen_coords = latlon_por_nodo.get(request.nodo_origen)
     if not origen_coords:
         raise HTTPException(status_code=400, detail=f"No se pudieron obtener coordenadas del nodo origen {request.nodo_origen}")
     
     # Obtener coordenadas de los destinos
     destinos_coords = []
     for nodo_id in nodos_destino:
-        coords = obtener_coordenadas_nodo(nodo_id)
+        coords = latlon_por_nodo.get(nodo_id)
         if coords:
             destinos_coords.append((nodo_id, coords))
         else:
-            print(f"Advertencia: No se pudieron obtener coordenadas del nodo {nodo_id}")
+            logger.warning("Advertencia: No se pudieron obtener coordenadas del nodo %s", nodo_id)
     
     if len(destinos_coords) == 0:
         raise HTTPException(status_code=400, detail="No se pudieron obtener coordenadas de los destinos")
     
-    # Paso 2: Optimizar orden usando TSP (solo para el orden, no las rutas)
-    # Usar TSP del backend para obtener el orden optimizado
+    # Paso 2: Crear diccionario de coordenadas por nodo_id
+    coords_por_nodo = {request.nodo_origen: origen_coords}
+    for nodo_id, coords in destinos_coords:
+        coords_por_nodo[nodo_id] = coords
+    
+    # Paso 3: Optimizar orden usando TSP (solo para el orden, no las rutas)
     nodos_para_tsp = [nodo_id for nodo_id, _ in destinos_coords]
     nodos_completos_tsp = [request.nodo_origen] + nodos_para_tsp + [request.nodo_origen]
     
-    ruta_optimizada_nodos, _, _ = ruta_service.calcular_ruta_completa_con_segmentos(nodos_completos_tsp)
+    if len(nodos_para_tsp) <= 1:
+        # Un solo destino: el orden es fijo, no hace falta la matriz de OSRM ni el TSP
+        logger.debug("Ruta múltiple con un destino: se omite el TSP")
+        ruta_optimizada_nodos = nodos_completos_tsp
+    else:
+        # Con las distancias por calle de OSRM, las mismas que usa la ruta final
+        ruta_optimizada_nodos = await run_in_threadpool(_ordenar_con_matriz_osrm, nodos_completos_tsp, coords_por_nodo)
+        if ruta_optimizada_nodos is None:
+            # OSRM no respondió: ordenar con las distancias de camino mínimo del grafo
+            ruta_optimizada_nodos, _ = await run_in_threadpool(ruta_service.ordenar_ruta_tsp, nodos_completos_tsp)
+        logger.debug("Ruta múltiple con %d destinos: orden calculado con TSP", len(nodos_para_tsp))
     
     # Si TSP falló, usar orden directo
     if not ruta_optimizada_nodos or len(ruta_optimizada_nodos) < 3:
@@ -239,83 +283,38 @@ def calcular_ruta_multiple(request: CalcularRutaMultipleRequest):
     if ruta_optimizada_nodos[-1] != request.nodo_origen:
         ruta_optimizada_nodos.append(request.nodo_origen)
     
-    # Paso 3: Crear diccionario de coordenadas por nodo_id
-    coords_por_nodo = {request.nodo_origen: origen_coords}
-    for nodo_id, coords in destinos_coords:
-        coords_por_nodo[nodo_id] = coords
-    
     # Paso 4: Calcular rutas reales usando OSRM entre cada par consecutivo
     puntos_ordenados = [coords_por_nodo[nodo_id] for nodo_id in ruta_optimizada_nodos if nodo_id in coords_por_nodo]
     
-    print(f"Calculando rutas reales con OSRM para {len(puntos_ordenados)} puntos")
-    print(f"Puntos ordenados: {puntos_ordenados[:3]}... (mostrando primeros 3)")
+    # %-formato diferido: los puntos solo se convierten a texto si DEBUG está activo
+    logger.debug("Calculando rutas reales con OSRM para %d puntos (primeros 3: %s)",
+                 len(puntos_ordenados), puntos_ordenados[:3])
     
-    # Calcular ruta completa usando OSRM segmento por segmento para mayor precisión
-    todas_coordenadas: List[Tuple[float, float]] = []
+    # Una sola petición a OSRM con todos los puntos: la respuesta ya trae la ruta completa.
+    # Si OSRM la rechaza, calcular_ruta_multiple pide los tramos por separado (en paralelo)
+    # y usa línea recta en los que no se puedan resolver
+    todas_coordenadas = np.empty((0, 2))
     distancia_total_km = 0.0
     
-    for i in range(len(puntos_ordenados) - 1):
-        origen_punto = puntos_ordenados[i]
-        destino_punto = puntos_ordenados[i + 1]
-        
-        print(f"Calculando segmento {i+1}/{len(puntos_ordenados)-1}: {origen_punto} -> {destino_punto}")
-        
-        resultado_segmento = OSRMService.calcular_ruta_entre_puntos(
-            origen_punto,
-            destino_punto,
-            pasos_intermedios=True
-        )
-        
-        if resultado_segmento:
-            coordenadas_segmento, distancia_segmento = resultado_segmento
-            print(f"  Segmento calculado: {len(coordenadas_segmento)} puntos, {distancia_segmento:.2f} km")
-            
-            # Evitar duplicar el último punto
-            if todas_coordenadas and coordenadas_segmento:
-                if todas_coordenadas[-1] == coordenadas_segmento[0]:
-                    todas_coordenadas.extend(coordenadas_segmento[1:])
-                else:
-                    todas_coordenadas.extend(coordenadas_segmento)
-            else:
-                todas_coordenadas.extend(coordenadas_segmento)
-            
-            distancia_total_km += distancia_segmento
-        else:
-            # Fallback: línea recta
-            print(f"  OSRM falló para este segmento, usando línea recta")
-            todas_coordenadas.append(origen_punto)
-            todas_coordenadas.append(destino_punto)
-            distancia_total_km += OSRMService._distancia_haversine(origen_punto, destino_punto)
-    
-    print(f"Ruta completa: {len(todas_coordenadas)} puntos, {distancia_total_km:.2f} km total")
-    
-    if todas_coordenadas and len(todas_coordenadas) > 1:
-        # Convertir a formato de respuesta
-        coordenadas = [[lat, lon] for lat, lon in todas_coordenadas]
-        # Crear un segmento único con todas las coordenadas
-        segmentos = [coordenadas] if coordenadas else []
-        
-        return RutaResponse(
-            pedido_id=request.pedido_ids[0] if request.pedido_ids else 0,
-            ruta=ruta_optimizada_nodos,
-            distancia_total=distancia_total_km,
-            coordenadas=coordenadas,
-            segmentos=segmentos
-        )
+    resultado_osrm = await run_in_threadpool(OSRMService.calcular_ruta_multiple, puntos_ordenados)
+    if resultado_osrm:
+        todas_coordenadas, distancia_total_km = resultado_osrm
+    
+    logger.debug("Ruta completa: %d puntos, %.2f km total", len(todas_coordenadas), distancia_total_km)
+    
+    if len(todas_coordenadas) > 1:
+        # Un segmento único con todas las coordenadas. orjson escribe el arreglo de NumPy
+        # directamente; json de la biblioteca estándar necesita listas
+        if not ORJSON_DISPONIBLE:
+            todas_coordenadas = todas_coordenadas.tolist()
+        return _respuesta_ruta(request.pedido_ids[0] if request.pedido_ids else 0, ruta_optimizada_nodos,
+                               distancia_total_km, todas_coordenadas, [todas_coordenadas])
     else:
         # Fallback: usar línea recta si OSRM falla
-        print("OSRM falló, usando línea recta como fallback")
+        logger.warning("OSRM falló, usando línea recta como fallback")
         coordenadas = [[lat, lon] for lat, lon in puntos_ordenados]
-        distancia_total = sum(
-            OSRMService._distancia_haversine(puntos_ordenados[i], puntos_ordenados[i+1])
-            for i in range(len(puntos_ordenados) - 1)
-        )
+        distancia_total = float(OSRMService._distancias_haversine_tramos(puntos_ordenados).sum())
         
-        return RutaResponse(
-            pedido_id=request.pedido_ids[0] if request.pedido_ids else 0,
-            ruta=ruta_optimizada_nodos,
-            distancia_total=distancia_total,
-            coordenadas=coordenadas,
-            segmentos=[[coords] for coords in coordenadas]
-        )
+        return _respuesta_ruta(request.pedido_ids[0] if request.pedido_ids else 0, ruta_optimizada_nodos,
+                               distancia_total, coordenadas, [[coords] for coords in coordenadas])
 
@@ -2,9 +2,28 @@
 """
 Script para ejecutar el servidor FastAPI
 Revisión
+
+Con ENV=prod se ejecuta sin recarga automática, con uvloop y httptools si están
+instalados y con WORKERS procesos (por defecto 1)
 """
+import os
+from importlib.util import find_spec
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
-
+    if os.getenv("ENV") == "prod":
+        # Cada proceso tiene su propio repositorio de pedidos en memoria: con más de un
+        # worker los pedidos creados en uno no se ven en los demás, por eso es opcional
+        workers = int(os.getenv("WORKERS", "1"))
+        uvicorn.run(
+            "app:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=workers,
+            # uvloop no existe en Windows: sin él se usa el event loop estándar de asyncio
+            loop="uvloop" if find_spec("uvloop") else "asyncio",
+            http="httptools" if find_spec("httptools") else "h11",
+            reload=False
+        )
+    else:
+        uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Script para precalcular los nodos de los pedidos mock
+Ejecutar desde server/ después de cambiar el grafo o los clientes mock:
+python scripts/generar_pedidos_mock.py
+"""
+import sys
+import os
+
+# Mismos imports de nivel superior que usa app.py (routes, models, repository...)
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+from repository.pedido_repository import PedidoRepository, RUTA_NODOS_MOCK
+
+if __name__ == "__main__":
+    nodos = PedidoRepository().guardar_nodos_mock()
+    print(f"✅ {len(nodos)} nodos guardados en {RUTA_NODOS_MOCK}: {nodos}")
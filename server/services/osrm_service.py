@@ -3,8 +3,69 @@ Servicio para calcular rutas reales usando OSRM (Open Source Routing Machine)
 OSRM usa datos de OpenStreetMap y calcula rutas que siguen las calles reales
 """
 from typing import List, Tuple, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import math
+import logging
+
+try:
+    import orjson
+    
+    def _leer_json(contenido: bytes):
+        return orjson.loads(contenido)
+except ImportError:
+    import json
+    
+    def _leer_json(contenido: bytes):
+        return json.loads(contenido)
+
+logger = logging.getLogger(__name__)
+
+def _decodificar_polyline(texto: str, precision: int = 6) -> np.ndarray:
+    """
+    Decodifica una geometría en formato polyline (el de Google, con 6 decimales en OSRM)
+    a un arreglo de puntos (lat, lon), procesando todos los caracteres a la vez con NumPy.
+    
+    Args:
+        texto: Polyline codificada
+        precision: Decimales con que se codificaron las coordenadas
+    
+    Returns:
+        Arreglo (n x 2) de float64 con las coordenadas (lat, lon)
+    """
+    if not texto:
+        return np.empty((0, 2), dtype=np.float64)
+    
+    # Cada entero (diferencia con el punto anterior) va en bloques de 5 bits; el último
+    # bloque de cada entero es el único menor que 0x20
+    bloques = np.frombuffer(texto.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    fin = bloques < 0x20
+    inicios = np.concatenate(([0], np.flatnonzero(fin)[:-1] + 1))
+    entero = np.cumsum(fin) - fin  # Entero al que pertenece cada bloque
+    desplazamiento = 5 * (np.arange(len(bloques)) - inicios[entero])
+    # Los bloques de un entero no comparten bits: sumarlos equivale a unirlos con OR
+    valores = np.add.reduceat((bloques & 0x1F) << desplazamiento, inicios)
+    deltas = np.where(valores & 1, ~(valores >> 1), valores >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+# Sesión HTTP compartida: reutiliza las conexiones (keep-alive) en lugar de abrir una
+# conexión TCP nueva por tramo. El tamaño del pool acota las consultas simultáneas
+MAX_CONSULTAS_OSRM = 32
+_SESION = requests.Session()
+_ADAPTADOR = HTTPAdapter(pool_connections=MAX_CONSULTAS_OSRM, pool_maxsize=MAX_CONSULTAS_OSRM,
+                         max_retries=Retry(total=2, backoff_factor=0.2))
+_SESION.mount("http://", _ADAPTADOR)
+_SESION.mount("https://", _ADAPTADOR)
+
+# Hilos compartidos por todas las peticiones para consultar tramos en paralelo: no se
+# crea un pool por petición y, entre todos los usuarios, nunca hay más consultas en
+# vuelo que conexiones en la sesión
+_EJECUTOR_TRAMOS = ThreadPoolExecutor(max_workers=MAX_CONSULTAS_OSRM, thread_name_prefix="osrm")
 
 class OSRMService:
     """Servicio para calcular rutas usando OSRM"""
@@ -12,6 +73,14 @@ class OSRMService:
     # URL del servidor OSRM público (puedes usar uno local si lo prefieres)
     # Para Lima, Perú, usamos un servidor público de OSRM
     BASE_URL = "http://router.project-osrm.org/route/v1/driving"
+    TABLE_URL = "http://router.project-osrm.org/table/v1/driving"
+    
+    # Caché LRU de tramos ya calculados: (lat, lon) de origen y destino redondeados a 5
+    # decimales (~1 m) -> (coordenadas, distancia_km). Los tramos almacén -> cliente se
+    # repiten entre pedidos y así no se vuelven a pedir a OSRM
+    MAX_TRAMOS_CACHE = 10_000
+    _cache_tramos: OrderedDict = OrderedDict()
+    _lock_cache = threading.Lock()
     
     @staticmethod
     def calcular_ruta_entre_puntos(
@@ -19,7 +88,7 @@ class OSRMService:
         destino: Tuple[float, float],  # (lat, lon)
         pasos_intermedios: bool = True,
         numero_alternativas: int = 0
-    ) -> Optional[Tuple[List[Tuple[float, float]], float]]:
+    ) -> Optional[Tuple[np.ndarray, float]]:
         """
         Calcula la ruta real entre dos puntos usando OSRM.
         
@@ -30,8 +99,17 @@ class OSRMService:
         
         Returns:
             Tupla (coordenadas, distancia_km) o None si hay error
-            coordenadas: Lista de tuplas (lat, lon) que forman la ruta
+            coordenadas: Arreglo (n x 2) de puntos (lat, lon) que forman la ruta (de solo
+            lectura: se comparte con el caché)
         """
+        # Tramo ya calculado: se devuelve sin consultar a OSRM
+        clave = (round(origen[0], 5), round(origen[1], 5), round(destino[0], 5), round(destino[1], 5))
+        with OSRMService._lock_cache:
+            resultado = OSRMService._cache_tramos.get(clave)
+            if resultado is not None:
+                OSRMService._cache_tramos.move_to_end(clave)
+                return resultado
+        
         try:
             # OSRM usa formato lon,lat (no lat,lon)
             lon_origen, lat_origen = origen[1], origen[0]
@@ -41,21 +119,21 @@ class OSRMService:
             url = f"{OSRMService.BASE_URL}/{lon_origen},{lat_origen};{lon_destino},{lat_destino}"
             params = {
                 "overview": "full",  # Siempre usar 'full' para máxima precisión
-                "geometries": "geojson",
-                "steps": "true",  # Incluir pasos intermedios para mayor precisión
+                "geometries": "polyline6",  # Enteros codificados: ~5 veces menos bytes que geojson
+                "steps": "false",  # Sin instrucciones giro a giro: solo se usan la distancia y la geometría
                 "alternatives": str(numero_alternativas)
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = _SESION.get(url, params=params, timeout=10)
             
             if response.status_code != 200:
-                print(f"Error OSRM: {response.status_code} - {response.text}")
+                logger.warning("Error OSRM: %s - %s", response.status_code, response.text)
                 return None
             
-            data = response.json()
+            data = _leer_json(response.content)  # orjson: parsea la geometría en C
             
             if data.get("code") != "Ok" or not data.get("routes"):
-                print(f"Error OSRM: {data.get('message', 'Ruta no encontrada')}")
+                logger.warning("Error OSRM: %s", data.get('message', 'Ruta no encontrada'))
                 return None
             
             route = data["routes"][0]
@@ -63,23 +141,29 @@ class OSRMService:
             distancia_km = distancia_metros / 1000.0
             
             # Extraer coordenadas de la geometría
-            geometry = route["geometry"]["coordinates"]
-            coordenadas = [(coord[1], coord[0]) for coord in geometry]  # Convertir de [lon, lat] a (lat, lon)
+            coordenadas = _decodificar_polyline(route["geometry"])  # Ya en formato (lat, lon)
+            coordenadas.flags.writeable = False
+            
+            # Solo se guardan las respuestas correctas: un error de OSRM puede ser pasajero
+            with OSRMService._lock_cache:
+                OSRMService._cache_tramos[clave] = (coordenadas, distancia_km)
+                if len(OSRMService._cache_tramos) > OSRMService.MAX_TRAMOS_CACHE:
+                    OSRMService._cache_tramos.popitem(last=False)
             
             return coordenadas, distancia_km
             
         except requests.exceptions.RequestException as e:
-            print(f"Error de conexión con OSRM: {e}")
+            logger.warning("Error de conexión con OSRM: %s", e)
             return None
         except Exception as e:
-            print(f"Error al calcular ruta con OSRM: {e}")
+            logger.warning("Error al calcular ruta con OSRM: %s", e)
             return None
     
     @staticmethod
     def calcular_ruta_multiple(
         puntos: List[Tuple[float, float]],  # Lista de (lat, lon)
         optimizar_orden: bool = False
-    ) -> Optional[Tuple[List[Tuple[float, float]], float]]:
+    ) -> Optional[Tuple[np.ndarray, float]]:
         """
         Calcula una ruta que pasa por múltiples puntos.
         
@@ -88,7 +172,8 @@ class OSRMService:
             optimizar_orden: Si True, OSRM optimiza el orden (TSP aproximado)
         
         Returns:
-            Tupla (coordenadas_completas, distancia_total_km) o None
+            Tupla (coordenadas_completas, distancia_total_km) o None; las coordenadas son
+            un arreglo (n x 2) de puntos (lat, lon)
         """
         if len(puntos) < 2:
             return None
@@ -100,22 +185,22 @@ class OSRMService:
             
             params = {
                 "overview": "full",
-                "geometries": "geojson",
-                "steps": "true"
+                "geometries": "polyline6",  # Enteros codificados: ~5 veces menos bytes que geojson
+                "steps": "false"
             }
             
             if optimizar_orden and len(puntos) > 2:
                 params["roundtrip"] = "false"
                 # OSRM tiene soporte limitado para TSP, mejor lo hacemos nosotros
             
-            response = requests.get(url, params=params, timeout=30)
+            response = _SESION.get(url, params=params, timeout=30)
             
             if response.status_code != 200:
-                print(f"Error OSRM múltiple: {response.status_code}")
+                logger.warning("Error OSRM múltiple: %s", response.status_code)
                 # Fallback: calcular segmento por segmento
                 return OSRMService._calcular_ruta_segmentos(puntos)
             
-            data = response.json()
+            data = _leer_json(response.content)  # orjson: parsea la geometría en C
             
             if data.get("code") != "Ok" or not data.get("routes"):
                 # Fallback: calcular segmento por segmento
@@ -126,53 +211,118 @@ class OSRMService:
             distancia_km = distancia_metros / 1000.0
             
             # Extraer coordenadas
-            geometry = route["geometry"]["coordinates"]
-            coordenadas = [(coord[1], coord[0]) for coord in geometry]
+            coordenadas = _decodificar_polyline(route["geometry"])
             
             return coordenadas, distancia_km
             
         except Exception as e:
-            print(f"Error en ruta múltiple OSRM: {e}")
+            logger.warning("Error en ruta múltiple OSRM: %s", e)
             # Fallback: calcular segmento por segmento
             return OSRMService._calcular_ruta_segmentos(puntos)
     
+    @staticmethod
+    def calcular_matriz(
+        puntos: List[Tuple[float, float]]  # Lista de (lat, lon)
+    ) -> Optional[np.ndarray]:
+        """
+        Calcula las distancias por calle entre todos los pares de puntos con una sola
+        consulta al servicio /table de OSRM.
+        
+        Args:
+            puntos: Lista de tuplas (latitud, longitud)
+        
+        Returns:
+            Matriz (n x n) de distancias en km (inf entre puntos sin ruta) o None si hay error
+        """
+        if len(puntos) < 2:
+            return None
+        
+        try:
+            coordenadas_str = ";".join([f"{lon},{lat}" for lat, lon in puntos])
+            url = f"{OSRMService.TABLE_URL}/{coordenadas_str}"
+            
+            response = _SESION.get(url, params={"annotations": "distance"}, timeout=10)
+            
+            if response.status_code != 200:
+                logger.warning("Error OSRM tabla: %s", response.status_code)
+                return None
+            
+            data = _leer_json(response.content)
+            
+            if data.get("code") != "Ok" or not data.get("distances"):
+                logger.warning("Error OSRM tabla: %s", data.get('message', 'Matriz no disponible'))
+                return None
+            
+            # OSRM devuelve metros y null en los pares sin ruta
+            matriz = np.array(data["distances"], dtype=np.float64) / 1000.0
+            if matriz.shape != (len(puntos), len(puntos)):
+                logger.warning("Error OSRM tabla: matriz de tamaño %s para %d puntos", matriz.shape, len(puntos))
+                return None
+            matriz[np.isnan(matriz)] = np.inf
+            
+            return matriz
+            
+        except Exception as e:
+            logger.warning("Error en matriz OSRM: %s", e)
+            return None
+    
+    @staticmethod
+    def calcular_rutas_tramos(
+        puntos: List[Tuple[float, float]]
+    ) -> List[Optional[Tuple[np.ndarray, float]]]:
+        """
+        Calcula la ruta de cada par de puntos consecutivos, consultando a OSRM en paralelo.
+        Cada consulta es una petición HTTP que solo espera la red, así que los tramos se
+        solapan en un pool de hilos en lugar de pagarse uno tras otro.
+        
+        Args:
+            puntos: Lista de tuplas (latitud, longitud)
+        
+        Returns:
+            Lista con el resultado de calcular_ruta_entre_puntos para cada tramo, en orden
+            (None en los tramos donde OSRM falló)
+        """
+        pares = list(zip(puntos, puntos[1:]))
+        if len(pares) <= 1:
+            return [OSRMService.calcular_ruta_entre_puntos(origen, destino, pasos_intermedios=True)
+                    for origen, destino in pares]
+        
+        return list(_EJECUTOR_TRAMOS.map(
+            lambda par: OSRMService.calcular_ruta_entre_puntos(par[0], par[1], pasos_intermedios=True),
+            pares
+        ))
+    
     @staticmethod
     def _calcular_ruta_segmentos(
         puntos: List[Tuple[float, float]]
-    ) -> Optional[Tuple[List[Tuple[float, float]], float]]:
+    ) -> Optional[Tuple[np.ndarray, float]]:
         """
         Calcula la ruta segmento por segmento (fallback).
         """
-        todas_coordenadas: List[Tuple[float, float]] = []
-        distancia_total = 0.0
+        # Todos los tramos se piden a OSRM en paralelo y se unen en orden
+        resultados = OSRMService.calcular_rutas_tramos(puntos)
         
-        for i in range(len(puntos) - 1):
-            resultado = OSRMService.calcular_ruta_entre_puntos(
-                puntos[i],
-                puntos[i + 1],
-                pasos_intermedios=True
-            )
-            
+        # Largo en línea recta de todos los tramos de una vez, solo si alguno falló
+        distancias_rectas = OSRMService._distancias_haversine_tramos(puntos) if None in resultados else None
+        
+        # Se juntan los arreglos de cada tramo y se copian una sola vez al final
+        partes: List[np.ndarray] = []
+        distancia_total = 0.0
+        for i, resultado in enumerate(resultados):
+            # Tramos consecutivos comparten el punto de unión: después del primero se omite
+            # el punto inicial de cada tramo, sin comparar coordenadas
             if resultado:
                 coordenadas, distancia = resultado
-                # Evitar duplicar el último punto
-                if todas_coordenadas and coordenadas:
-                    if todas_coordenadas[-1] == coordenadas[0]:
-                        todas_coordenadas.extend(coordenadas[1:])
-                    else:
-                        todas_coordenadas.extend(coordenadas)
-                else:
-                    todas_coordenadas.extend(coordenadas)
+                partes.append(coordenadas[1:] if partes else coordenadas)
                 
                 distancia_total += distancia
             else:
                 # Si falla un segmento, usar línea recta como fallback
-                todas_coordenadas.append(puntos[i])
-                todas_coordenadas.append(puntos[i + 1])
+                partes.append(np.array(puntos[i + 1:i + 2] if partes else puntos[i:i + 2], dtype=np.float64))
                 # Calcular distancia aproximada
-                distancia_total += OSRMService._distancia_haversine(puntos[i], puntos[i + 1])
+                distancia_total += float(distancias_rectas[i])
         
-        return todas_coordenadas, distancia_total
+        return np.concatenate(partes), distancia_total
     
     @staticmethod
     def _distancia_haversine(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
@@ -189,4 +339,26 @@ class OSRMService:
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
         
         return R * c
-
+    
+    @staticmethod
+    def _distancias_haversine_tramos(puntos: List[Tuple[float, float]]) -> np.ndarray:
+        """
+        Distancia Haversine (km) de cada tramo entre puntos consecutivos, en una sola
+        expresión de NumPy en lugar de llamar a _distancia_haversine por tramo.
+        
+        Args:
+            puntos: Lista de tuplas (latitud, longitud)
+        
+        Returns:
+            Arreglo float64 con len(puntos) - 1 distancias
+        """
+        R = 6371  # Radio de la Tierra en km
+        
+        radianes = np.radians(np.asarray(puntos, dtype=np.float64).reshape(-1, 2))
+        lat1, lon1 = radianes[:-1, 0], radianes[:-1, 1]
+        lat2, lon2 = radianes[1:, 0], radianes[1:, 1]
+        
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        
+        return R * c
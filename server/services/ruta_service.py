@@ -1,53 +1,163 @@
-from typing import List, Tuple
-import sys
-import os
+from typing import List, Tuple, Optional
 import math
-from collections import deque
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import logging
+import threading
+from collections import OrderedDict
 from models.grafo_wrapper import grafo_wrapper
+import numpy as np
+from algorithms.dijkstra import construir_csr, dijkstra_bidireccional, dijkstra_multi, reconstruir_camino
+from algorithms.floyd_warshall import floyd_warshall, encontrar_camino_floyd_warshall
+from algorithms.tsp import solve_tsp
 
-def convertir_utm_a_latlon(utm_x: float, utm_y: float):
+logger = logging.getLogger(__name__)
+
+# Por debajo de esta cantidad de puntos el bucle con math es más rápido que una llamada
+# a NumPy (que tiene un costo fijo de ~12 µs por llamada); medido en el grafo de Lima
+UMBRAL_HAVERSINE_VEC = 24
+
+def distancia_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia Haversine (km) entre dos puntos, con math: para consultas sueltas"""
+    R = 6371  # Radio de la Tierra en km
+    lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2) - math.radians(lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def distancia_haversine_vec(lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
     """
-    Convierte coordenadas UTM (Zone 18S, EPSG:32718) a lat/lon (WGS84, EPSG:4326)
-    Lima, Perú está en UTM Zone 18S
+    Distancia Haversine (km) desde un punto a muchos puntos en una sola expresión de NumPy,
+    en lugar de llamar a math.sin/cos/atan2 por cada nodo.
+    
+    Args:
+        lat0, lon0: Punto de referencia en grados
+        lats, lons: Arreglos con las coordenadas de los demás puntos en grados
+    
+    Returns:
+        Arreglo float64 con la distancia de cada punto a (lat0, lon0)
     """
-    try:
-        from pyproj import Transformer
-        
-        # UTM Zone 18S para Lima, Perú (EPSG:32718)
-        # WGS84 (EPSG:4326) para lat/lon
-        transformer = Transformer.from_crs("EPSG:32718", "EPSG:4326", always_xy=True)
-        lon, lat = transformer.transform(utm_x, utm_y)
-        return lat, lon
-    except ImportError:
-        # Si pyproj no está disponible, usar aproximación simple
-        lat = -12.0464 + (utm_y - 8650000) / 111000
-        lon = -77.0428 + (utm_x - 300000) / (111000 * 0.6)
-        return lat, lon
-    except Exception as e:
-        print(f"Error en conversión UTM: {e}")
-        return -12.0464, -77.0428
+    R = 6371  # Radio de la Tierra en km
+    lat0_rad, lon0_rad = np.radians(lat0), np.radians(lon0)
+    lats_rad, lons_rad = np.radians(lats), np.radians(lons)
+    dlat = lats_rad - lat0_rad
+    dlon = lons_rad - lon0_rad
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat0_rad) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
 class RutaService:
     """Servicio para calcular rutas optimizadas"""
     
+    # Máximo de pares (origen, destino) guardados por _calcular_ruta_grafo_directo
+    MAX_CAMINOS_CACHE = 8192
+    
     def __init__(self):
         self.grafo = grafo_wrapper
         self._matriz = None
         self._nodo_to_idx = None
-        self._idx_to_nodo = None
+        self._idx_to_nodo = None  # Arreglo: índice en la matriz -> id de nodo
+        self._csr = None
+        self._csr_inverso = None  # CSR de la matriz transpuesta (aristas entrantes de cada nodo)
+        self._csr_grafo = None  # CSR de la estructura del grafo (hijos y padres, distancia euclidiana UTM)
+        self._grafo_idx = None  # Id de nodo -> índice en _csr_grafo
+        self._grafo_nodos = None  # Índice en _csr_grafo -> id de nodo
+        self._caminos_grafo = OrderedDict()  # (origen, destino) -> (camino, distancia), del más antiguo al más reciente
+        self._lock_caminos = threading.Lock()  # Las peticiones llegan desde varios hilos del threadpool
+        self._floyd_warshall = None  # (distancias, predecesores) calculados una sola vez
+        self._lock_floyd_warshall = threading.Lock()  # Evita calcularlo dos veces en paralelo
+        self._matriz_distancias = None  # Distancias de camino mínimo entre todos los pares (para TSP)
+        self._arboles_origen = {}  # Nodo -> (distancias, previos) de dijkstra_multi para los orígenes fijos
         self._inicializar_matriz()
     
     def _inicializar_matriz(self):
         """Inicializa la matriz de adyacencia una sola vez"""
         if self._matriz is None:
             self._matriz, self._nodo_to_idx = self.grafo.get_matriz_adyacencia()
-            self._idx_to_nodo = {idx: nodo for nodo, idx in self._nodo_to_idx.items()}
-            print(f"✅ Matriz de adyacencia inicializada con {len(self._nodo_to_idx)} nodos")
-            print(f"   Primeros 10 nodos en la matriz: {list(self._nodo_to_idx.keys())[:10]}")
-            print(f"   Últimos 10 nodos en la matriz: {list(self._nodo_to_idx.keys())[-10:]}")
+            # Los índices son 0..n-1: un arreglo convierte un camino completo con una sola selección
+            self._idx_to_nodo = np.empty(len(self._nodo_to_idx), dtype=np.int64)
+            self._idx_to_nodo[list(self._nodo_to_idx.values())] = list(self._nodo_to_idx.keys())
+            # Representación CSR para Dijkstra: solo las aristas reales de cada nodo
+            self._csr = construir_csr(self._matriz)
+            # Para Dijkstra bidireccional: la búsqueda desde el destino sigue las aristas al revés
+            self._csr_inverso = construir_csr(self._matriz.T)
+            self._construir_csr_grafo()
+            logger.info("✅ Matriz de adyacencia inicializada con %d nodos", len(self._nodo_to_idx))
     
-    def calcular_ruta_optimizada(self, nodos: List[int]) -> Tuple[List[int], float, List[Tuple[float, float]]]:
+    def _construir_csr_grafo(self):
+        """
+        CSR para _calcular_ruta_grafo_directo, construido una sola vez: los vecinos de cada
+        nodo son sus hijos y sus padres en el grafo, con el largo euclidiano (UTM) de cada
+        arista ya calculado. Las aristas con un extremo sin posición (0, 0) no se incluyen.
+        Los índices siguen el orden de los ids, así que los empates se resuelven igual que
+        con heapq sobre tuplas (distancia, nodo).
+        """
+        graph = self.grafo.graph
+        etiquetas = np.asarray(graph.Vertices, dtype=np.int64)
+        orden = np.argsort(etiquetas, kind="stable")
+        posicion = np.empty(len(etiquetas), dtype=np.int64)  # Índice de vértice -> índice en el CSR
+        posicion[orden] = np.arange(len(etiquetas))
+        
+        # Aristas del grafo en ambos sentidos (hijos y padres), sin repetir ni lazos
+        origenes = np.fromiter((u for u, hijos in enumerate(graph.G) for _ in hijos), dtype=np.int64)
+        destinos = np.fromiter((v for hijos in graph.G for v in hijos), dtype=np.int64)
+        pares = np.unique(np.column_stack([np.concatenate([origenes, destinos]),
+                                           np.concatenate([destinos, origenes])]), axis=0)
+        coords = graph.coords
+        con_posicion = (coords[:, 0] != 0) | (coords[:, 1] != 0)
+        pares = pares[(pares[:, 0] != pares[:, 1]) & con_posicion[pares[:, 0]] & con_posicion[pares[:, 1]]]
+        diferencias = coords[pares[:, 0]] - coords[pares[:, 1]]
+        pesos = np.sqrt(diferencias[:, 0] ** 2 + diferencias[:, 1] ** 2)
+        
+        # Agrupar por nodo de origen en el orden de los ids
+        filas, columnas = posicion[pares[:, 0]], posicion[pares[:, 1]]
+        orden_aristas = np.lexsort((columnas, filas))
+        indptr = np.zeros(len(etiquetas) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(filas, minlength=len(etiquetas)), out=indptr[1:])
+        
+        self._csr_grafo = (indptr, columnas[orden_aristas].astype(np.int32), pesos[orden_aristas])
+        self._grafo_nodos = etiquetas[orden]
+        self._grafo_idx = {nodo: idx for idx, nodo in enumerate(self._grafo_nodos.tolist())}
+    
+    def _obtener_floyd_warshall(self):
+        """
+        Calcula Floyd-Warshall sobre la matriz la primera vez que se necesita y
+        reutiliza el resultado (el grafo no cambia entre peticiones).
+        """
+        if self._floyd_warshall is None:
+            with self._lock_floyd_warshall:
+                # Otro hilo pudo calcularlo mientras se esperaba el lock
+                if self._floyd_warshall is None:
+                    self._floyd_warshall = floyd_warshall(self._matriz)
+        return self._floyd_warshall
+    
+    def obtener_matriz_distancias(self) -> np.ndarray:
+        """
+        Matriz (n, n) de distancias de camino mínimo entre todos los pares, calculada una
+        sola vez. El TSP trabaja sobre esta matriz y no sobre las aristas directas: dos
+        paradas casi nunca son vecinas en el grafo. Los pares en componentes distintas quedan en inf.
+        """
+        if self._matriz_distancias is None:
+            n = len(self._nodo_to_idx)
+            self._matriz_distancias, _ = dijkstra_multi(np.arange(n), self._csr)
+        return self._matriz_distancias
+    
+    def precalcular_arboles(self, origenes: List[int]):
+        """
+        Calcula una sola vez el árbol de caminos mínimos (distancias y previos) desde los
+        orígenes fijos (Saga, Ripley): las rutas que salen de ellos solo reconstruyen el camino.
+        
+        Args:
+            origenes: IDs de los nodos de origen
+        """
+        nuevos = [nodo for nodo in dict.fromkeys(origenes)
+                  if nodo in self._nodo_to_idx and nodo not in self._arboles_origen]
+        if not nuevos:
+            return
+        
+        distancias, previos = dijkstra_multi([self._nodo_to_idx[nodo] for nodo in nuevos], self._csr)
+        for k, nodo in enumerate(nuevos):
+            self._arboles_origen[nodo] = (distancias[k], previos[k])
+    
+    def calcular_ruta_optimizada(self, nodos: List[int]) -> Tuple[List[int], float, List[List[float]]]:
         """
         Calcula la ruta optimizada para una lista de nodos usando TSP.
         
@@ -57,27 +167,20 @@ class RutaService:
         Returns:
             Tupla (ruta_optimizada, distancia_total, coordenadas)
         """
-        from algorithms.tsp import solve_tsp
-        
         if not nodos:
             return [], 0.0, []
         
         # Resolver TSP
         ruta_optimizada, distancia_total = solve_tsp(
-            self._matriz,
+            self.obtener_matriz_distancias(),
             nodos,
             self._nodo_to_idx,
             self._idx_to_nodo
         )
         
-        # Obtener coordenadas para cada nodo en la ruta
-        coordenadas = []
-        for nodo_id in ruta_optimizada:
-            coords_utm = self.grafo.graph.get_node_coords(nodo_id)
-            # Convertir de UTM a lat/lon
-            lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-            # Formato [latitud, longitud] para Leaflet
-            coordenadas.append((lat, lon))
+        # Obtener coordenadas para cada nodo en la ruta, ya convertidas en grafo_wrapper
+        # (formato [latitud, longitud] para Leaflet)
+        coordenadas = self._coordenadas_nodos(ruta_optimizada)
         
         return ruta_optimizada, distancia_total, coordenadas
     
@@ -93,103 +196,44 @@ class RutaService:
         Returns:
             Tupla (ruta, distancia_total) donde ruta es lista de IDs de nodos incluyendo TODOS los intermedios
         """
-        import heapq
-        
-        if origen not in self.grafo.graph.label2v or destino not in self.grafo.graph.label2v:
-            print(f"      ❌ Origen ({origen}) o Destino ({destino}) no encontrado en el grafo.")
+        if origen not in self._grafo_idx or destino not in self._grafo_idx:
+            logger.debug("❌ Origen (%s) o Destino (%s) no encontrado en el grafo.", origen, destino)
             return [], float('inf')
         
-        # Dijkstra sobre el grafo directamente para encontrar el camino más corto con TODOS los nodos intermedios
-        distancias = {origen: 0.0}
-        previos = {origen: None}
-        visitados = set()
-        cola = [(0.0, origen)]
-        
-        # Verificar que los nodos existen y tienen vecinos
-        vecinos_origen = self.grafo.graph.get_children(origen)
-        padres_origen = self.grafo.graph.get_parents(origen)
-        todos_vecinos_origen = set(vecinos_origen + padres_origen)
-        
-        print(f"      Iniciando Dijkstra sobre el grafo desde nodo {origen} hacia nodo {destino}")
-        print(f"         Vecinos del origen ({origen}): {len(todos_vecinos_origen)} nodos")
-        if len(todos_vecinos_origen) > 0:
-            print(f"         Primeros vecinos: {list(todos_vecinos_origen)[:5]}")
-        
-        vecinos_destino = self.grafo.graph.get_children(destino)
-        padres_destino = self.grafo.graph.get_parents(destino)
-        todos_vecinos_destino = set(vecinos_destino + padres_destino)
-        print(f"         Vecinos del destino ({destino}): {len(todos_vecinos_destino)} nodos")
-        
-        max_iteraciones = 10000
-        iteraciones = 0
-        
-        while cola and iteraciones < max_iteraciones:
-            iteraciones += 1
-            dist_actual, nodo_actual = heapq.heappop(cola)
-            
-            if nodo_actual in visitados:
-                continue
-                
-            visitados.add(nodo_actual)
-            
-            # Si llegamos al destino, reconstruir el camino completo
-            if nodo_actual == destino:
-                camino = []
-                nodo = destino
-                while nodo is not None:
-                    camino.append(nodo)
-                    nodo = previos[nodo]
-                camino.reverse()
-                
-                # Calcular distancia total sumando distancias entre nodos consecutivos
-                distancia_total = 0.0
-                for i in range(len(camino) - 1):
-                    coords1 = self.grafo.graph.get_node_coords(camino[i])
-                    coords2 = self.grafo.graph.get_node_coords(camino[i + 1])
-                    if coords1 and coords2 and coords1 != (0, 0) and coords2 != (0, 0):
-                        dist = math.sqrt((coords1[0] - coords2[0])**2 + (coords1[1] - coords2[1])**2)
-                        distancia_total += dist
-                
-                print(f"      ✅ Dijkstra sobre grafo encontró camino con {len(camino)} nodos (TODOS los intermedios)")
-                print(f"         Camino completo: {camino[:10]}..." + (f" (total: {len(camino)} nodos)" if len(camino) > 10 else ""))
-                return camino, distancia_total
-            
-            # Obtener vecinos del nodo actual usando la estructura del grafo
-            vecinos = self.grafo.graph.get_children(nodo_actual)
-            padres = self.grafo.graph.get_parents(nodo_actual)
-            todos_vecinos = set(vecinos + padres)
-            
-            if len(todos_vecinos) == 0:
-                # Nodo sin conexiones, saltarlo
-                continue
-            
-            for vecino in todos_vecinos:
-                if vecino in visitados:
-                    continue
-                
-                # Calcular distancia al vecino
-                coords_actual = self.grafo.graph.get_node_coords(nodo_actual)
-                coords_vecino = self.grafo.graph.get_node_coords(vecino)
-                
-                if coords_actual and coords_vecino and coords_actual != (0, 0) and coords_vecino != (0, 0):
-                    dist = math.sqrt((coords_actual[0] - coords_vecino[0])**2 + (coords_actual[1] - coords_vecino[1])**2)
-                    nueva_dist = dist_actual + dist
-                    
-                    if vecino not in distancias or nueva_dist < distancias[vecino]:
-                        distancias[vecino] = nueva_dist
-                        previos[vecino] = nodo_actual
-                        heapq.heappush(cola, (nueva_dist, vecino))
-        
-        if iteraciones >= max_iteraciones:
-            print(f"      ⚠️ Dijkstra alcanzó el límite de iteraciones ({max_iteraciones})")
-        
-        # No se encontró camino
-        print(f"      ❌ Dijkstra sobre grafo no encontró camino después de explorar {len(visitados)} nodos")
-        print(f"         Nodos explorados: {len(visitados)}")
-        print(f"         ¿Origen y destino están en el mismo componente conectado?")
-        return [], float('inf')
+        # Par ya calculado (el grafo no cambia): se devuelve una copia del camino guardado
+        clave = (origen, destino)
+        with self._lock_caminos:
+            resultado = self._caminos_grafo.get(clave)
+            if resultado is not None:
+                self._caminos_grafo.move_to_end(clave)
+                return list(resultado[0]), resultado[1]
+        
+        # Dijkstra bidireccional sobre el CSR del grafo (hijos y padres con sus largos ya
+        # calculados). Los vecinos incluyen a los padres, así que el grafo es simétrico y
+        # el mismo CSR sirve como grafo inverso para la búsqueda desde el destino
+        logger.debug("Iniciando Dijkstra sobre el grafo desde nodo %s hacia nodo %s", origen, destino)
+        distancia_total, camino_indices = dijkstra_bidireccional(self._csr_grafo, self._csr_grafo,
+                                                                 self._grafo_idx[origen], self._grafo_idx[destino])
+        
+        if not camino_indices:
+            # No se encontró camino
+            logger.debug("❌ Dijkstra sobre grafo no encontró camino entre %s y %s "
+                         "(¿están en el mismo componente conectado?)", origen, destino)
+            camino, distancia_total = [], float('inf')
+        else:
+            camino = self._grafo_nodos[camino_indices].tolist()
+            logger.debug("✅ Dijkstra sobre grafo encontró camino con %d nodos (TODOS los intermedios)", len(camino))
+        
+        # Sin normalizar (origen, destino) por simetría: el camino invertido puede diferir
+        # en los empates y su distancia sumada al revés, en el último decimal
+        with self._lock_caminos:
+            self._caminos_grafo[clave] = (tuple(camino), distancia_total)
+            if len(self._caminos_grafo) > self.MAX_CAMINOS_CACHE:
+                self._caminos_grafo.popitem(last=False)
+        return camino, distancia_total
     
-    def calcular_ruta_entre_nodos(self, origen: int, destino: int, algoritmo: str = "dijkstra") -> Tuple[List[int], float, List[Tuple[float, float]]]:
+    def calcular_ruta_entre_nodos(self, origen: int, destino: int, algoritmo: str = "dijkstra",
+                                  arbol: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[List[int], float, List[Tuple[float, float]]]:
         """
         Calcula la ruta más corta entre dos nodos usando el algoritmo especificado.
         
@@ -197,33 +241,42 @@ class RutaService:
             origen: ID del nodo origen
             destino: ID del nodo destino
             algoritmo: Algoritmo a usar ("dijkstra" o "floyd_warshall")
+            arbol: Fila (distancias, previos) de dijkstra_multi para el origen, si ya se calculó
+                (por defecto, el precalculado por precalcular_arboles si el origen es fijo)
         
         Returns:
             Tupla (ruta, distancia_total, coordenadas) donde ruta es lista de IDs de nodos
         """
-        print(f"Calculando ruta de punto A a punto B: {origen} -> {destino} usando {algoritmo.upper()}")
+        if arbol is None:
+            arbol = self._arboles_origen.get(origen)
+        logger.debug("Calculando ruta de punto A a punto B: %s -> %s usando %s", origen, destino, algoritmo.upper())
         
         if algoritmo.lower() == "floyd_warshall":
             return self._calcular_ruta_floyd_warshall(origen, destino)
         else:
-            return self._calcular_ruta_dijkstra(origen, destino)
+            return self._calcular_ruta_dijkstra(origen, destino, arbol)
     
-    def _calcular_ruta_dijkstra(self, origen: int, destino: int) -> Tuple[List[int], float, List[Tuple[float, float]]]:
+    def _calcular_ruta_dijkstra(self, origen: int, destino: int,
+                                arbol: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[List[int], float, List[Tuple[float, float]]]:
         """Calcula la ruta usando el algoritmo de Dijkstra"""
-        from algorithms.dijkstra import dijkstra
-        
         if origen not in self._nodo_to_idx or destino not in self._nodo_to_idx:
-            print(f"      ❌ Origen ({origen}) o Destino ({destino}) no encontrado en la matriz.")
+            logger.debug("❌ Origen (%s) o Destino (%s) no encontrado en la matriz.", origen, destino)
             return [], 0.0, []
         
         origen_idx = self._nodo_to_idx[origen]
         destino_idx = self._nodo_to_idx[destino]
         
-        # Usar Dijkstra sobre la matriz
-        distancia_total, camino_indices = dijkstra(self._matriz, origen_idx, destino_idx)
+        if arbol is not None:
+            # Reutilizar el árbol de caminos mínimos del origen (dijkstra_multi)
+            distancias, previos = arbol
+            distancia_total = float(distancias[destino_idx])
+            camino_indices = reconstruir_camino(previos, origen_idx, destino_idx)
+        else:
+            # Consulta de un solo par: Dijkstra bidireccional sobre la matriz
+            distancia_total, camino_indices = dijkstra_bidireccional(self._csr, self._csr_inverso, origen_idx, destino_idx)
         
         if not camino_indices:
-            print(f"      ❌ Dijkstra no encontró camino")
+            logger.debug("❌ Dijkstra no encontró camino")
             # Intentar con el método directo del grafo
             camino_nodos, distancia_directa = self._calcular_ruta_grafo_directo(origen, destino)
             if camino_nodos:
@@ -232,16 +285,15 @@ class RutaService:
             return [], 0.0, []
         
         # Convertir índices de vuelta a IDs de nodos
-        camino_nodos = [self._idx_to_nodo[idx] for idx in camino_indices]
+        camino_nodos = self._idx_to_nodo[camino_indices].tolist()
         
-        print(f"      ✅ Dijkstra encontró camino con {len(camino_nodos)} nodos")
+        logger.debug("✅ Dijkstra encontró camino con %d nodos", len(camino_nodos))
         
         # Verificar si el camino del grafo real tiene más nodos intermedios
-        print(f"         Verificando si el camino del grafo real tiene más nodos intermedios...")
         camino_grafo, distancia_grafo = self._calcular_ruta_grafo_directo(origen, destino)
         
         if camino_grafo and len(camino_grafo) > len(camino_nodos):
-            print(f"      ✅ Usando camino del grafo con {len(camino_grafo)} nodos (más detallado)")
+            logger.debug("✅ Usando camino del grafo con %d nodos (más detallado)", len(camino_grafo))
             coordenadas = self._obtener_coordenadas_ruta(camino_grafo)
             return camino_grafo, distancia_grafo, coordenadas
         else:
@@ -250,142 +302,76 @@ class RutaService:
     
     def _calcular_ruta_floyd_warshall(self, origen: int, destino: int) -> Tuple[List[int], float, List[Tuple[float, float]]]:
         """Calcula la ruta usando el algoritmo de Floyd-Warshall"""
-        from algorithms.floyd_warshall import encontrar_camino_floyd_warshall
-        
         if origen not in self._nodo_to_idx or destino not in self._nodo_to_idx:
-            print(f"      ❌ Origen ({origen}) o Destino ({destino}) no encontrado en la matriz.")
+            logger.debug("❌ Origen (%s) o Destino (%s) no encontrado en la matriz.", origen, destino)
             return [], 0.0, []
         
         origen_idx = self._nodo_to_idx[origen]
         destino_idx = self._nodo_to_idx[destino]
         
-        # Usar Floyd-Warshall sobre la matriz
-        distancia_total, camino_indices = encontrar_camino_floyd_warshall(self._matriz, origen_idx, destino_idx)
+        # Usar Floyd-Warshall sobre la matriz (todos los pares ya calculados)
+        distancia_total, camino_indices = encontrar_camino_floyd_warshall(
+            self._matriz, origen_idx, destino_idx, resultado=self._obtener_floyd_warshall()
+        )
         
         if not camino_indices:
-            print(f"      ❌ Floyd-Warshall no encontró camino")
+            logger.debug("❌ Floyd-Warshall no encontró camino")
             return [], 0.0, []
         
         # Convertir índices de vuelta a IDs de nodos
-        camino_nodos = [self._idx_to_nodo[idx] for idx in camino_indices]
+        camino_nodos = self._idx_to_nodo[camino_indices].tolist()
         
-        print(f"      ✅ Floyd-Warshall encontró camino con {len(camino_nodos)} nodos")
-        print(f"         Camino: {camino_nodos[:10]}..." + (f" (total: {len(camino_nodos)})" if len(camino_nodos) > 10 else ""))
+        logger.debug("✅ Floyd-Warshall encontró camino con %d nodos", len(camino_nodos))
         
         # Obtener coordenadas
         coordenadas = self._obtener_coordenadas_ruta(camino_nodos)
         return camino_nodos, distancia_total, coordenadas
     
-    def _obtener_coordenadas_ruta(self, camino_nodos: List[int]) -> List[Tuple[float, float]]:
-        """Obtiene las coordenadas de una ruta de nodos"""
-        coordenadas = []
-        for nodo_id in camino_nodos:
-            coords_utm = self.grafo.graph.get_node_coords(nodo_id)
-            lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-            coordenadas.append((lat, lon))
-        
-        print(f"      ✅ Coordenadas obtenidas: {len(coordenadas)} puntos para ruta de {len(camino_nodos)} nodos")
-        if len(coordenadas) >= 3:
-            print(f"         Primeros 3 puntos: {coordenadas[:3]}")
-            print(f"         Últimos 3 puntos: {coordenadas[-3:]}")
-        
-        return coordenadas
+    def _coordenadas_nodos(self, nodos: List[int], solo_con_posicion: bool = False) -> List[List[float]]:
         """
-        Calcula la ruta más corta entre dos nodos pasando por TODOS los nodos intermedios del grafo.
-        Usa BFS sobre el grafo directamente para garantizar que pasa por todos los nodos del camino real.
+        Coordenadas [lat, lon] de nodos del grafo tomadas del caché de grafo_wrapper: una
+        selección de NumPy y un solo tolist() (en C) en lugar de convertir nodo por nodo.
         
         Args:
-            origen: ID del nodo origen
-            destino: ID del nodo destino
+            nodos: IDs de nodos del grafo
+            solo_con_posicion: Omitir los nodos sin posición (utm_x = utm_y = 0)
         
         Returns:
-            Tupla (ruta, distancia_total, coordenadas) donde ruta incluye TODOS los nodos intermedios
+            Lista de [lat, lon], lista para la respuesta JSON sin otra conversión
         """
-        from algorithms.dijkstra import dijkstra
-        
-        # Primero intentar con Dijkstra si los nodos están en la matriz para obtener la distancia
-        distancia_estimada = float('inf')
-        if origen in self._nodo_to_idx and destino in self._nodo_to_idx:
-            origen_idx = self._nodo_to_idx[origen]
-            destino_idx = self._nodo_to_idx[destino]
-            
-            distancia_estimada, camino_indices = dijkstra(self._matriz, origen_idx, destino_idx)
-            
-            if camino_indices and len(camino_indices) > 2:
-                # Si Dijkstra encontró un camino con nodos intermedios, verificar si coincide con el grafo real
-                ruta_dijkstra = [self._idx_to_nodo[idx] for idx in camino_indices]
-                print(f"      ✅ Dijkstra encontró camino con {len(ruta_dijkstra)} nodos")
-                print(f"         Verificando si el camino del grafo real tiene más nodos intermedios...")
-        
-        # SIEMPRE usar Dijkstra sobre el grafo directamente para obtener el camino MÁS CORTO con TODOS los nodos intermedios
-        print(f"   Calculando ruta {origen} -> {destino} usando Dijkstra sobre el grafo (garantiza camino más corto con todos los nodos intermedios)")
-        ruta, distancia_total = self._calcular_ruta_grafo_directo(origen, destino)
-        
-        if ruta:
-            print(f"      ✅ Dijkstra sobre grafo encontró ruta con {len(ruta)} nodos: {ruta[:5]}..." + (f" (total: {len(ruta)})" if len(ruta) > 5 else ""))
-        else:
-            print(f"      ❌ Dijkstra sobre grafo no encontró ruta entre {origen} y {destino}")
-        
-        if not ruta:
-            # Último fallback: línea recta si tienen coordenadas válidas
-            coords_origen_utm = self.grafo.graph.get_node_coords(origen)
-            coords_destino_utm = self.grafo.graph.get_node_coords(destino)
-            
-            if coords_origen_utm and coords_origen_utm != (0, 0) and coords_destino_utm and coords_destino_utm != (0, 0):
-                lat_origen, lon_origen = convertir_utm_a_latlon(coords_origen_utm[0], coords_origen_utm[1])
-                lat_destino, lon_destino = convertir_utm_a_latlon(coords_destino_utm[0], coords_destino_utm[1])
-                
-                dlat = lat_destino - lat_origen
-                dlon = lon_destino - lon_origen
-                distancia_aprox = math.sqrt(dlat**2 + dlon**2) * 111.0
-                
-                return [origen, destino], distancia_aprox, [(lat_origen, lon_origen), (lat_destino, lon_destino)]
-            
-            return [], float('inf'), []
-        
-        # Obtener coordenadas de la ruta encontrada con BFS
-        coordenadas = []
-        for nodo_id in ruta:
-            coords_utm = self.grafo.graph.get_node_coords(nodo_id)
-            if coords_utm and coords_utm != (0, 0):
-                lat, lon = convertir_utm_a_latlon(coords_utm[0], coords_utm[1])
-                coordenadas.append((lat, lon))
-        
-        print(f"      ✅ Coordenadas obtenidas: {len(coordenadas)} puntos para ruta de {len(ruta)} nodos")
-        if len(coordenadas) > 2:
-            print(f"         Primeros 3 puntos: {coordenadas[:3]}")
-            print(f"         Últimos 3 puntos: {coordenadas[-3:]}")
-        
-        return ruta, distancia_total, coordenadas
+        _, utm_x, utm_y, lats, lons = self.grafo.ensure_coord_cache()
+        node_index = self.grafo.node_index
+        filas = np.fromiter((node_index[nodo] for nodo in nodos), dtype=np.intp, count=len(nodos))
+        if solo_con_posicion:
+            filas = filas[(utm_x[filas] != 0) | (utm_y[filas] != 0)]
+        return np.column_stack([lats[filas], lons[filas]]).tolist()
     
-    def calcular_ruta_completa_con_segmentos(self, nodos: List[int]) -> Tuple[List[int], float, List[List[Tuple[float, float]]]]:
+    def _obtener_coordenadas_ruta(self, camino_nodos: List[int]) -> List[List[float]]:
+        """Obtiene las coordenadas de una ruta de nodos"""
+        coordenadas = self._coordenadas_nodos(camino_nodos)
+        logger.debug("✅ Coordenadas obtenidas: %d puntos para ruta de %d nodos", len(coordenadas), len(camino_nodos))
+        return coordenadas
+    
+    def ordenar_ruta_tsp(self, nodos: List[int]) -> Tuple[List[int], float]:
         """
-        Calcula la ruta optimizada y luego el camino real en el grafo entre cada par de nodos consecutivos.
+        Solo el orden de visita (TSP) de calcular_ruta_completa_con_segmentos, sin calcular
+        el camino de cada tramo: para quien usa el orden pero arma los tramos por su cuenta.
         
         Args:
-            nodos: Lista de IDs de nodos a visitar
+            nodos: Lista de IDs de nodos a visitar (si el primero y el último coinciden, es un origen fijo)
         
         Returns:
-            Tupla (ruta_optimizada, distancia_total, segmentos)
-            donde segmentos es una lista de listas de coordenadas, cada una representa
-            el camino real en el grafo entre dos nodos consecutivos
+            Tupla (ruta_optimizada, distancia_total)
         """
-        from algorithms.tsp import solve_tsp
-        
         if not nodos:
-            return [], 0.0, []
+            return [], 0.0
         
         # Verificar qué nodos están en la matriz
-        nodos_en_matriz = [nodo for nodo in nodos if nodo in self._nodo_to_idx]
         nodos_faltantes = [nodo for nodo in nodos if nodo not in self._nodo_to_idx]
         if nodos_faltantes:
-            print(f"⚠️ ADVERTENCIA RutaService: {len(nodos_faltantes)} nodos del pedido no están en la matriz: {nodos_faltantes}")
-            print(f"   Nodos solicitados: {nodos}")
-            print(f"   Nodos encontrados en matriz: {nodos_en_matriz}")
-            print(f"   Total de nodos en matriz: {len(self._nodo_to_idx)}")
-            # Mostrar algunos ejemplos de nodos que SÍ están en la matriz
-            ejemplos = list(self._nodo_to_idx.keys())[:5]
-            print(f"   Ejemplos de nodos en matriz: {ejemplos}")
+            logger.warning("⚠️ ADVERTENCIA RutaService: %d nodos del pedido no están en la matriz: %s "
+                           "(nodos solicitados: %s, total de nodos en matriz: %d)",
+                           len(nodos_faltantes), nodos_faltantes, nodos, len(self._nodo_to_idx))
         
         # Si el primer y último nodo son iguales, es un origen fijo
         origen_fijo = None
@@ -398,24 +384,59 @@ class RutaService:
         
         # Resolver TSP para obtener el orden optimizado
         ruta_optimizada, distancia_total = solve_tsp(
-            self._matriz,
+            self.obtener_matriz_distancias(),
             nodos_para_tsp,
             self._nodo_to_idx,
             self._idx_to_nodo,
             origen_fijo=origen_fijo
         )
         
+        return ruta_optimizada, distancia_total
+    
+    def calcular_ruta_completa_con_segmentos(self, nodos: List[int]) -> Tuple[List[int], float, List[List[Tuple[float, float]]]]:
+        """
+        Calcula la ruta optimizada y luego el camino real en el grafo entre cada par de nodos consecutivos.
+        
+        Args:
+            nodos: Lista de IDs de nodos a visitar
+        
+        Returns:
+            Tupla (ruta_optimizada, distancia_total, segmentos)
+            donde segmentos es una lista de listas de coordenadas, cada una representa
+            el camino real en el grafo entre dos nodos consecutivos
+        """
+        if not nodos:
+            return [], 0.0, []
+        
+        ruta_optimizada, distancia_total = self.ordenar_ruta_tsp(nodos)
+        
         # Calcular el camino real en el grafo entre cada par de nodos consecutivos
         segmentos = []
         distancia_total_real = 0.0
         
+        # Dijkstra desde todos los orígenes de segmento en una sola llamada (sin bucle en Python):
+        # un árbol por nodo distinto, sin repetir los ya precalculados (orígenes fijos)
+        origenes_segmento = [nodo for nodo in dict.fromkeys(ruta_optimizada[:-1])
+                             if nodo in self._nodo_to_idx and nodo not in self._arboles_origen]
+        fila_por_nodo = {nodo: k for k, nodo in enumerate(origenes_segmento)}
+        if origenes_segmento:
+            distancias_multi, previos_multi = dijkstra_multi(
+                [self._nodo_to_idx[nodo] for nodo in origenes_segmento], self._csr
+            )
+        
         # Para cada par de nodos consecutivos en la ruta optimizada
         for i in range(len(ruta_optimizada) - 1):
             origen = ruta_optimizada[i]
             destino = ruta_optimizada[i + 1]
             
+            # Sin fila propia, calcular_ruta_entre_nodos usa el árbol precalculado del origen
+            arbol = None
+            if origen in fila_por_nodo:
+                k = fila_por_nodo[origen]
+                arbol = (distancias_multi[k], previos_multi[k])
+            
             # Calcular el camino real entre estos dos nodos usando Dijkstra
-            _, distancia_segmento, coordenadas_segmento = self.calcular_ruta_entre_nodos(origen, destino)
+            _, distancia_segmento, coordenadas_segmento = self.calcular_ruta_entre_nodos(origen, destino, arbol=arbol)
             
             if coordenadas_segmento and len(coordenadas_segmento) > 0:
                 # Si hay un camino válido, agregarlo
@@ -424,13 +445,11 @@ class RutaService:
                     distancia_total_real += distancia_segmento
             else:
                 # Si no hay camino directo en el grafo, usar línea recta como fallback
-                coords_origen_utm = self.grafo.graph.get_node_coords(origen)
-                coords_destino_utm = self.grafo.graph.get_node_coords(destino)
+                # (coordenadas del caché de grafo_wrapper)
+                node_index = self.grafo.node_index
                 
-                if coords_origen_utm and coords_destino_utm:
-                    lat_origen, lon_origen = convertir_utm_a_latlon(coords_origen_utm[0], coords_origen_utm[1])
-                    lat_destino, lon_destino = convertir_utm_a_latlon(coords_destino_utm[0], coords_destino_utm[1])
-                    segmentos.append([(lat_origen, lon_origen), (lat_destino, lon_destino)])
+                if origen in node_index and destino in node_index:
+                    segmentos.append(self._coordenadas_nodos([origen, destino]))
                     # Aproximación de distancia para línea recta (Haversine simplificado)
                     distancia_total_real += distancia_total / len(ruta_optimizada) if len(ruta_optimizada) > 0 else 0
         
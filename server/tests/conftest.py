@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los módulos del servidor se importan como paquetes de primer nivel (igual que en app.py)
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
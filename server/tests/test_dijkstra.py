@@ -0,0 +1,103 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from algorithms.dijkstra import construir_csr, dijkstra, dijkstra_bidireccional, dijkstra_multi
+
+# "import algorithms.dijkstra" devolvería la función reexportada en algorithms/__init__
+modulo_dijkstra = importlib.import_module("algorithms.dijkstra")
+
+BACKENDS = ["scipy", "numba", "python"]
+
+
+def _usar_backend(monkeypatch, backend):
+    """Fuerza la implementación de SciPy, la de Numba o la de Python puro"""
+    if backend == "scipy" and not modulo_dijkstra.SCIPY_DISPONIBLE:
+        pytest.skip("SciPy no está instalado")
+    if backend == "numba" and not modulo_dijkstra.NUMBA_DISPONIBLE:
+        pytest.skip("Numba no está instalado")
+    monkeypatch.setattr(modulo_dijkstra, "SCIPY_DISPONIBLE", backend == "scipy")
+    monkeypatch.setattr(modulo_dijkstra, "NUMBA_DISPONIBLE", backend in ("scipy", "numba"))
+
+
+def _grafo_de_prueba(n=40, densidad=0.12, semilla=3):
+    """Grafo dirigido aleatorio con pesos reales (sin empates) y algunos nodos aislados"""
+    rng = np.random.default_rng(semilla)
+    matriz = np.where(rng.random((n, n)) < densidad, rng.uniform(0.1, 10.0, (n, n)), np.inf)
+    matriz[-3:, :] = np.inf
+    matriz[:, -3:] = np.inf
+    np.fill_diagonal(matriz, 0.0)
+    return matriz
+
+
+def _referencia(matriz):
+    """Distancias de todos los pares con el Floyd-Warshall más simple"""
+    distancias = matriz.copy()
+    for k in range(len(matriz)):
+        distancias = np.minimum(distancias, distancias[:, k:k + 1] + distancias[k:k + 1, :])
+    return distancias
+
+
+def _costo(matriz, camino):
+    return sum(matriz[u, v] for u, v in zip(camino, camino[1:]))
+
+
+PARES = [(0, 5), (7, 2), (12, 30), (3, 3), (1, 38), (38, 1), (20, 11)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_dijkstra_igual_en_todas_las_implementaciones(monkeypatch, backend):
+    _usar_backend(monkeypatch, backend)
+    matriz = _grafo_de_prueba()
+    csr, esperadas = construir_csr(matriz), _referencia(matriz)
+    
+    for inicio, fin in PARES:
+        distancia, camino = dijkstra(csr, inicio, fin)
+        assert distancia == pytest.approx(esperadas[inicio, fin])
+        if np.isfinite(esperadas[inicio, fin]):
+            assert camino[0] == inicio and camino[-1] == fin
+            assert _costo(matriz, camino) == pytest.approx(distancia)
+        else:
+            assert camino == []
+
+
+@pytest.mark.parametrize("backend", ["numba", "python"])
+def test_dijkstra_bidireccional_igual_en_todas_las_implementaciones(monkeypatch, backend):
+    _usar_backend(monkeypatch, backend)
+    matriz = _grafo_de_prueba()
+    csr, csr_inverso, esperadas = construir_csr(matriz), construir_csr(matriz.T), _referencia(matriz)
+    
+    for inicio, fin in PARES:
+        if backend == "python":
+            distancia, camino = modulo_dijkstra._dijkstra_bidireccional_python(csr, csr_inverso, inicio, fin)
+        else:
+            distancia, camino = dijkstra_bidireccional(csr, csr_inverso, inicio, fin)
+        assert distancia == pytest.approx(esperadas[inicio, fin])
+        if np.isfinite(esperadas[inicio, fin]):
+            assert camino[0] == inicio and camino[-1] == fin
+            assert _costo(matriz, camino) == pytest.approx(distancia)
+        else:
+            assert camino == []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("limite", [np.inf, 6.0])
+def test_dijkstra_multi_igual_en_todas_las_implementaciones(monkeypatch, backend, limite):
+    _usar_backend(monkeypatch, backend)
+    matriz = _grafo_de_prueba()
+    origenes = [0, 7, 12, 38]
+    esperadas = _referencia(matriz)[origenes]
+    esperadas[esperadas > limite] = np.inf
+    
+    distancias, previos = dijkstra_multi(origenes, construir_csr(matriz), limite)
+    
+    np.testing.assert_allclose(distancias, esperadas)
+    for fila, origen in enumerate(origenes):
+        assert previos[fila, origen] == origen
+        alcanzados = np.isfinite(esperadas[fila])
+        assert (previos[fila][~alcanzados] == -1).all()
+        for nodo in np.flatnonzero(alcanzados):
+            if nodo != origen:
+                previo = previos[fila, nodo]
+                assert distancias[fila, previo] + matriz[previo, nodo] == pytest.approx(distancias[fila, nodo])
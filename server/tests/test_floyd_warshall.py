@@ -0,0 +1,32 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from algorithms.floyd_warshall import floyd_warshall
+from test_dijkstra import _grafo_de_prueba, _referencia
+
+modulo_floyd_warshall = importlib.import_module("algorithms.floyd_warshall")
+
+
+@pytest.mark.parametrize("backend", ["scipy", "numba", "numpy"])
+def test_floyd_warshall_igual_en_todas_las_implementaciones(monkeypatch, backend):
+    if backend == "scipy" and not modulo_floyd_warshall.SCIPY_DISPONIBLE:
+        pytest.skip("SciPy no está instalado")
+    if backend == "numba" and not modulo_floyd_warshall.NUMBA_DISPONIBLE:
+        pytest.skip("Numba no está instalado")
+    monkeypatch.setattr(modulo_floyd_warshall, "SCIPY_DISPONIBLE", backend == "scipy")
+    monkeypatch.setattr(modulo_floyd_warshall, "NUMBA_DISPONIBLE", backend in ("scipy", "numba"))
+    matriz = _grafo_de_prueba()
+    
+    distancias, predecesores = floyd_warshall(matriz)
+    distancias, predecesores = np.array(distancias), np.array(predecesores)
+    
+    esperadas = _referencia(matriz)
+    np.testing.assert_allclose(distancias, esperadas)
+    np.testing.assert_array_equal(np.diag(predecesores), np.arange(len(matriz)))
+    assert (predecesores[~np.isfinite(esperadas)] == -1).all()
+    # El predecesor de j en el camino i -> j cierra el camino mínimo con una arista
+    for i, j in zip(*np.nonzero(np.isfinite(esperadas) & ~np.eye(len(matriz), dtype=bool))):
+        previo = predecesores[i, j]
+        assert distancias[i, previo] + matriz[previo, j] == pytest.approx(distancias[i, j])
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("backend", ["scipy", "numba", "numpy"])
+def test_pares_cercanos_igual_en_todas_las_implementaciones(monkeypatch, backend):
+    if backend == "scipy" and not main.SCIPY_DISPONIBLE:
+        pytest.skip("SciPy no está instalado")
+    if backend == "numba" and not main.NUMBA_DISPONIBLE:
+        pytest.skip("Numba no está instalado")
+    monkeypatch.setattr(main, "SCIPY_DISPONIBLE", backend == "scipy")
+    monkeypatch.setattr(main, "NUMBA_DISPONIBLE", backend == "numba")
+    rng = np.random.default_rng(5)
+    coords = rng.uniform(0.0, 1000.0, (400, 2))
+    radio = 50
+    
+    pares, distancias = main.ArbolVialLima()._pares_cercanos(coords, radio)
+    
+    # Referencia: el doble bucle sobre todos los pares i < j
+    esperados = [[i, j] for i in range(len(coords)) for j in range(i + 1, len(coords))
+                 if np.hypot(*(coords[i] - coords[j])) < radio]
+    assert pares.tolist() == esperados
+    np.testing.assert_allclose(distancias, [np.hypot(*(coords[i] - coords[j])) for i, j in esperados])
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+from conftest import SERVER_DIR
+
+# Se ejecuta en otro proceso: en este los módulos ya se importaron con Numba
+_SIN_NUMBA = """
+import sys
+sys.modules["numba"] = None  # Hace que "import numba" falle como si no estuviera instalado
+import app
+from algorithms import dijkstra_bidireccional
+from algorithms.dijkstra import construir_csr
+import numpy as np
+assert not sys.modules["algorithms.numba_kernels"].NUMBA_DISPONIBLE
+inf = np.inf
+matriz = np.array([[0.0, 1.0, inf], [1.0, 0.0, 2.0], [inf, 2.0, 0.0]])
+csr = construir_csr(matriz)
+assert dijkstra_bidireccional(csr, csr, 0, 2) == (3.0, [0, 1, 2])
+"""
+
+
+def test_importa_la_app_sin_numba():
+    resultado = subprocess.run([sys.executable, "-c", _SIN_NUMBA], cwd=SERVER_DIR,
+                               capture_output=True, text=True)
+    assert resultado.returncode == 0, resultado.stderr
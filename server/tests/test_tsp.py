@@ -0,0 +1,49 @@
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from algorithms.tsp import _HELD_KARP_MAX_NODOS, _nearest_neighbor_desde_origen, solve_tsp
+
+
+def _costo_recorrido(matriz, ruta):
+    return sum(matriz[u, v] for u, v in zip(ruta, ruta[1:]))
+
+
+def _optimo_cerrado(matriz, origen, resto):
+    return min(_costo_recorrido(matriz, [origen, *orden, origen]) for orden in permutations(resto))
+
+
+@pytest.mark.parametrize("semilla", range(50))
+def test_recorrido_cerrado_optimo_con_matriz_asimetrica(semilla):
+    # Como la matriz de OSRM con calles de un solo sentido: d(i, j) != d(j, i)
+    rng = np.random.default_rng(semilla)
+    n = int(rng.integers(3, 8))
+    matriz = rng.uniform(1.0, 100.0, size=(n, n))
+    np.fill_diagonal(matriz, 0.0)
+    nodos = list(range(n))
+    
+    ruta, distancia = solve_tsp(matriz, nodos, {i: i for i in nodos}, nodos, origen_fijo=0)
+    
+    assert ruta[0] == ruta[-1] == 0
+    assert sorted(ruta[1:-1]) == nodos[1:]
+    assert distancia == pytest.approx(_costo_recorrido(matriz, ruta))
+    assert distancia == pytest.approx(_optimo_cerrado(matriz, 0, nodos[1:]))
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_heuristica_no_empeora_con_matriz_asimetrica(semilla):
+    # Más nodos que el límite de Held-Karp: Nearest Neighbor + búsqueda local
+    rng = np.random.default_rng(semilla)
+    n = _HELD_KARP_MAX_NODOS + 7
+    matriz = rng.uniform(1.0, 100.0, size=(n, n))
+    np.fill_diagonal(matriz, 0.0)
+    nodos = list(range(n))
+    
+    ruta, distancia = solve_tsp(matriz, nodos, {i: i for i in nodos}, nodos, origen_fijo=0)
+    inicial = _nearest_neighbor_desde_origen(matriz, nodos, 0) + [0]
+    
+    assert ruta[0] == ruta[-1] == 0
+    assert sorted(ruta[1:-1]) == nodos[1:]
+    assert distancia == pytest.approx(_costo_recorrido(matriz, ruta))
+    assert distancia <= _costo_recorrido(matriz, inicial) + 1e-9